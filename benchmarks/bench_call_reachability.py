@@ -0,0 +1,118 @@
+"""
+Benchmark: impact-analysis queries on call_reachability.CallReachability
+against the equivalent networkx traversals of the call graph.
+
+The synthetic call graph is layered like an application: methods in
+--layers layers (controllers, services, ..., utilities), grouped in
+packages, calling mostly into the next layers down and their own package,
+with a few calls back up that form recursive cycles. Reported are the
+build time, median query latencies, and the time of an update after the
+calls of a few methods changed, against a rebuild.
+
+Run from the repository root:
+    python -m benchmarks.bench_call_reachability --edges 500000
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Callable, List
+
+import networkx as nx
+
+from call_reachability import CallReachability
+
+def layered_call_graph(edges: int, calls_per_method: int = 5, layers: int = 6, packages: int = 50,
+                       back_edge_share: float = 0.001, seed: int = 42) -> nx.DiGraph:
+    rng = random.Random(seed)
+    methods = max(layers, edges // calls_per_method)
+    G = nx.DiGraph()
+    by_place: List[List[List[str]]] = [[[] for _ in range(packages)] for _ in range(layers)]
+    placed = []
+    for i in range(methods):
+        layer, package = i % layers, rng.randrange(packages)
+        node = f"p{package}.L{layer}.M{i}.run"
+        G.add_node(node, type="method")
+        by_place[layer][package].append(node)
+        placed.append((node, layer, package))
+    for node, layer, package in placed:
+        for _ in range(calls_per_method):
+            if rng.random() < back_edge_share:
+                target_layer = rng.randrange(layer + 1)
+            elif layer == layers - 1:
+                continue
+            else:
+                target_layer = min(layers - 1, layer + 1 + int(rng.expovariate(2.0)))
+            target_package = package if rng.random() < 0.8 else rng.randrange(packages)
+            candidates = by_place[target_layer][target_package] or by_place[target_layer][package]
+            if candidates:
+                G.add_edge(node, rng.choice(candidates), relation="calls")
+    return G
+
+def median_micros(fn: Callable[[object], object], items: List[object]) -> float:
+    times = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e6
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--edges", type=int, default=500_000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--networkx-queries", type=int, default=20)
+    ap.add_argument("--changed", type=int, default=20, help="methods whose calls change in the update")
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    G = layered_call_graph(args.edges, seed=args.seed)
+    print(f"call graph: {G.number_of_nodes()} methods, {G.number_of_edges()} calls, largest recursive group "
+          f"{max(len(c) for c in nx.strongly_connected_components(G))}")
+
+    start = time.perf_counter()
+    index = CallReachability.from_graph(G)
+    print(f"build: {time.perf_counter() - start:.2f}s, {index.dimensions} labels per node, "
+          f"{len(index.recursive)} methods in recursive groups")
+
+    rng = random.Random(args.seed)
+    nodes = list(G)
+    pairs = [(rng.choice(nodes), rng.choice(nodes)) for _ in range(args.queries)]
+    sample = [pair[0] for pair in pairs]
+    few = sample[:args.networkx_queries]
+    rows = [
+        ("calls transitively", median_micros(lambda p: index.calls_transitively(*p), pairs),
+         median_micros(lambda p: nx.has_path(G, *p), pairs[:args.networkx_queries])),
+        ("transitive callees", median_micros(index.transitive_callees, sample),
+         median_micros(lambda n: nx.descendants(G, n), few)),
+        ("transitive callers", median_micros(index.transitive_callers, sample),
+         median_micros(lambda n: nx.ancestors(G, n), few)),
+        ("transitive fan-in", median_micros(lambda n: index.fan_in(n, transitive=True), sample),
+         median_micros(lambda n: len(nx.ancestors(G, n)), few)),
+        ("shortest call path", median_micros(lambda p: index.shortest_call_path(*p), pairs),
+         median_micros(lambda p: _nx_path(G, *p), pairs[:args.networkx_queries])),
+    ]
+    print(f"{'query':20s} {'index':>12s} {'networkx':>12s}")
+    for name, ours, theirs in rows:
+        print(f"{name:20s} {ours:9.1f} us {theirs:9.1f} us")
+
+    for node in rng.sample(nodes, args.changed):
+        G.remove_edges_from(list(G.out_edges(node)))
+        for _ in range(3):
+            G.add_edge(node, rng.choice(nodes), relation="calls")
+    start = time.perf_counter()
+    stats = index.update(G)
+    updated = time.perf_counter() - start
+    start = time.perf_counter()
+    CallReachability.from_graph(G)
+    print(f"update after {args.changed} methods changed: {updated:.2f}s ({stats}), "
+          f"rebuild: {time.perf_counter() - start:.2f}s")
+
+def _nx_path(G: nx.DiGraph, source, target):
+    try:
+        return nx.shortest_path(G, source, target)
+    except nx.NetworkXNoPath:
+        return None
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: source discovery with source_discovery against recursive glob.
+
+Builds a project tree with --files sources, plus what real checkouts carry
+next to them: build output and a node_modules folder (--noise files each,
+mostly not Java), a .gitignore'd generated-sources folder, and one
+generated source of --big-mb MB. Reports for the old recursive glob and for
+iter_source_files the time to the first file, the time to list every file
+and how many were found, then the time to parse what each found.
+
+Run from the repository root:
+    python -m benchmarks.bench_discovery --files 500 --noise 20000
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+from benchmarks.java_corpus import generate_java_source, write_project
+from source_discovery import iter_source_files
+from tree_sitter_parser import parse_file
+
+def write_noise(root: str, noise: int, big_mb: float) -> None:
+    """Build output, dependencies, ignored generated sources and one oversized generated file."""
+    for folder, count, suffix in (("build/classes/com/bench", noise // 2, ".class"),
+                                  ("node_modules/pkg", noise // 2, ".js"),
+                                  ("build/generated/com/bench", 50, ".java"),
+                                  ("generated-sources/com/bench", 50, ".java")):
+        for i in range(count):
+            sub = os.path.join(root, folder, f"d{i % 100}")
+            os.makedirs(sub, exist_ok=True)
+            with open(os.path.join(sub, f"F{i}{suffix}"), "w", encoding="utf-8") as f:
+                f.write(generate_java_source(i, classes=1, methods_per_class=2) if suffix == ".java" else "x")
+    with open(os.path.join(root, ".gitignore"), "w", encoding="utf-8") as f:
+        f.write("/generated-sources/\n")
+    unit = generate_java_source(0, classes=1, methods_per_class=8)
+    with open(os.path.join(root, "com", "Generated.java"), "w", encoding="utf-8") as f:
+        f.write(unit.split("public class", 1)[0] + "public class Generated {\n")
+        body = unit.split("{", 1)[1].rsplit("}", 1)[0]
+        for _ in range(int(big_mb * 1e6 / len(body)) + 1):
+            f.write(body)
+        f.write("}\n")
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=500)
+    ap.add_argument("--noise", type=int, default=20_000, help="files under build/ and node_modules/")
+    ap.add_argument("--big-mb", type=float, default=8.0, help="size of the generated source")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_project(root, args.files)
+        write_noise(root, args.noise, args.big_mb)
+
+        results = {}
+        start = time.perf_counter()
+        paths = sorted(glob.glob(os.path.join(root, "**", "*.java"), recursive=True))
+        results["recursive glob"] = (time.perf_counter() - start, time.perf_counter() - start, paths, [])
+
+        skipped = []
+        start = time.perf_counter()
+        found = iter_source_files(root, "java", skipped=skipped)
+        first = next(found)
+        first_time = time.perf_counter() - start
+        paths = [first] + list(found)
+        results["iter_source_files"] = (first_time, time.perf_counter() - start, paths, skipped)
+
+        for name, (first_time, total, paths, skipped) in results.items():
+            start = time.perf_counter()
+            failed = sum(parse_file(p, "java")[2] is not None for p in paths)
+            parsed = time.perf_counter() - start
+            print(f"{name:18s} first file {first_time * 1000:7.1f} ms, all {total * 1000:7.1f} ms, "
+                  f"{len(paths)} files ({len(skipped)} skipped), parse {parsed:6.2f}s ({failed} failed)")
+        for path, reason in results["iter_source_files"][3]:
+            print(f"  skipped {os.path.relpath(path, root)}: {reason}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: size-aware node documents against whole-code documents.
+
+Builds the graph of a synthetic project with large classes and long methods
+and stores it twice through ChromaNodeWriter with a stub embedder: once with
+the previous documents (every node's full code, classes included) and once
+with document_builder.node_documents (class signature summaries and long
+methods split into overlapping chunks). Reports the documents, bytes and
+estimated tokens sent to the embedder, the largest document and how many
+exceed --limit tokens, and checks that vector search maps chunk hits back
+to graph nodes.
+
+Run from the repository root:
+    python -m benchmarks.bench_documents --files 20 --calls 80
+"""
+import argparse
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import chromadb
+
+from benchmarks.bench_stages import StubEmbeddingProvider
+from benchmarks.java_corpus import write_project
+from chroma_manager import ChromaNodeWriter, rank_nodes
+from document_builder import Document, estimate_tokens, node_documents
+from element_records import node_code
+from embedding_cache import EmbeddingCache
+from main import parse_project_folder
+
+def legacy_documents(node: Any, data: Dict[str, Any]) -> List[Document]:
+    """The previous document: the node's whole code, one record per node."""
+    node_type = data.get("type", "unknown")
+    class_name = data.get("class_name", "")
+    text = f"Type: {node_type}\nID: {node}\nClass: {class_name}\nCode:\n{node_code(data)}"
+    return [(str(node), text, {"node": str(node), "type": node_type, "class": class_name, "chunk": 0})]
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=20)
+    ap.add_argument("--classes", type=int, default=2)
+    ap.add_argument("--methods", type=int, default=40)
+    ap.add_argument("--calls", type=int, default=80, help="calls per method, which sets method length")
+    ap.add_argument("--limit", type=int, default=2048, help="token limit to count oversized documents against")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_project(root, args.files, classes=args.classes, methods_per_class=args.methods,
+                      calls_per_method=args.calls)
+        G, _ = parse_project_folder(root, "java")
+        nodes = list(G.nodes(data=True))
+        print(f"graph: {G.number_of_nodes()} nodes from {args.files} files")
+
+        provider = StubEmbeddingProvider()
+        client = chromadb.EphemeralClient()
+        for i, (name, documents) in enumerate((("whole code", legacy_documents), ("node_documents", node_documents))):
+            start = time.perf_counter()
+            built = [doc for node, data in nodes for doc in documents(node, data)]
+            build_time = time.perf_counter() - start
+            tokens = [estimate_tokens(text) for _, text, _ in built]
+
+            target = client.get_or_create_collection(f"bench_documents_{i}")
+            writer = ChromaNodeWriter(provider, target_collection=target, cache=EmbeddingCache(":memory:"),
+                                      model_name=provider.model_name, documents=documents)
+            start = time.perf_counter()
+            for node, data in nodes:
+                writer.add(node, data)
+            stats = writer.finish()
+            store_time = time.perf_counter() - start
+
+            print(f"{name:15s} {len(built):6d} docs, {stats['bytes_sent'] / 1e6:7.2f} MB, "
+                  f"~{stats['tokens_sent']:9d} tokens sent, largest ~{max(tokens)} tokens, "
+                  f"{sum(t > args.limit for t in tokens)} over {args.limit}, "
+                  f"build {build_time * 1000:6.1f} ms, store {store_time:5.2f}s")
+
+            for query in ("compute helper", "class extends", "return value"):
+                for node, _ in rank_nodes(query, target, 10, provider):
+                    assert node in G, f"{name}: search returned {node!r}, not a graph node"
+        print("vector search returned graph nodes only")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: batched, concurrent store_graph_nodes_in_chroma against the previous
+one-request-per-node loop, fully offline.
+
+A fake embedder simulates network latency (a fixed cost per request plus a
+small cost per text) and returns deterministic vectors; writes go to an
+in-memory Chroma collection.
+
+Run from the repository root:
+    python -m benchmarks.bench_embedding_pipeline --nodes 2000 --latency-ms 20
+"""
+import argparse
+import hashlib
+import time
+from typing import List
+
+import chromadb
+import networkx as nx
+
+from chroma_manager import store_graph_nodes_in_chroma
+from document_builder import node_documents
+from embedding_cache import EmbeddingCache
+
+class FakeEmbedder:
+    """Deterministic batch embedder that sleeps like a remote API would."""
+
+    def __init__(self, dim: int = 256, latency: float = 0.02, per_item: float = 0.0002):
+        self.dim = dim
+        self.latency = latency
+        self.per_item = per_item
+        self.requests = 0
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        time.sleep(self.latency + self.per_item * len(texts))
+        return [self.vector(t) for t in texts]
+
+    def vector(self, text: str) -> List[float]:
+        seed = hashlib.sha1(text.encode("utf-8")).digest()
+        return [(seed[i % len(seed)] - 128) / 128.0 for i in range(self.dim)]
+
+def synthetic_graph(nodes: int) -> nx.DiGraph:
+    G = nx.DiGraph()
+    for i in range(nodes):
+        cls = f"C{i // 10}"
+        G.add_node(f"{cls}.m{i}", type="method", class_name=cls,
+                   code=f"public int m{i}(int a) {{ return helper.compute(a) + {i}; }}")
+    return G
+
+def legacy_store(G: nx.DiGraph, embedder: FakeEmbedder, collection) -> None:
+    """The previous loop: one embedding request and one add per document."""
+    for node, data in G.nodes(data=True):
+        for doc_id, document_text, metadata in node_documents(node, data):
+            embedding = embedder([document_text])[0]
+            collection.add(ids=[doc_id], documents=[document_text], embeddings=[embedding], metadatas=[metadata])
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--nodes", type=int, default=2000)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--batch-size", type=int, default=64)
+    ap.add_argument("--concurrency", type=int, default=4)
+    args = ap.parse_args()
+
+    G = synthetic_graph(args.nodes)
+    client = chromadb.EphemeralClient()
+
+    legacy_embedder = FakeEmbedder(latency=args.latency_ms / 1000)
+    legacy_collection = client.get_or_create_collection("bench_legacy")
+    start = time.perf_counter()
+    legacy_store(G, legacy_embedder, legacy_collection)
+    legacy = time.perf_counter() - start
+
+    embedder = FakeEmbedder(latency=args.latency_ms / 1000)
+    pipeline_collection = client.get_or_create_collection("bench_pipeline")
+    start = time.perf_counter()
+    store_graph_nodes_in_chroma(G, embedder=embedder, batch_size=args.batch_size,
+                                concurrency=args.concurrency, target_collection=pipeline_collection,
+                                cache=EmbeddingCache(":memory:"), model_name="fake")
+    pipeline = time.perf_counter() - start
+
+    assert pipeline_collection.count() == legacy_collection.count() == args.nodes
+    print(f"nodes: {args.nodes}, simulated latency: {args.latency_ms:.0f} ms/request")
+    print(f"per-node loop : {legacy:7.2f}s  ({legacy_embedder.requests} requests)")
+    print(f"batched upsert: {pipeline:7.2f}s  ({embedder.requests} requests)")
+    print(f"speedup       : {legacy / pipeline:7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark: indexed call resolution in build_graph_from_elements against the
+previous per-call scan over all graph nodes.
+
+Run from the repository root:
+    python -m benchmarks.bench_graph_builder --calls 10000 100000 1000000
+
+The legacy builder is quadratic, so it is only timed up to --legacy-max calls.
+"""
+import argparse
+import random
+import time
+from typing import Any, Dict
+
+import networkx as nx
+
+from graph_builder import build_graph_from_elements
+
+def synthetic_elements(calls: int, methods_per_class: int = 10, calls_per_method: int = 10,
+                       seed: int = 42) -> Dict[str, Any]:
+    """Elements shaped like parse_project_folder output: one class per file, unique method ids."""
+    rng = random.Random(seed)
+    methods_total = max(1, calls // calls_per_method)
+    class_count = max(1, methods_total // methods_per_class)
+    elements = {"classes": [], "methods": [], "imports": [], "method_calls": [], "file_imports": {}}
+
+    for c in range(class_count):
+        path = f"src/C{c}.java"
+        elements["classes"].append({"name": f"C{c}", "code": "", "file": path})
+        imports = [f"com.bench.C{rng.randrange(class_count)}" for _ in range(3)]
+        elements["imports"].extend(imports)
+        elements["file_imports"][path] = imports
+        for m in range(methods_per_class):
+            elements["methods"].append({"class": f"C{c}", "name": f"m{m}", "id": f"C{c}.m{m}",
+                                        "code": "", "file": path})
+
+    for i in range(calls):
+        c = rng.randrange(class_count)
+        kind = rng.randrange(4)
+        qualifier = None
+        if kind == 1:
+            qualifier = "this"
+        elif kind == 2:
+            qualifier = f"C{rng.randrange(class_count)}"
+        elements["method_calls"].append({
+            "caller": f"m{rng.randrange(methods_per_class)}",
+            "call": f"m{rng.randrange(methods_per_class)}" if kind != 3 else f"external{i % 50}",
+            "qualifier": qualifier,
+            "file": f"src/C{c}.java",
+        })
+    return elements
+
+def legacy_build_graph(elements: Dict[str, Any]) -> nx.DiGraph:
+    """Frozen copy of the previous builder, kept only as a baseline."""
+    G = nx.DiGraph()
+    for cls in elements.get("classes", []):
+        G.add_node(cls["name"], type="class", code=cls.get("code", ""))
+    for m in elements.get("methods", []):
+        G.add_node(m["id"], type="method", code=m.get("code", ""), class_name=m.get("class"))
+        if m.get("class"):
+            G.add_edge(m["class"], m["id"], relation="contains")
+    for call in elements.get("method_calls", []):
+        caller = call.get("caller")
+        callee_name = call.get("call")
+        if not callee_name:
+            continue
+        candidates = [n for n in G.nodes if G.nodes[n].get("type") == "method" and n.endswith(f".{callee_name}")]
+        chosen = None
+        if caller:
+            caller_nodes = [n for n in G.nodes if n.endswith(f".{caller}") or n == caller]
+            caller_class = None
+            if caller_nodes and G.nodes[caller_nodes[0]].get("type") == "method":
+                caller_class = G.nodes[caller_nodes[0]].get("class_name")
+            for c in candidates:
+                if caller_class and G.nodes[c].get("class_name") == caller_class:
+                    chosen = c
+                    break
+        if not chosen and candidates:
+            chosen = candidates[0]
+        possible = [n for n in G.nodes if n.endswith(f".{caller}")] if caller else []
+        caller_node = possible[0] if possible else caller
+        if caller_node not in G:
+            G.add_node(caller_node, type="unknown", code="")
+        target = chosen or f"unresolved::{callee_name}"
+        if target not in G:
+            G.add_node(target, type="unresolved", code="")
+        G.add_edge(caller_node, target, relation="calls")
+    return G
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--calls", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--legacy-max", type=int, default=10_000)
+    args = ap.parse_args()
+
+    print(f"{'calls':>10} {'methods':>8} {'indexed':>10} {'legacy':>10} {'edges':>9}")
+    for calls in args.calls:
+        elements = synthetic_elements(calls)
+        start = time.perf_counter()
+        G = build_graph_from_elements(elements)
+        indexed = time.perf_counter() - start
+
+        legacy = "-"
+        if calls <= args.legacy_max:
+            start = time.perf_counter()
+            legacy_build_graph(elements)
+            legacy = f"{time.perf_counter() - start:9.2f}s"
+        print(f"{calls:>10} {len(elements['methods']):>8} {indexed:9.2f}s {legacy:>10} {G.number_of_edges():>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: lexical queries on the identifier index against embedding the query.
+
+Builds the graph of a synthetic project with and without an IdentifierIndex
+to time the indexing overhead, then times exact symbol lookups, BM25 and
+prefix queries (the first run of a query, which prepares its terms' weights,
+and repeated runs). For comparison it times embed_query with a stub
+provider that sleeps like a remote API, on a miss and on a repeated query
+served from the query embedding cache.
+
+Run from the repository root:
+    python -m benchmarks.bench_identifier_index --files 200 --latency-ms 200
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from typing import Callable, List
+
+import chromadb
+
+from benchmarks.bench_stages import StubEmbeddingProvider
+from benchmarks.java_corpus import write_project
+from chroma_manager import embed_query
+from graph_builder import build_graph_from_elements
+from identifier_index import IdentifierIndex
+from main import parse_project_folder
+
+def _micros(fn: Callable[[], object], repeat: int) -> float:
+    """Median microseconds per call of fn over repeat calls."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e6
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--latency-ms", type=float, default=200.0, help="simulated embedding request latency")
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_project(root, args.files)
+        _, elements = parse_project_folder(root, "java")
+
+        start = time.perf_counter()
+        build_graph_from_elements(elements)
+        plain = time.perf_counter() - start
+        index = IdentifierIndex()
+        start = time.perf_counter()
+        G = build_graph_from_elements(elements, index)
+        indexed = time.perf_counter() - start
+
+    print(f"graph: {G.number_of_nodes()} nodes, index: {len(index)} nodes, {len(index.postings)} terms")
+    print(f"build_graph_from_elements: {plain:.3f}s without index, {indexed:.3f}s with index")
+
+    method = next(n for n, d in G.nodes(data=True) if d.get("type") == "method")
+    queries = [("exact", method, False), ("bm25", "compute the total", False),
+               ("prefix", "len", True)]
+    for label, query, prefix in queries:
+        start = time.perf_counter()
+        index.search(query, top_k=10, prefix=prefix)
+        first = (time.perf_counter() - start) * 1e6
+        warm = _micros(lambda: index.search(query, top_k=10, prefix=prefix), args.repeat)
+        print(f"{label:7s} {query!r:28s} first {first:9.1f} us, then {warm:8.1f} us")
+
+    latency = args.latency_ms / 1000
+
+    class SlowStubProvider(StubEmbeddingProvider):
+        def embed(self, texts: List[str]) -> List[List[float]]:
+            time.sleep(latency)
+            return super().embed(texts)
+
+    target = chromadb.EphemeralClient().create_collection("bench_identifier_index")
+    provider = SlowStubProvider()
+    start = time.perf_counter()
+    embed_query("compute the total", target, provider)
+    miss = (time.perf_counter() - start) * 1e6
+    hit = _micros(lambda: embed_query("compute the total", target, provider), args.repeat)
+    print(f"embed_query: {miss:9.1f} us on a miss, {hit:8.1f} us when cached")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark: patching the graph after edits against rebuilding it.
+
+Writes a synthetic project, then applies --edits random edits one at a time:
+rewriting a file, appending a class to a file, adding a file and deleting
+one. Appended and added classes declare methods with names shared across
+files and call them unqualified, so those calls are ambiguous and resolve
+by project order. After every edit the graph is patched through
+parse_project_folder with the parse cache and the previous graph, and
+checked to have exactly the nodes, attributes and edges of a full rebuild.
+Reports the time per edit of both, end to end and for the graph alone
+(update_graph_for_files against build_graph_from_elements).
+
+Run from the repository root:
+    python -m benchmarks.bench_incremental_graph --files 200 --edits 30
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from typing import Any, Dict, Set, Tuple
+
+import networkx as nx
+
+from benchmarks.java_corpus import generate_java_source, write_project
+from main import parse_project_folder
+from metrics import enable_metrics, get_metrics
+from parse_cache import ParseCache
+
+# Methods declared in several files, so unqualified calls to them are ambiguous.
+SHARED_NAMES = 3
+
+def extra_class(k: int) -> str:
+    """A class declaring a shared method name and calling another one unqualified."""
+    return (f"class Extra{k} {{\n"
+            f"    void shared{k % SHARED_NAMES}() {{ }}\n"
+            f"    void call{k}() {{ shared{(k + 1) % SHARED_NAMES}(); }}\n"
+            f"}}\n")
+
+def graph_signature(G: nx.DiGraph) -> Tuple[Dict[Any, Dict[str, Any]], Set[Tuple[Any, Any, Any]]]:
+    """G's nodes with their attributes and its edges with their relation, ignoring order."""
+    return ({n: dict(d) for n, d in G.nodes(data=True)},
+            {(u, v, d.get("relation")) for u, v, d in G.edges(data=True)})
+
+def check_same(patched: nx.DiGraph, rebuilt: nx.DiGraph, label: str) -> None:
+    nodes, edges = graph_signature(patched)
+    full_nodes, full_edges = graph_signature(rebuilt)
+    assert nodes.keys() == full_nodes.keys(), \
+        f"{label}: nodes differ: {sorted(map(str, nodes.keys() ^ full_nodes.keys()))[:5]}"
+    assert nodes == full_nodes, f"{label}: node attributes differ"
+    assert edges == full_edges, f"{label}: edges differ: {sorted(map(str, edges ^ full_edges))[:5]}"
+
+def _write(path: str, text: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def apply_edit(root: str, rng: random.Random, step: int) -> str:
+    """Make one random edit under root and describe it."""
+    paths = sorted(os.path.join(folder, name) for folder, _, names in os.walk(root)
+                   for name in names if name.endswith(".java"))
+    kind = rng.choice(("rewrite", "append", "add", "delete"))
+    if kind == "add" or len(paths) < 2:
+        path = os.path.join(root, "com", "bench", f"p{step % 10}", f"Added{step}.java")
+        _write(path, f"package com.bench.p{step % 10};\n\n" + extra_class(step))
+        return f"add {os.path.relpath(path, root)}"
+    path = rng.choice(paths)
+    if kind == "delete":
+        os.remove(path)
+    elif kind == "append":
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n" + extra_class(step))
+    else:
+        _write(path, generate_java_source(rng.randrange(1000), seed=step))
+    return f"{kind} {os.path.relpath(path, root)}"
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--edits", type=int, default=30)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "src")
+        write_project(root, args.files)
+        # Ambiguous declarations and calls from the start, spread through the project order.
+        for k in range(0, args.files, max(1, args.files // 10)):
+            with open(os.path.join(root, "com", "bench", f"p{k % 10}", f"File{k}.java"), "a", encoding="utf-8") as f:
+                f.write("\n" + extra_class(10_000 + k))
+
+        cache = ParseCache(os.path.join(tmp, "parse_cache.json"), "java")
+        G, _ = parse_project_folder(root, "java", cache=cache)
+        check_same(G, parse_project_folder(root, "java")[0], "initial build")
+
+        enable_metrics()
+        metrics = get_metrics()
+        patch_time = rebuild_time = patch_graph = rebuild_graph = 0.0
+        for step in range(args.edits):
+            edit = apply_edit(root, rng, step)
+            metrics.reset()
+            start = time.perf_counter()
+            G, _ = parse_project_folder(root, "java", cache=cache, graph=G)
+            patch_time += time.perf_counter() - start
+            patch_graph += sum(metrics.samples.get("update_graph", ()))
+            metrics.reset()
+            start = time.perf_counter()
+            rebuilt, _ = parse_project_folder(root, "java")
+            rebuild_time += time.perf_counter() - start
+            rebuild_graph += sum(metrics.samples.get("build_graph", ()))
+            check_same(G, rebuilt, f"after edit {step} ({edit})")
+
+        print(f"{args.edits} edits on {args.files} files: patched graph matched a full rebuild after every edit")
+        print(f"{'':8s} {'end to end':>16s} {'graph':>16s}")
+        print(f"patch   {patch_time / args.edits * 1000:10.1f} ms/edit {patch_graph / args.edits * 1000:10.1f} ms/edit")
+        print(f"rebuild {rebuild_time / args.edits * 1000:10.1f} ms/edit {rebuild_graph / args.edits * 1000:10.1f} ms/edit")
+
+if __name__ == "__main__":
+    main()
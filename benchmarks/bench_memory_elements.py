@@ -0,0 +1,82 @@
+"""
+Benchmark: memory held by parsed elements and the graph, compact records
+against the previous dict format (live tree-sitter nodes plus copied code).
+
+Each format is measured in a fresh subprocess as the growth of the resident
+set (which, unlike tracemalloc, includes tree-sitter's C allocations) after
+parsing a synthetic project and building its graph.
+
+Run from the repository root:
+    python -m benchmarks.bench_memory_elements --files 500
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.java_corpus import write_project
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def _measure(variant: str, root: str) -> None:
+    from graph_builder import build_graph_from_elements
+    from tree_sitter_parser import get_parser, parse_file
+    from benchmarks.bench_parse_source import legacy_parse_source
+
+    get_parser("java")
+    paths = sorted(glob.glob(os.path.join(root, "**", "*.java"), recursive=True))
+    gc.collect()
+    rss_before = _rss_bytes()
+
+    elements = {"classes": [], "methods": [], "imports": [], "method_calls": []}
+    for path in paths:
+        if variant == "legacy":
+            with open(path, "r", encoding="utf-8") as f:
+                elems = legacy_parse_source(f.read(), "java")
+            for key in ("classes", "methods", "method_calls"):
+                for item in elems[key]:
+                    item["file"] = path
+        else:
+            _, elems, _ = parse_file(path, "java")
+        for key in elements:
+            elements[key].extend(elems[key])
+    # Plain dicts make the builder copy each element's code into its node, as before.
+    G = build_graph_from_elements(elements)
+
+    gc.collect()
+    print(json.dumps({"variant": variant, "rss": _rss_bytes() - rss_before, "nodes": G.number_of_nodes()}))
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=500)
+    ap.add_argument("--variant", choices=["legacy", "compact"], help=argparse.SUPPRESS)
+    ap.add_argument("--root", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.variant:
+        _measure(args.variant, args.root)
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        write_project(root, args.files, classes=3, methods_per_class=10)
+        results = {}
+        for variant in ("legacy", "compact"):
+            out = subprocess.run([sys.executable, "-m", "benchmarks.bench_memory_elements",
+                                  "--variant", variant, "--root", root],
+                                 check=True, capture_output=True, text=True).stdout
+            results[variant] = json.loads(out.strip().splitlines()[-1])
+
+    mib = 1024 * 1024
+    print(f"files: {args.files}, graph nodes: {results['compact']['nodes']}")
+    for variant, r in results.items():
+        print(f"{variant:8}: rss +{r['rss'] / mib:7.1f} MiB")
+    print(f"rss reduction: {results['legacy']['rss'] / max(1, results['compact']['rss']):.1f}x")
+
+if __name__ == "__main__":
+    main()
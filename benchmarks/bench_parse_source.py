@@ -0,0 +1,160 @@
+"""
+Benchmark: single-pass `parse_source` against the previous three-pass extractor.
+
+Run from the repository root:
+    python -m benchmarks.bench_parse_source --files 200
+"""
+import argparse
+import time
+from typing import Any, Dict, List, Optional
+
+from tree_sitter import Node
+
+from tree_sitter_parser import init_parser, parse_source
+from benchmarks.java_corpus import generate_java_source
+
+# ---------------------------------------------------------------------------
+# Frozen copy of the previous implementation, kept only as a baseline.
+# ---------------------------------------------------------------------------
+
+def _legacy_node_text(node: Node, source: str) -> str:
+    return source[node.start_byte:node.end_byte]
+
+def _legacy_extract_imports(node: Node, source: str, elements: Dict[str, Any]) -> None:
+    for child in node.children:
+        if child.type == "import_declaration":
+            import_text = _legacy_node_text(child, source)
+            import_path = import_text.replace("import", "").replace(";", "").strip()
+            if import_path.startswith("static "):
+                import_path = import_path.replace("static ", "").strip()
+            elements["imports"].append(import_path)
+        _legacy_extract_imports(child, source, elements)
+
+def _legacy_extract_methods_from_class(class_node: Node, cls_name: str, source: str, elements: Dict[str, Any]) -> None:
+    for child in class_node.children:
+        if child.type in ["class_body", "interface_body", "enum_body"]:
+            for member in child.children:
+                if member.type in ["method_declaration", "constructor_declaration"]:
+                    method_name = None
+                    for mchild in member.children:
+                        if mchild.type == "identifier":
+                            method_name = _legacy_node_text(mchild, source)
+                            break
+                    if method_name:
+                        elements["methods"].append({
+                            "class": cls_name,
+                            "name": method_name,
+                            "id": f"{cls_name}.{method_name}",
+                            "code": _legacy_node_text(member, source),
+                            "node": member
+                        })
+
+def _legacy_extract_classes_and_methods(node: Node, source: str, elements: Dict[str, Any]) -> None:
+    if node.type in ["class_declaration", "interface_declaration", "enum_declaration"]:
+        cls_name = None
+        for child in node.children:
+            if child.type == "identifier":
+                cls_name = _legacy_node_text(child, source)
+                break
+        if cls_name:
+            elements["classes"].append({"name": cls_name, "code": _legacy_node_text(node, source), "node": node})
+            _legacy_extract_methods_from_class(node, cls_name, source, elements)
+    for child in node.children:
+        _legacy_extract_classes_and_methods(child, source, elements)
+
+def _legacy_find_enclosing(node: Node) -> Optional[str]:
+    current = node.parent
+    while current is not None:
+        if current.type in ["method_declaration", "constructor_declaration",
+                            "class_declaration", "interface_declaration", "enum_declaration"]:
+            for child in current.children:
+                if child.type == "identifier":
+                    text = child.text
+                    return text.decode("utf8") if isinstance(text, bytes) else text
+        current = current.parent
+    return None
+
+def _legacy_extract_method_calls(node: Node, source: str, elements: Dict[str, Any]) -> None:
+    if node.type == "method_invocation":
+        method_name = None
+        qualifier = None
+        for child in node.children:
+            if child.type == "identifier":
+                method_name = _legacy_node_text(child, source)
+            elif child.type == "field_access":
+                qualifier = _legacy_node_text(child, source)
+            elif child.type in ["this", "super"]:
+                qualifier = child.type
+        if method_name:
+            elements["method_calls"].append({
+                "caller": _legacy_find_enclosing(node),
+                "call": method_name,
+                "qualifier": qualifier,
+                "node": node
+            })
+    for child in node.children:
+        _legacy_extract_method_calls(child, source, elements)
+
+def legacy_parse_source(source: str, language: str) -> Dict[str, Any]:
+    parser = init_parser(language)
+    root_node = parser.parse(bytes(source, "utf8")).root_node
+    elements = {"classes": [], "methods": [], "imports": [], "method_calls": []}
+    _legacy_extract_imports(root_node, source, elements)
+    _legacy_extract_classes_and_methods(root_node, source, elements)
+    _legacy_extract_method_calls(root_node, source, elements)
+    return elements
+
+# ---------------------------------------------------------------------------
+
+COMPARED_KEYS = {
+    "classes": ("name", "code"),
+    "methods": ("class", "name", "id", "code"),
+    "method_calls": ("caller", "call"),
+}
+
+def _comparable(elements: Dict[str, Any]) -> Dict[str, List[Any]]:
+    """
+    The fields both implementations produce, so their results can be compared.
+
+    Qualifiers are skipped: the extractor now also records plain-name
+    objects ('customer.save()'), which the legacy code dropped.
+    """
+    out = {"imports": list(elements["imports"])}
+    for key, fields in COMPARED_KEYS.items():
+        out[key] = [{f: item[f] for f in fields} for item in elements[key]]
+    return out
+
+def _time(fn, sources: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for src in sources:
+            fn(src, "java")
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--classes", type=int, default=3)
+    ap.add_argument("--methods", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    sources = [generate_java_source(i, classes=args.classes, methods_per_class=args.methods)
+               for i in range(args.files)]
+
+    for src in sources[:20]:
+        assert _comparable(parse_source(src, "java")) == _comparable(legacy_parse_source(src, "java")), \
+            "single-pass output differs from the legacy extractor"
+
+    legacy = _time(legacy_parse_source, sources, args.repeat)
+    current = _time(parse_source, sources, args.repeat)
+    total_kb = sum(len(s) for s in sources) / 1024
+    print(f"corpus: {args.files} files, {total_kb:.0f} KiB")
+    print(f"legacy three-pass : {legacy * 1000:8.1f} ms")
+    print(f"single-pass cursor: {current * 1000:8.1f} ms")
+    print(f"speedup           : {legacy / current:8.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Benchmark: sharded multi-repository indexing with ShardRouter against one
+shared collection.
+
+Writes --repos synthetic repositories with the same package and class names
+(as forks, or modules generated from one template, have). Stores them all
+into one collection with flat node ids, the way main.py does, and counts
+the nodes lost to id collisions. Then indexes them as shards, one at a time
+and --repos at a time, with a stub embedder that sleeps --latency-ms per
+request like a remote API. Compares search latency over one collection
+holding every repository (with shard-prefixed ids) against the router's
+fan-out, checks the merged top-k against an exhaustive ranking of every
+stored vector, and checks that rebuilding and dropping a shard leave the
+other shards untouched.
+
+Run from the repository root:
+    python -m benchmarks.bench_shards --repos 4 --files 30 --latency-ms 500
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import List
+
+import chromadb
+import numpy as np
+
+from benchmarks.bench_stages import StubEmbeddingProvider
+from benchmarks.java_corpus import write_project
+from chroma_manager import rank_nodes, store_graph_nodes_in_chroma
+from embedding_cache import EmbeddingCache
+from main import parse_project_folder
+from shard_router import ShardRouter
+
+QUERIES = ["compute helper value", "service process request", "class field getter", "loop over items",
+           "return result", "validate input", "create customer", "update record"]
+
+class SlowStubProvider(StubEmbeddingProvider):
+    """StubEmbeddingProvider that takes latency seconds per request."""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return super().embed(texts)
+
+def exhaustive_top_k(router: ShardRouter, query: str, top_k: int) -> List[tuple]:
+    """(shard, node) of the top_k nodes by exact L2 distance over every stored vector."""
+    q = np.array(router.provider([query])[0])
+    best = {}
+    for shard in router.select():
+        stored = router.collection(shard).get(include=["embeddings", "metadatas"])
+        if not stored["ids"]:
+            continue
+        distances = ((np.array(stored["embeddings"]) - q) ** 2).sum(axis=1)
+        for meta, distance in zip(stored["metadatas"], distances):
+            key = (shard.name, meta["node"])
+            best[key] = min(best.get(key, np.inf), distance)
+    return sorted(best, key=best.get)[:top_k]
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repos", type=int, default=4)
+    ap.add_argument("--files", type=int, default=30, help="files per repository")
+    ap.add_argument("--latency-ms", type=float, default=500.0, help="simulated embedding request latency")
+    ap.add_argument("--top-k", type=int, default=10)
+    args = ap.parse_args()
+
+    provider = SlowStubProvider(args.latency_ms / 1000)
+    client = chromadb.EphemeralClient()
+    with tempfile.TemporaryDirectory() as tmp:
+        roots = []
+        for r in range(args.repos):
+            root = os.path.join(tmp, f"repo{r}")
+            write_project(root, args.files, seed=r)
+            roots.append(root)
+
+        graphs = [parse_project_folder(root, "java")[0] for root in roots]
+        total = sum(G.number_of_nodes() for G in graphs)
+        shared = client.get_or_create_collection("bench_shards_shared")
+        start = time.perf_counter()
+        for G in graphs:
+            store_graph_nodes_in_chroma(G, embedder=provider, target_collection=shared,
+                                        cache=EmbeddingCache(":memory:"), model_name=provider.model_name, prune=False)
+        shared_time = time.perf_counter() - start
+        shared_nodes = len({meta["node"] for meta in shared.get(include=["metadatas"])["metadatas"]})
+        print(f"one collection, flat ids: {total} nodes stored in {shared_time:.2f}s, "
+              f"{total - shared_nodes} lost to id collisions")
+
+        index_times = {}
+        for concurrency in (1, args.repos):
+            folder = os.path.join(tmp, f"shards{concurrency}")
+            router = ShardRouter(folder, client=client, provider=provider, cache=EmbeddingCache(":memory:"),
+                                 concurrency=concurrency)
+            for r, root in enumerate(roots):
+                router.add_shard(f"repo{r}", root, index=False)
+            start = time.perf_counter()
+            results = router.index()
+            index_times[concurrency] = time.perf_counter() - start
+            assert all("error" not in stats for stats in results.values()), results
+            stored = sum(len({m["node"] for m in router.collection(s).get(include=["metadatas"])["metadatas"]})
+                         for s in router.select())
+            print(f"shards, {concurrency} at a time: {stored} nodes stored in {index_times[concurrency]:.2f}s")
+            if concurrency != args.repos:
+                for shard in router.select():
+                    router.drop_shard(shard.name)
+        print(f"parallel indexing speedup: {index_times[1] / index_times[args.repos]:.1f}x")
+
+        # One collection holding every repository, ids prefixed with their shard, for comparison.
+        combined = client.get_or_create_collection("bench_shards_combined",
+                                                 metadata={"embedding_model": provider.model_name})
+        for shard in router.select():
+            stored = router.collection(shard).get(include=["embeddings", "documents", "metadatas"])
+            for i in range(0, len(stored["ids"]), 1000):
+                combined.add(ids=[f"{shard.name}:{x}" for x in stored["ids"][i:i + 1000]],
+                             embeddings=stored["embeddings"][i:i + 1000],
+                             documents=stored["documents"][i:i + 1000],
+                             metadatas=[dict(m, node=f"{shard.name}:{m['node']}")
+                                        for m in stored["metadatas"][i:i + 1000]])
+        for query in QUERIES:
+            # Warms embed_query's cache, so the timings below are search only.
+            rank_nodes(query, combined, args.top_k, provider)
+
+        timings = {}
+        for name, search in (("one combined collection", lambda q: combined.get(
+                                 ids=[node for node, _ in rank_nodes(q, combined, args.top_k, provider)])),
+                             ("router, all shards", lambda q: router.semantic_search(q, args.top_k)),
+                             ("router, one shard", lambda q: router.semantic_search(q, args.top_k, shards="repo0")),
+                             ("router graph search", lambda q: router.semantic_graph_search(q, depth=2,
+                                                                                            top_k=args.top_k))):
+            start = time.perf_counter()
+            for _ in range(5):
+                for query in QUERIES:
+                    search(query)
+            timings[name] = (time.perf_counter() - start) / (5 * len(QUERIES))
+        for name, seconds in timings.items():
+            print(f"{name:24s} {seconds * 1000:7.2f} ms/query")
+
+        found = expected = 0
+        for query in QUERIES:
+            merged = {(r["shard"], r["id"]) for r in router.semantic_search(query, args.top_k)}
+            exact = exhaustive_top_k(router, query, args.top_k)
+            expected += len(exact)
+            found += len(merged & set(exact))
+        print(f"merged top-{args.top_k} recall against an exhaustive ranking: {found / expected:.3f}")
+        assert {r["shard"] for r in router.semantic_search(QUERIES[0], args.top_k, shards="repo0")} == {"repo0"}
+
+        others = {s.name: (router.collection(s).count(), os.path.getmtime(s.snapshot_path))
+                  for s in router.select() if s.name != "repo0"}
+        start = time.perf_counter()
+        router.rebuild_shard("repo0")
+        rebuild_time = time.perf_counter() - start
+        if args.repos > 1:
+            router.drop_shard("repo1")
+            others.pop("repo1")
+        after = {s.name: (router.collection(s).count(), os.path.getmtime(s.snapshot_path))
+                 for s in router.select() if s.name != "repo0"}
+        assert after == others, "rebuilding or dropping a shard touched another shard"
+        assert [s.name for s in ShardRouter(router.folder, client=client, provider=provider).select()] == \
+            [s.name for s in router.select()], "manifest out of date"
+        print(f"rebuilt repo0 in {rebuild_time:.2f}s and dropped repo1; other shards untouched")
+
+if __name__ == "__main__":
+    main()
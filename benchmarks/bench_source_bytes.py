@@ -0,0 +1,80 @@
+"""
+Benchmark: parsing project files as bytes against decoding them to text.
+
+Writes a synthetic project whose sources contain non-ASCII identifiers,
+comments and string literals, counts the method spans that slicing the
+decoded text by byte offsets (as files used to be read) gets wrong, then
+times reading and parsing every file decoded to text and encoded again
+against parse_file, which reads bytes. The correctness checks for these
+sources are in tests/test_source_bytes.py.
+
+Run from the repository root:
+    python -m benchmarks.bench_source_bytes --files 200
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+from typing import Callable, List
+
+from benchmarks.java_corpus import generate_java_source
+from tree_sitter_parser import parse_file, parse_source
+
+def unicode_java_source(file_index: int, **kwargs) -> str:
+    """generate_java_source with non-ASCII class and method names, Javadoc and string literals."""
+    source = generate_java_source(file_index, **kwargs)
+    source = source.replace(f"C{file_index}_", f"Çlass{file_index}_")
+    source = re.sub(r"\bm(\d+)\(", r"größe\1(", source)
+    source = source.replace("    public int ", "    /** Berechnet die Größe — 計算 ✓ */\n    public int ")
+    source = source.replace('"x"', '"naïve ✓ 😀"')
+    return "// Überprüfung der Zeichenkodierung: 日本語, Ελληνικά, emoji 🚀\n" + source
+
+def _best(fn: Callable[[str], object], paths: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            fn(path)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _parse_text(path: str) -> None:
+    with open(path, "r", encoding="utf-8") as f:
+        parse_source(f.read(), "java", file=path)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--classes", type=int, default=3)
+    ap.add_argument("--methods", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(root, f"File{i}.java")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(unicode_java_source(i, classes=args.classes, methods_per_class=args.methods))
+            paths.append(path)
+
+        wrong = total = 0
+        for path in paths[:20]:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            for method in parse_source(text, "java")["methods"]:
+                total += 1
+                wrong += text[method.start_byte:method.end_byte] != method["code"]
+        print(f"slicing text by byte offsets got {wrong} of {total} method spans wrong")
+
+        size_mb = sum(os.path.getsize(p) for p in paths) / 1e6
+        print(f"corpus: {args.files} files, {size_mb:.1f} MB")
+        timings = [("decode to text, encode", _best(_parse_text, paths, args.repeat)),
+                   ("read bytes (parse_file)",
+                    _best(lambda p: parse_file(p, "java", timeout=None), paths, args.repeat))]
+        for name, seconds in timings:
+            print(f"{name:24s} {seconds * 1000:8.1f} ms  {size_mb / seconds:6.1f} MB/s")
+
+if __name__ == "__main__":
+    main()
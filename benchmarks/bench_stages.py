@@ -0,0 +1,230 @@
+"""
+Benchmark: every pipeline stage, one at a time, on a synthetic Java project.
+
+Writes a deterministic project with benchmarks.java_corpus and times each
+stage separately: parse_source over the sources in memory,
+parse_project_folder, build_graph_from_elements, store_graph_nodes_in_chroma
+with a local stub embedder and an in-memory Chroma client,
+semantic_graph_search, and the visualizers. Each stage is timed --repeat
+times, then run once more under tracemalloc for its peak Python allocation
+(worker processes are not traced).
+
+Results are written as JSON (--output) so runs can be compared; --compare
+prints the ratio of each stage's best time against an earlier result file.
+
+Run from the repository root:
+    python -m benchmarks.bench_stages --files 50 --output stages.json
+    python -m benchmarks.bench_stages --files 50 --compare stages.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import chromadb
+import numpy as np
+
+from benchmarks.java_corpus import write_project
+from chroma_manager import semantic_graph_search, store_graph_nodes_in_chroma
+from embedding_cache import EmbeddingCache
+from embedding_providers import EmbeddingProvider
+from graph_builder import build_adjacency, build_graph_from_elements
+from main import parse_project_folder
+from tree_sitter_parser import parse_source
+from visualizer import visualize_clustered_graph, visualize_graph, visualize_graph_interactive
+
+STAGES = ("parse_source", "parse_project_folder", "build_graph_from_elements",
+          "store_graph_nodes_in_chroma", "semantic_graph_search",
+          "visualize_graph_interactive", "visualize_clustered_graph", "visualize_graph")
+
+QUERIES = ("compute the total", "initialise the helper", "method calling itself",
+           "string length of the argument", "inner class delegating to outer")
+
+class StubEmbeddingProvider(EmbeddingProvider):
+    """Deterministic local vectors, so the store and search stages run without an API."""
+
+    name = "stub"
+
+    def __init__(self, dimension: int = 64):
+        self.dimension = dimension
+        self.model_name = f"stub-d{dimension}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            digest = np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest(), dtype=np.uint8)
+            vector = np.resize(digest, self.dimension).astype(np.float32) - 127.5
+            vectors.append((vector / np.linalg.norm(vector)).tolist())
+        return vectors
+
+def measure(fn: Callable[[], Any], repeat: int) -> Tuple[Any, Dict[str, Any]]:
+    """Run fn repeat times for timings and once more under tracemalloc; return its last result and stats."""
+    wall, cpu = [], []
+    result = None
+    for _ in range(repeat):
+        start, start_cpu = time.perf_counter(), time.process_time()
+        result = fn()
+        wall.append(time.perf_counter() - start)
+        cpu.append(time.process_time() - start_cpu)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {
+        "wall_s": wall,
+        "wall_s_min": min(wall),
+        "wall_s_median": statistics.median(wall),
+        "cpu_s_median": statistics.median(cpu),
+        "peak_traced_bytes": peak,
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+def git_revision() -> str:
+    try:
+        repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=repo).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run(args: argparse.Namespace, tmp: str) -> Dict[str, Any]:
+    corpus = {"files": args.files, "classes": args.classes, "methods_per_class": args.methods,
+              "calls_per_method": args.calls, "nesting": args.nesting,
+              "inner_classes": args.inner_classes, "seed": args.seed}
+    root = os.path.join(tmp, "project")
+    paths = write_project(root, args.files, classes=args.classes, methods_per_class=args.methods,
+                          calls_per_method=args.calls, nesting=args.nesting,
+                          inner_classes=args.inner_classes, seed=args.seed)
+    sources = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            sources.append(f.read())
+    corpus["bytes"] = sum(len(s.encode("utf-8")) for s in sources)
+    corpus["lines"] = sum(s.count("\n") + 1 for s in sources)
+
+    stages: Dict[str, Dict[str, Any]] = {}
+    selected = [s for s in STAGES if s in args.stages]
+
+    def stage(name: str, fn: Callable[[], Any], items: int, unit: str) -> Any:
+        result, stats = measure(fn, args.repeat)
+        stats.update(items=items, unit=unit, items_per_s=items / stats["wall_s_min"] if stats["wall_s_min"] else None)
+        stages[name] = stats
+        print(f"{name:30s} {stats['wall_s_min']:9.3f}s  {items:8d} {unit:8s} "
+              f"{stats['peak_traced_bytes'] / 2**20:9.1f} MiB traced", flush=True)
+        return result
+
+    def once(name: str, fn: Callable[[], Any], items: int, unit: str) -> Any:
+        """Stages that later ones depend on still run when not selected, just unmeasured."""
+        return stage(name, fn, items, unit) if name in selected else fn()
+
+    if "parse_source" in selected:
+        stage("parse_source", lambda: [parse_source(s, "java") for s in sources], len(sources), "files")
+    G, elements = once("parse_project_folder",
+                       lambda: parse_project_folder(root, "java", workers=args.workers), len(paths), "files")
+    G = once("build_graph_from_elements", lambda: build_graph_from_elements(elements),
+             len(elements["method_calls"]), "calls")
+
+    nodes = G.number_of_nodes()
+    provider = StubEmbeddingProvider()
+    client = chromadb.EphemeralClient()
+    store_runs = iter(range(args.repeat + 1))
+
+    def store() -> Any:
+        # A fresh collection and cache each run, so every run embeds every node.
+        target = client.create_collection(f"bench_stages_{next(store_runs)}")
+        store_graph_nodes_in_chroma(G, embedder=provider, target_collection=target,
+                                    cache=EmbeddingCache(":memory:"), model_name=provider.model_name)
+        return target
+
+    needs_collection = "semantic_graph_search" in selected
+    target = None
+    if "store_graph_nodes_in_chroma" in selected or needs_collection:
+        target = once("store_graph_nodes_in_chroma", store, nodes, "nodes")
+    if needs_collection:
+        adjacency = build_adjacency(G)
+        queries = [QUERIES[i % len(QUERIES)] for i in range(args.queries)]
+        stage("semantic_graph_search",
+              lambda: [semantic_graph_search(q, G, target, depth=2, provider=provider, adjacency=adjacency)
+                       for q in queries], len(queries), "queries")
+
+    if "visualize_graph_interactive" in selected:
+        stage("visualize_graph_interactive",
+              lambda: visualize_graph_interactive(G, os.path.join(tmp, "graph.html")), nodes, "nodes")
+    if "visualize_clustered_graph" in selected:
+        stage("visualize_clustered_graph",
+              lambda: visualize_clustered_graph(G, os.path.join(tmp, "clustered.html")), nodes, "nodes")
+    if "visualize_graph" in selected:
+        stage("visualize_graph", lambda: visualize_graph(G, output_png=os.path.join(tmp, "graph.png")),
+              nodes, "nodes")
+
+    return {
+        "benchmark": "stages",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "corpus": corpus,
+        "graph": {"nodes": nodes, "edges": G.number_of_edges()},
+        "stages": stages,
+    }
+
+def compare(result: Dict[str, Any], baseline_path: str) -> None:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("corpus") != result["corpus"]:
+        print(f"warning: {baseline_path} was run on a different corpus")
+    print(f"\ncompared with {baseline_path} ({baseline.get('revision')}):")
+    for name, stats in result["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if before:
+            ratio = stats["wall_s_min"] / before["wall_s_min"] if before["wall_s_min"] else float("inf")
+            print(f"{name:30s} {before['wall_s_min']:9.3f}s -> {stats['wall_s_min']:9.3f}s  ({ratio:5.2f}x)")
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=50)
+    ap.add_argument("--classes", type=int, default=2, help="top-level classes per file")
+    ap.add_argument("--methods", type=int, default=8, help="methods per class")
+    ap.add_argument("--calls", type=int, default=4, help="calls per method")
+    ap.add_argument("--nesting", type=int, default=0, help="nested if/for blocks around each method's calls")
+    ap.add_argument("--inner-classes", type=int, default=0, help="static nested classes per class")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--workers", type=int, default=1, help="parse_project_folder workers")
+    ap.add_argument("--queries", type=int, default=20)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    ap.add_argument("--output", help="write the results to this JSON file")
+    ap.add_argument("--compare", help="earlier JSON result to compare against")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = run(args, tmp)
+    print(f"graph: {result['graph']['nodes']} nodes, {result['graph']['edges']} edges")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"results written to {args.output}")
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        compare(result, args.compare)
+
+if __name__ == "__main__":
+    main()
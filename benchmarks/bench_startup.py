@@ -0,0 +1,68 @@
+"""
+Benchmark: start-up time of short-lived commands.
+
+Each command runs --repeat times in a fresh interpreter (in a temporary
+working directory, so no chroma_db or caches are reused) and reports its
+median wall time and which heavy dependencies it ended up importing.
+"eager imports" loads everything main.py used to load at import time,
+including opening the Chroma collection, as a reference for the others.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.java_corpus import write_project
+
+HEAVY_MODULES = ("chromadb", "google.generativeai", "matplotlib", "pyvis", "networkx", "tree_sitter_java")
+
+COMMANDS = {
+    "import main": "import main",
+    "parse only": "from main import parse_project_folder; parse_project_folder(ROOT, 'java')",
+    "eager imports": ("import main, chromadb, google.generativeai, matplotlib.pyplot, pyvis.network, "
+                      "tree_sitter_parser; tree_sitter_parser.get_language('java'); main.get_collection()"),
+}
+
+def _run(code: str, root: str, cwd: str) -> dict:
+    script = (f"import json, sys, time\nstart = time.perf_counter()\nROOT = {root!r}\n{code}\n"
+              f"print(json.dumps({{'seconds': time.perf_counter() - start, "
+              f"'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))")
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=repo)
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", script], cwd=cwd, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process_seconds"] = time.perf_counter() - start
+    return result
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--files", type=int, default=20, help="files in the project parsed by 'parse only'")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "project")
+        write_project(root, args.files)
+        results = {}
+        for name, code in COMMANDS.items():
+            runs = [_run(code, root, tmp) for _ in range(args.repeat)]
+            results[name] = {"process_s": statistics.median(r["process_seconds"] for r in runs),
+                             "in_process_s": statistics.median(r["seconds"] for r in runs),
+                             "loaded": runs[-1]["loaded"]}
+
+    reference = results["eager imports"]["process_s"]
+    for name, r in results.items():
+        print(f"{name:14s} {r['process_s']:6.2f}s  ({r['process_s'] / reference:4.0%} of eager)  "
+              f"loaded: {', '.join(r['loaded']) or '-'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: indexing a project with the streaming pipeline
+(pipeline.index_project with stream=True) against parsing everything first
+and then storing the finished graph (parse_project_folder followed by
+store_graph_nodes_in_chroma, index_project's default).
+
+Both variants run in a fresh subprocess, embed with a local stub provider
+that sleeps like a remote API (a fixed cost per request) and write to an
+in-memory Chroma collection. Reported are the wall time and the peak
+resident set of each subprocess above its size after imports.
+
+Run from the repository root:
+    python -m benchmarks.bench_streaming_pipeline --files 500 --latency-ms 20
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+from benchmarks.java_corpus import write_project
+
+def _measure(variant: str, root: str, latency: float, workers: int) -> None:
+    import chromadb
+    from chroma_manager import store_graph_nodes_in_chroma
+    from embedding_cache import EmbeddingCache
+    from main import parse_project_folder
+    from pipeline import index_project
+    from benchmarks.bench_stages import StubEmbeddingProvider
+
+    class SlowStubProvider(StubEmbeddingProvider):
+        def embed(self, texts: List[str]) -> List[List[float]]:
+            time.sleep(latency)
+            return super().embed(texts)
+
+    provider = SlowStubProvider()
+    target = chromadb.EphemeralClient().create_collection("bench_streaming")
+    options = dict(embedder=provider, target_collection=target, cache=EmbeddingCache(":memory:"),
+                   model_name=provider.model_name)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    if variant == "batch":
+        G, _ = parse_project_folder(root, "java", workers=workers)
+        store_graph_nodes_in_chroma(G, **options)
+    else:
+        G, _ = index_project(root, "java", workers=workers, writer_options=options, stream=True)
+    elapsed = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    print(json.dumps({"variant": variant, "seconds": elapsed, "peak_rss_kib": peak,
+                      "nodes": G.number_of_nodes(), "stored": target.count()}))
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=500)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--variant", choices=["batch", "streaming"], help=argparse.SUPPRESS)
+    ap.add_argument("--root", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.variant:
+        _measure(args.variant, args.root, args.latency_ms / 1000, args.workers)
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        write_project(root, args.files)
+        results = {}
+        for variant in ("batch", "streaming"):
+            out = subprocess.run([sys.executable, "-m", "benchmarks.bench_streaming_pipeline",
+                                  "--variant", variant, "--root", root, "--workers", str(args.workers),
+                                  "--latency-ms", str(args.latency_ms)],
+                                 check=True, capture_output=True, text=True).stdout
+            results[variant] = json.loads(out.strip().splitlines()[-1])
+
+    print(f"files: {args.files}, graph nodes: {results['batch']['nodes']}, "
+          f"simulated latency: {args.latency_ms:.0f} ms/request")
+    for variant, r in results.items():
+        assert r["stored"] == r["nodes"], r
+        print(f"{variant:9}: {r['seconds']:7.2f}s  peak rss +{r['peak_rss_kib'] / 1024:7.1f} MiB")
+    print(f"speedup: {results['batch']['seconds'] / results['streaming']['seconds']:.2f}x")
+
+if __name__ == "__main__":
+    main()
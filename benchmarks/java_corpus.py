@@ -0,0 +1,82 @@
+"""
+Deterministic synthetic Java sources for the benchmarks.
+
+The same seed and sizes always produce byte-identical files, so timings from
+different runs and branches are comparable.
+"""
+import os
+import random
+from typing import List
+
+def generate_java_source(file_index: int, classes: int = 2, methods_per_class: int = 8,
+                         calls_per_method: int = 4, seed: int = 42, nesting: int = 0,
+                         inner_classes: int = 0) -> str:
+    """
+    Return the source of one synthetic Java compilation unit.
+
+    nesting wraps each method's calls in that many nested if/for blocks;
+    inner_classes adds that many static nested classes to every class, each
+    with methods calling back into the outer class.
+    """
+    rng = random.Random(seed * 1_000_003 + file_index)
+    lines = [f"package com.bench.p{file_index % 10};", ""]
+    for i in range(3):
+        lines.append(f"import com.bench.p{(file_index + i + 1) % 10}.Service{i};")
+    lines.append("")
+
+    for c in range(classes):
+        cls_name = f"C{file_index}_{c}"
+        lines.append(f"public class {cls_name} {{")
+        lines.append("    private Helper helper;")
+        lines.append(f"    public {cls_name}() {{ this.init(); }}")
+        for m in range(methods_per_class):
+            lines.append(f"    public int m{m}(int a, String b) {{")
+            lines.append("        int total = a;")
+            indent = "        "
+            for depth in range(nesting):
+                if depth % 2 == 0:
+                    lines.append(f"{indent}if (a > {depth}) {{")
+                else:
+                    lines.append(f"{indent}for (int i{depth} = 0; i{depth} < a; i{depth}++) {{")
+                indent += "    "
+            for _ in range(calls_per_method):
+                target = rng.randrange(methods_per_class)
+                kind = rng.randrange(3)
+                if kind == 0:
+                    lines.append(f"{indent}total += this.m{target}(a, b);")
+                elif kind == 1:
+                    lines.append(f"{indent}total += helper.compute{target}(b.length());")
+                else:
+                    lines.append(f"{indent}total += m{target}(total, String.valueOf(a));")
+            for _ in range(nesting):
+                indent = indent[:-4]
+                lines.append(f"{indent}}}")
+            lines.append("        return total;")
+            lines.append("    }")
+        for k in range(inner_classes):
+            lines.append(f"    public static class Inner{k} {{")
+            lines.append(f"        private final {cls_name} outer = new {cls_name}();")
+            for m in range(max(1, methods_per_class // 2)):
+                lines.append(f"        public int run{m}(int a) {{")
+                lines.append("            int total = a;")
+                for _ in range(calls_per_method):
+                    lines.append(f"            total += outer.m{rng.randrange(methods_per_class)}(total, \"x\");")
+                lines.append("            return total;")
+                lines.append("        }")
+            lines.append("    }")
+        lines.append("    private void init() { }")
+        lines.append("}")
+        lines.append("")
+    return "\n".join(lines)
+
+def write_project(root: str, files: int, **kwargs) -> List[str]:
+    """Write `files` synthetic sources under root and return their paths."""
+    paths = []
+    for i in range(files):
+        pkg_dir = os.path.join(root, "com", "bench", f"p{i % 10}")
+        os.makedirs(pkg_dir, exist_ok=True)
+        path = os.path.join(pkg_dir, f"File{i}.java")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(generate_java_source(i, **kwargs))
+        paths.append(path)
+    return paths
@@ -0,0 +1,357 @@
+import random
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import networkx as nx
+
+# Independent random orderings behind each node's interval labels; more
+# rule out more unreachable pairs without a search, at a build cost each.
+LABEL_DIMENSIONS = 3
+# Above this share of the graph, an update rebuilds every label (with fresh
+# depth-first orderings, which keep them tight) instead of patching them.
+FULL_REBUILD_SHARE = 0.5
+
+class CallReachability:
+    """
+    Reachability index over the 'calls' edges of a code graph, for
+    change-impact questions: which methods transitively call X, what does
+    X reach, how does A end up calling B, and how many callers or callees a
+    method has directly and transitively.
+
+    Strongly connected components (recursive groups) are condensed, and
+    each component gets LABEL_DIMENSIONS interval labels (GRAIL style):
+    for each of a few depth-first orderings of the nodes, the lowest and
+    highest rank among everything the component reaches. If A reaches B,
+    B's labels lie inside A's, so most unreachable pairs are ruled out in
+    constant time. Pairs inside A's depth-first subtree are confirmed in
+    constant time too, and the rest are settled by a search that never
+    enters a node whose labels exclude the target. Listing callers or
+    callees walks integer adjacency sets, in time proportional to the
+    answer.
+
+    update() patches the index after the graph changed, relabelling only the
+    nodes upstream of the edges that changed.
+    """
+
+    def __init__(self, dimensions: int = LABEL_DIMENSIONS, seed: int = 0):
+        self.dimensions = dimensions
+        self.seed = seed
+        self.ids: Dict[Any, int] = {}
+        self.names: Dict[int, Any] = {}
+        self.succ: Dict[int, Set[int]] = {}
+        self.pred: Dict[int, Set[int]] = {}
+        self.ranks: Dict[int, Tuple[int, ...]] = {}
+        self.labels: Dict[int, Tuple[int, ...]] = {}
+        self.subtree: Dict[int, int] = {}
+        self.recursive: Set[int] = set()
+        self._edges: Set[Tuple[Any, Any]] = set()
+        self._next_id = 0
+        self._next_rank = 0
+        self._subtrees_valid = False
+
+    @classmethod
+    def from_graph(cls, G: nx.DiGraph, **kwargs) -> "CallReachability":
+        index = cls(**kwargs)
+        for node in G:
+            index._add_node(node)
+        for u, v in _call_edges(G):
+            index._add_edge(u, v)
+        index.rebuild()
+        return index
+
+    def rebuild(self) -> None:
+        """Rank every node afresh and recompute every label."""
+        rng = random.Random(self.seed)
+        nodes = list(self.succ)
+        orderings = []
+        for d in range(self.dimensions):
+            if d:
+                rng.shuffle(nodes)
+            ranks, subtree = _postorder(nodes, self.succ, shuffle=rng if d else None)
+            orderings.append(ranks)
+            if not d:
+                self.subtree = subtree
+        self.ranks = {v: tuple(ranks[v] for ranks in orderings) for v in self.succ}
+        self._next_rank = len(nodes)
+        self._subtrees_valid = True
+        self.labels.clear()
+        self.recursive.clear()
+        self._relabel(list(self.succ))
+
+    def update(self, G: nx.DiGraph) -> Dict[str, int]:
+        """
+        Bring the index in line with G after it changed, e.g. after
+        update_graph_for_files. Returns the numbers of edges added and
+        removed and of nodes relabelled.
+        """
+        edges = _call_edges(G)
+        added_edges = edges - self._edges
+        removed_edges = self._edges - edges
+        added_nodes = [n for n in G if n not in self.ids]
+        removed_nodes = [n for n in self.ids if n not in G]
+
+        for u, v in removed_edges:
+            self._remove_edge(u, v)
+        for node in removed_nodes:
+            i = self.ids.pop(node)
+            for table in (self.names, self.succ, self.pred, self.ranks, self.labels, self.subtree):
+                table.pop(i, None)
+            self.recursive.discard(i)
+        for node in added_nodes:
+            self._add_node(node)
+            i = self.ids[node]
+            # New nodes rank after every existing one in each ordering.
+            self.ranks[i] = (self._next_rank,) * self.dimensions
+            self.subtree[i] = self._next_rank
+            self._next_rank += 1
+        for u, v in added_edges:
+            self._add_edge(u, v)
+        if removed_edges:
+            # A removed edge may have been part of a depth-first subtree.
+            self._subtrees_valid = False
+
+        stats = {"edges_added": len(added_edges), "edges_removed": len(removed_edges)}
+        sources = [self.ids[u] for u, _ in added_edges | removed_edges if u in self.ids]
+        affected = _closure_of(sources + [self.ids[n] for n in added_nodes], self.pred)
+        if len(affected) > FULL_REBUILD_SHARE * len(self.ids):
+            self.rebuild()
+            stats["relabelled"] = len(self.ids)
+        else:
+            self._relabel(list(affected))
+            stats["relabelled"] = len(affected)
+        return stats
+
+    def calls_transitively(self, caller: Any, callee: Any) -> bool:
+        """Whether caller reaches callee through one or more calls."""
+        u, v = self.ids[caller], self.ids[callee]
+        if u == v:
+            return u in self.recursive
+        if not self._may_reach(u, v):
+            return False
+        if self._subtrees_valid and self.subtree[u] <= self.ranks[v][0] < self.ranks[u][0]:
+            return True
+        seen = {u}
+        stack = [u]
+        while stack:
+            for w in self.succ[stack.pop()]:
+                if w == v:
+                    return True
+                if w not in seen and self._may_reach(w, v):
+                    seen.add(w)
+                    stack.append(w)
+        return False
+
+    def transitive_callees(self, node: Any) -> List[Any]:
+        """Every node node reaches through one or more calls (itself only when recursive)."""
+        return [self.names[i] for i in _reachable(self.ids[node], self.succ)]
+
+    def transitive_callers(self, node: Any) -> List[Any]:
+        """Every node reaching node through one or more calls (itself only when recursive)."""
+        return [self.names[i] for i in _reachable(self.ids[node], self.pred)]
+
+    def fan_out(self, node: Any, transitive: bool = False) -> int:
+        """Distinct nodes node calls, directly or transitively."""
+        i = self.ids[node]
+        return len(_reachable(i, self.succ)) if transitive else len(self.succ[i])
+
+    def fan_in(self, node: Any, transitive: bool = False) -> int:
+        """Distinct nodes calling node, directly or transitively."""
+        i = self.ids[node]
+        return len(_reachable(i, self.pred)) if transitive else len(self.pred[i])
+
+    def shortest_call_path(self, source: Any, target: Any) -> Optional[List[Any]]:
+        """
+        A shortest chain of calls from source to target, both included, or
+        None. The search only enters nodes whose labels admit target.
+        """
+        s, t = self.ids[source], self.ids[target]
+        if s == t:
+            return [source]
+        if not self._may_reach(s, t):
+            return None
+        parents = {s: s}
+        queue = deque([s])
+        while queue:
+            v = queue.popleft()
+            for w in self.succ[v]:
+                if w in parents or (w != t and not self._may_reach(w, t)):
+                    continue
+                parents[w] = v
+                if w == t:
+                    path = [t]
+                    while path[-1] != s:
+                        path.append(parents[path[-1]])
+                    return [self.names[i] for i in reversed(path)]
+                queue.append(w)
+        return None
+
+    def _may_reach(self, u: int, v: int) -> bool:
+        """False only if u certainly does not reach v: v's labels must lie within u's."""
+        lu, lv = self.labels[u], self.labels[v]
+        for k in range(0, len(lu), 2):
+            if lv[k] < lu[k] or lv[k + 1] > lu[k + 1]:
+                return False
+        return True
+
+    def _relabel(self, nodes: List[int]) -> None:
+        """
+        Recompute the labels of nodes, which must include every node that
+        can reach one of them (so no cycle leaves the set); the labels of
+        other nodes are used as they are.
+        """
+        dims = range(self.dimensions)
+        for component in _tarjan(nodes, self.succ):
+            members = set(component)
+            low = [min(self.ranks[v][d] for v in component) for d in dims]
+            high = [max(self.ranks[v][d] for v in component) for d in dims]
+            for v in component:
+                for w in self.succ[v]:
+                    if w in members:
+                        continue
+                    label = self.labels[w]
+                    for d in dims:
+                        if label[2 * d] < low[d]:
+                            low[d] = label[2 * d]
+                        if label[2 * d + 1] > high[d]:
+                            high[d] = label[2 * d + 1]
+            label = tuple(x for d in dims for x in (low[d], high[d]))
+            cyclic = len(component) > 1 or component[0] in self.succ[component[0]]
+            for v in component:
+                self.labels[v] = label
+                if cyclic:
+                    self.recursive.add(v)
+                else:
+                    self.recursive.discard(v)
+
+    def _add_node(self, node: Any) -> None:
+        i = self._next_id
+        self._next_id += 1
+        self.ids[node] = i
+        self.names[i] = node
+        self.succ[i] = set()
+        self.pred[i] = set()
+
+    def _add_edge(self, u: Any, v: Any) -> None:
+        self._edges.add((u, v))
+        self.succ[self.ids[u]].add(self.ids[v])
+        self.pred[self.ids[v]].add(self.ids[u])
+
+    def _remove_edge(self, u: Any, v: Any) -> None:
+        self._edges.discard((u, v))
+        self.succ[self.ids[u]].discard(self.ids[v])
+        self.pred[self.ids[v]].discard(self.ids[u])
+
+def _call_edges(G: nx.DiGraph) -> Set[Tuple[Any, Any]]:
+    return {(u, v) for u, v, relation in G.edges(data="relation") if relation == "calls"}
+
+def _reachable(start: int, edges: Dict[int, Set[int]]) -> List[int]:
+    """Nodes reachable from start through one or more edges, in breadth-first order."""
+    seen: Set[int] = set()
+    found: List[int] = []
+    frontier = [start]
+    while frontier:
+        layer = []
+        for v in frontier:
+            new = edges[v] - seen
+            if new:
+                seen |= new
+                layer.extend(new)
+        found.extend(layer)
+        frontier = layer
+    return found
+
+def _closure_of(start: Iterable[int], edges: Dict[int, Set[int]]) -> Set[int]:
+    """start and every node reachable from it over edges."""
+    seen = set(start)
+    stack = list(seen)
+    while stack:
+        for w in edges[stack.pop()]:
+            if w not in seen:
+                seen.add(w)
+                stack.append(w)
+    return seen
+
+def _postorder(nodes: List[int], edges: Dict[int, Set[int]],
+               shuffle: Optional[random.Random] = None) -> Tuple[Dict[int, int], Dict[int, int]]:
+    """
+    Depth-first post-order ranks of every node, starting from nodes in the
+    given order (children in random order with shuffle), and for each node
+    the lowest rank in its depth-first subtree.
+    """
+    rank: Dict[int, int] = {}
+    subtree: Dict[int, int] = {}
+    visited: Set[int] = set()
+    for root in nodes:
+        if root in visited:
+            continue
+        visited.add(root)
+        work = [(root, _children(edges[root], shuffle), len(rank))]
+        while work:
+            v, children, first = work[-1]
+            for w in children:
+                if w not in visited:
+                    visited.add(w)
+                    work.append((w, _children(edges[w], shuffle), len(rank)))
+                    break
+            else:
+                work.pop()
+                subtree[v] = first
+                rank[v] = len(rank)
+    return rank, subtree
+
+def _children(children: Set[int], shuffle: Optional[random.Random]):
+    if shuffle is None:
+        return iter(children)
+    ordered = list(children)
+    shuffle.shuffle(ordered)
+    return iter(ordered)
+
+def _tarjan(nodes: List[int], edges: Dict[int, Set[int]]) -> List[List[int]]:
+    """
+    Strongly connected components of the graph induced by nodes, sinks
+    first (each component after every component it reaches). Iterative, so
+    deep call chains do not hit the recursion limit.
+    """
+    inside = set(nodes)
+    index: Dict[int, int] = {}
+    low: Dict[int, int] = {}
+    on_stack: Set[int] = set()
+    stack: List[int] = []
+    components: List[List[int]] = []
+    counter = 0
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(edges[root]))]
+        while work:
+            v, children = work[-1]
+            for w in children:
+                if w not in inside:
+                    continue
+                if w not in index:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack.add(w)
+                    work.append((w, iter(edges[w])))
+                    break
+                if w in on_stack and index[w] < low[v]:
+                    low[v] = index[w]
+            else:
+                work.pop()
+                if work and low[v] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[v]
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        component.append(w)
+                        if w == v:
+                            break
+                    components.append(component)
+    return components
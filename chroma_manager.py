@@ -1,74 +1,538 @@
 
-import chromadb
-import google.generativeai as genai
 import networkx as nx
-from typing import List, Dict, Any
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable, Optional, Set, Tuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dotenv import load_dotenv
 import os
+import random
+import threading
+import time
 
-load_dotenv()
+from document_builder import Document, estimate_tokens, node_documents
+from graph_builder import build_adjacency, bounded_bfs
+from embedding_cache import EmbeddingCache, document_key
+from embedding_providers import EmbeddingProvider, GeminiEmbeddingProvider, get_embedding_provider
+from identifier_index import IdentifierIndex, fuse_rankings, graph_index
+from metrics import count, observe, timer
 
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+load_dotenv()
 
 EMBED_MODEL = "gemini-embedding-001"
+# Which provider indexes and queries use: "gemini" (remote) or "hashing" (local CPU).
+EMBEDDING_PROVIDER = os.environ.get("EMBEDDING_PROVIDER", "gemini")
+EMBED_BATCH_SIZE = 64
+EMBED_CONCURRENCY = 4
+EMBED_RETRIES = 4
+
+# An embedder takes a batch of texts and returns one vector per text, in order.
+Embedder = Callable[[List[str]], List[List[float]]]
+
+gemini_provider = GeminiEmbeddingProvider(EMBED_MODEL)
+embedding_provider = gemini_provider if EMBEDDING_PROVIDER == "gemini" else get_embedding_provider(EMBEDDING_PROVIDER)
 
 def embed_with_gemini(text: str) -> List[float]:
     """Return embedding vector for given text using Gemini embeddings."""
-    resp = genai.embed_content(model=EMBED_MODEL, content=text)
-    return resp["embedding"]
+    return gemini_provider([text])[0]
+
+def embed_texts_with_gemini(texts: List[str]) -> List[List[float]]:
+    """Return embedding vectors for a batch of texts in a single Gemini request."""
+    return gemini_provider(texts)
+
+class RateLimiter:
+    """Thread-safe limiter that spaces requests evenly to stay under requests_per_minute."""
+
+    def __init__(self, requests_per_minute: Optional[float] = None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self) -> None:
+        """Block until the caller may send its next request."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def embed_batch_with_retry(embedder: Embedder, texts: List[str], limiter: RateLimiter,
+                           retries: int = EMBED_RETRIES, backoff: float = 1.0) -> List[List[float]]:
+    """Embed one batch, retrying failures with jittered exponential backoff."""
+    for attempt in range(retries + 1):
+        limiter.wait()
+        try:
+            count("embed_requests")
+            with timer("embed_request"):
+                vectors = embedder(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"embedder returned {len(vectors)} vectors for {len(texts)} texts")
+            observe("embed_batch_size", len(texts))
+            return vectors
+        except Exception:
+            count("embed_request_errors")
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
 
 # By default, chromadb.Client() creates an in-memory, ephemeral database.
 # To persist the database to disk, use PersistentClient and specify a path.
-chroma_client = chromadb.PersistentClient(path="chroma_db")
+CHROMA_PATH = "chroma_db"
 COLLECTION_NAME = "java_code_graph_treesitter_01"
-collection = chroma_client.get_or_create_collection(COLLECTION_NAME)
 
-def store_graph_nodes_in_chroma(G: nx.DiGraph, namespace: str = None):
+def collection_name_for(provider: EmbeddingProvider) -> str:
+    """Collections are per provider; Gemini keeps the original name."""
+    if provider.name == "gemini":
+        return COLLECTION_NAME
+    return f"{COLLECTION_NAME}_{provider.name}"
+
+# (collection name, collection id, model, dimension) combinations already checked
+# against a collection labelled with its model, so queries do not check again.
+_checked_collections: Set[Tuple[str, Any, str, Optional[int]]] = set()
+_checked_collections_lock = threading.Lock()
+
+def check_collection_provider(target, provider_model: str, dimension: Optional[int] = None,
+                              record: bool = True) -> None:
+    """
+    Make sure target only ever holds vectors from one embedding model and dimension.
+
+    With record (the store path) the model and dimension are written to the
+    collection metadata the first time they are known; a mismatch raises
+    ValueError instead of mixing incompatible vectors. Unlabelled
+    collections that already hold vectors were built before providers
+    existed, i.e. with Gemini. A combination that passed against a
+    collection whose model is known is not checked again.
+    """
+    key = (target.name, getattr(target, "id", None), provider_model, dimension)
+    with _checked_collections_lock:
+        if key in _checked_collections:
+            return
+    meta = dict(target.metadata or {})
+    recorded_model = meta.get("embedding_model")
+    if recorded_model is None and target.count() > 0:
+        recorded_model = EMBED_MODEL
+    if recorded_model is not None and recorded_model != provider_model:
+        raise ValueError(f"Collection {target.name} was built with {recorded_model}, not {provider_model}")
+    recorded_dim = meta.get("embedding_dimension")
+    if recorded_dim is not None and dimension is not None and recorded_dim != dimension:
+        raise ValueError(f"Collection {target.name} holds {recorded_dim}-d vectors, got {dimension}-d")
+
+    if record:
+        updated = dict(meta, embedding_model=provider_model)
+        if dimension is not None:
+            updated["embedding_dimension"] = dimension
+        if updated != meta:
+            target.modify(metadata=updated)
+        recorded_model = provider_model
+    if recorded_model is not None:
+        with _checked_collections_lock:
+            _checked_collections.add(key)
+
+# chromadb takes over a second to import, so the client and collection are
+# only opened by the first run that actually reads or writes vectors.
+_chroma_client = None
+_collection = None
+_chroma_lock = threading.Lock()
+
+def get_chroma_client():
+    """Return the persistent Chroma client in CHROMA_PATH, opening it on first use."""
+    global _chroma_client
+    with _chroma_lock:
+        if _chroma_client is None:
+            import chromadb
+            _chroma_client = chromadb.PersistentClient(path=CHROMA_PATH)
+        return _chroma_client
+
+def get_collection():
+    """Return the collection for the configured embedding provider, creating it on first use."""
+    global _collection
+    client = get_chroma_client()
+    with _chroma_lock:
+        if _collection is None:
+            _collection = client.get_or_create_collection(collection_name_for(embedding_provider))
+        return _collection
+
+def __getattr__(name: str) -> Any:
+    # chroma_client and collection used to be module attributes opened at import.
+    if name == "chroma_client":
+        return get_chroma_client()
+    if name == "collection":
+        return get_collection()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+EMBEDDING_CACHE_PATH = "embedding_cache.sqlite3"
+_embedding_cache: Optional[EmbeddingCache] = None
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the on-disk embedding cache shared by this process, opening it on first use."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH)
+    return _embedding_cache
+
+def store_graph_nodes_in_chroma(G: nx.DiGraph, namespace: str = None, embedder: Optional[Embedder] = None,
+                                batch_size: int = EMBED_BATCH_SIZE, concurrency: int = EMBED_CONCURRENCY,
+                                requests_per_minute: Optional[float] = None, target_collection=None,
+                                cache: Optional[EmbeddingCache] = None, model_name: Optional[str] = None,
+                                prune: bool = True,
+                                documents: Optional[Callable[[Any, Dict[str, Any]], List[Document]]] = None) -> Dict[str, int]:
     """
     For each node in the graph, generate embedding for node code + metadata and store it to ChromaDB.
+
+    documents turns a node into its Chroma records and defaults to
+    document_builder.node_documents: classes are stored as a signature
+    summary and long methods as several overlapping chunks.
+
+    Every document is content-addressed by a hash of the embedding model and
+    its exact text, stored in its metadata as 'doc_hash'. Nodes whose hash
+    already matches the collection are skipped entirely; the rest are looked
+    up in the local embedding cache and only misses are sent to the embedder.
+    With prune, vectors for nodes no longer in G are deleted.
+
+    Misses are embedded batch_size at a time, with up to concurrency
+    batches in flight, retried with backoff and kept under
+    requests_per_minute. Each batch is written with a single upsert as soon
+    as its embeddings arrive. A batch that still fails is not written and
+    counted as failed, so it is embedded again on the next run; vectors of
+    another model or dimension than the collection's raise ValueError.
+    target_collection defaults
+    to the module's collection and cache to get_embedding_cache().
+    embedder defaults to the configured embedding_provider. model_name
+    identifies it in the content hash and the collection metadata; it
+    defaults to the embedder's model_name attribute or EMBED_MODEL.
+
+    Nodes whose file changed since they were parsed have no documents (see
+    node_documents); they are counted as stale and their stored vectors are
+    kept, not pruned, until the file is parsed again.
+
+    Returns the run's counts of documents: unchanged, hits, misses, deleted,
+    failed, and the bytes_sent and (estimated) tokens_sent to the embedder;
+    and of stale nodes.
     """
+    writer = ChromaNodeWriter(embedder, batch_size, concurrency, requests_per_minute,
+                              target_collection, cache, model_name, documents)
     for node, data in G.nodes(data=True):
-        node_type = data.get("type", "unknown")
-        code = data.get("code", "")
-        class_name = data.get("class_name", "")
-        document_text = f"Type: {node_type}\nID: {node}\nClass: {class_name}\nCode:\n{code}"
-        
-        try:
-            embedding = embed_with_gemini(document_text)
-        except Exception as e:
-            print(f"Embedding failed for node {node}: {e}")
-            embedding = []
-
-        metadata = {
-            "node": str(node),
-            "type": node_type,
-            "class": class_name
-        }
-        
-        try:
-            collection.add(
-                ids=[str(node)],
-                documents=[document_text],
-                embeddings=[embedding] if embedding else None,
-                metadatas=[metadata]
-            )
-        except Exception as e:
-            print(f"Chroma add error for node {node}: {e}")
+        writer.add(node, data)
+    return writer.finish(prune=prune)
+
+class ChromaNodeWriter:
+    """
+    Embeds and stores graph nodes in ChromaDB as they are added, a batch at a time.
+
+    add() takes one node at a time, so nodes can be stored while the rest of
+    the graph is still being built; finish() flushes the rest and returns
+    the run's counts (see store_graph_nodes_in_chroma for how nodes are
+    skipped, cached and retried). Once 2 * concurrency batches are waiting
+    for embeddings, add() blocks until one completes. A node added again
+    replaces the earlier version, even one still being embedded.
+
+    A node may be stored as several documents (chunks, see
+    document_builder.node_documents); when its first chunk changes, chunks
+    left over from a longer earlier version of the node are deleted.
+    """
+
+    def __init__(self, embedder: Optional[Embedder] = None, batch_size: int = EMBED_BATCH_SIZE,
+                 concurrency: int = EMBED_CONCURRENCY, requests_per_minute: Optional[float] = None,
+                 target_collection=None, cache: Optional[EmbeddingCache] = None, model_name: Optional[str] = None,
+                 documents: Optional[Callable[[Any, Dict[str, Any]], List[Document]]] = None):
+        self.target = target_collection if target_collection is not None else get_collection()
+        self.cache = cache if cache is not None else get_embedding_cache()
+        self.embedder = embedder or embedding_provider
+        self.model_name = model_name or getattr(self.embedder, "model_name", EMBED_MODEL)
+        self.documents = documents or node_documents
+        check_collection_provider(self.target, self.model_name, getattr(self.embedder, "dimension", None))
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = 2 * max(1, concurrency)
+        self.stats = {"unchanged": 0, "hits": 0, "misses": 0, "deleted": 0, "failed": 0,
+                      "bytes_sent": 0, "tokens_sent": 0, "stale": 0}
+        self._limiter = RateLimiter(requests_per_minute)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+        # (id, document, metadata, sequence number) records not yet looked up.
+        self._pending: List[Tuple[str, str, Dict[str, Any], int]] = []
+        self._in_flight: Dict[Future, List[Tuple[str, str, Dict[str, Any], int]]] = {}
+        # Sequence number of the latest version of every node id added.
+        self._latest: Dict[str, int] = {}
+        # Nodes added without documents because their file changed; pruning keeps their vectors.
+        self._stale: Set[str] = set()
+        self._added = 0
+        self._dimension_checked = False
+
+    def add(self, node: Any, data: Dict[str, Any]) -> None:
+        """Queue the documents of one graph node for storing."""
+        documents = self.documents(node, data)
+        if not documents:
+            self.stats["stale"] += 1
+            self._stale.add(str(node))
+            return
+        self._stale.discard(str(node))
+        for doc_id, document_text, metadata in documents:
+            metadata["doc_hash"] = document_key(self.model_name, document_text)
+            self._added += 1
+            self._latest[doc_id] = self._added
+            self._pending.append((doc_id, document_text, metadata, self._added))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """Skip unchanged pending nodes, write cache hits and send the misses to be embedded."""
+        if not self._pending:
+            return
+        batch = list({record[0]: record for record in self._pending}.values())
+        self._pending = []
+
+        with timer("fetch_stored_hashes"):
+            stored_hashes = fetch_stored_hashes_for(self.target, [record[0] for record in batch])
+        records = []
+        for record in batch:
+            if stored_hashes.get(record[0]) == record[2]["doc_hash"]:
+                self.stats["unchanged"] += 1
+            else:
+                records.append(record)
+
+        cached = self.cache.get_many(meta["doc_hash"] for _, _, meta, _ in records)
+        hits = [r for r in records if r[2]["doc_hash"] in cached]
+        misses = [r for r in records if r[2]["doc_hash"] not in cached]
+        self.stats["hits"] += len(hits)
+        self.stats["misses"] += len(misses)
+        self._delete_extra_chunks([meta for _, _, meta, _ in records if meta.get("chunk") == 0])
+
+        if hits:
+            self._check_dimension(len(cached[hits[0][2]["doc_hash"]]))
+            self._upsert(hits, [cached[meta["doc_hash"]] for _, _, meta, _ in hits])
+        if misses:
+            while len(self._in_flight) >= self.max_in_flight:
+                self._collect(block=True)
+            texts = [doc for _, doc, _, _ in misses]
+            sent_bytes = sum(len(text.encode("utf-8")) for text in texts)
+            sent_tokens = sum(estimate_tokens(text) for text in texts)
+            self.stats["bytes_sent"] += sent_bytes
+            self.stats["tokens_sent"] += sent_tokens
+            count("embed_bytes_sent", sent_bytes)
+            count("embed_tokens_sent", sent_tokens)
+            future = self._pool.submit(embed_batch_with_retry, self.embedder, texts, self._limiter)
+            self._in_flight[future] = misses
+        self._collect(block=False)
+
+    def finish(self, prune: bool = True) -> Dict[str, int]:
+        """
+        Store everything still pending and return the counts. With prune,
+        vectors for ids that were never added are deleted from the collection.
+        """
+        self.flush()
+        while self._in_flight:
+            self._collect(block=True)
+        self._pool.shutdown()
+
+        if prune:
+            with timer("fetch_stored_hashes"):
+                stale = [node_id for node_id in fetch_stored_hashes(self.target)
+                         if node_id not in self._latest and node_id.split("#chunk")[0] not in self._stale]
+            for i in range(0, len(stale), self.batch_size):
+                with timer("chroma_delete"):
+                    self.target.delete(ids=stale[i:i + self.batch_size])
+            self.stats["deleted"] = len(stale)
+
+        stats = self.stats
+        for name in ("unchanged", "hits", "misses", "deleted", "failed", "stale"):
+            count(f"nodes_{name}", stats[name])
+        print("Stored graph nodes into ChromaDB collection:", self.target.name)
+        print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['unchanged']} unchanged, {stats['deleted']} deleted")
+        print(f"Sent {stats['bytes_sent']} bytes (~{stats['tokens_sent']} tokens) to the embedder")
+        if stats["stale"]:
+            print(f"Skipped {stats['stale']} nodes whose files changed since they were parsed")
+        return stats
+
+    def _collect(self, block: bool) -> None:
+        """Cache and upsert finished batches; with block, wait for at least one."""
+        if block:
+            done = wait(self._in_flight, return_when=FIRST_COMPLETED).done
+        else:
+            done = [future for future in self._in_flight if future.done()]
+        for future in done:
+            batch = self._in_flight.pop(future)
+            try:
+                embeddings = future.result()
+            except Exception as e:
+                # Nothing is written, so the nodes are embedded again on the next run.
+                print(f"Embedding failed for batch of {len(batch)} nodes starting at {batch[0][0]}: {e}")
+                self.stats["failed"] += len(batch)
+                continue
+            # A model or dimension mismatch raises rather than mixing vectors in one collection.
+            self._check_dimension(len(embeddings[0]))
+            self.cache.put_many((meta["doc_hash"], vector) for (_, _, meta, _), vector in zip(batch, embeddings))
+            self._upsert(batch, embeddings)
+
+    def _delete_extra_chunks(self, first_chunks: List[Dict[str, Any]]) -> None:
+        """Delete the stored chunks numbered past the new chunk count of each node, given its first chunk's metadata."""
+        by_count: Dict[int, List[str]] = {}
+        for meta in first_chunks:
+            by_count.setdefault(meta.get("chunks", 1), []).append(meta["node"])
+        for chunks, nodes in by_count.items():
             try:
-                collection.add(
-                    ids=[str(node)],
-                    documents=[document_text],
-                    metadatas=[metadata]
-                )
-            except Exception as e2:
-                print(f"Failed fallback add for node {node}: {e2}")
-
-    print("Stored graph nodes into ChromaDB collection:", COLLECTION_NAME)
-
-def semantic_search(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-    """Search the collection by embedding the query and asking Chroma for nearest docs."""
-    q_emb = embed_with_gemini(query)
-    results = collection.query(query_embeddings=[q_emb], n_results=top_k)
+                with timer("chroma_delete"):
+                    self.target.delete(where={"$and": [{"node": {"$in": nodes}}, {"chunk": {"$gte": chunks}}]})
+            except Exception as e:
+                print(f"Chroma delete error for chunks of {nodes[0]}: {e}")
+
+    def _check_dimension(self, dimension: int) -> None:
+        if not self._dimension_checked:
+            check_collection_provider(self.target, self.model_name, dimension)
+            self._dimension_checked = True
+
+    def _upsert(self, batch: List[Tuple[str, str, Dict[str, Any], int]], embeddings: List[List[float]]) -> None:
+        """Upsert the records of batch that are still the latest version of their node."""
+        keep = [i for i, record in enumerate(batch) if self._latest[record[0]] == record[3]]
+        if keep:
+            upsert_batch(self.target, [batch[i][:3] for i in keep], [embeddings[i] for i in keep])
+
+def upsert_batch(target, batch: List[Tuple[str, str, Dict[str, Any]]], embeddings: List[List[float]]) -> None:
+    """Write one batch of (id, document, metadata) records with a single upsert."""
+    try:
+        with timer("chroma_upsert"):
+            target.upsert(
+                ids=[node_id for node_id, _, _ in batch],
+                documents=[doc for _, doc, _ in batch],
+                embeddings=embeddings,
+                metadatas=[meta for _, _, meta in batch]
+            )
+    except Exception as e:
+        print(f"Chroma upsert error for batch starting at {batch[0][0]}: {e}")
+
+def fetch_stored_hashes_for(target, ids: List[str]) -> Dict[str, Optional[str]]:
+    """Map whichever of ids are in the collection to the doc_hash they were stored with."""
+    page = target.get(ids=ids, include=["metadatas"])
+    found = page.get("ids") or []
+    return {node_id: (meta or {}).get("doc_hash")
+            for node_id, meta in zip(found, page.get("metadatas") or [None] * len(found))}
+
+def fetch_stored_hashes(target, page_size: int = 5000) -> Dict[str, Optional[str]]:
+    """Map every id in the collection to the doc_hash it was stored with (None if unknown)."""
+    hashes: Dict[str, Optional[str]] = {}
+    offset = 0
+    while True:
+        page = target.get(include=["metadatas"], limit=page_size, offset=offset)
+        ids = page.get("ids") or []
+        for node_id, meta in zip(ids, page.get("metadatas") or [None] * len(ids)):
+            hashes[node_id] = (meta or {}).get("doc_hash")
+        if len(ids) < page_size:
+            return hashes
+        offset += page_size
+
+# Most recent query embeddings kept in memory, keyed by (model, query).
+QUERY_CACHE_SIZE = 256
+_query_embeddings: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+_query_embeddings_lock = threading.Lock()
+
+def embed_query(query: str, target, provider: Optional[EmbeddingProvider] = None) -> List[float]:
+    """
+    Embed a query with the provider the target collection was built with.
+    The last QUERY_CACHE_SIZE query embeddings are kept, so a repeated
+    question is not sent to the provider again.
+    """
+    provider = provider or embedding_provider
+    key = (provider.model_name, query)
+    with _query_embeddings_lock:
+        q_emb = _query_embeddings.get(key)
+        if q_emb is not None:
+            _query_embeddings.move_to_end(key)
+    if q_emb is None:
+        count("query_embed_misses")
+        q_emb = provider([query])[0]
+        with _query_embeddings_lock:
+            _query_embeddings[key] = q_emb
+            while len(_query_embeddings) > QUERY_CACHE_SIZE:
+                _query_embeddings.popitem(last=False)
+    else:
+        count("query_embed_hits")
+    check_collection_provider(target, provider.model_name, len(q_emb), record=False)
+    return q_emb
+
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+# In hybrid mode each ranking is this many times top_k deep before fusion.
+HYBRID_DEPTH = 3
+# Vector queries ask for this many times the results needed, as several
+# chunks of one method may be among the nearest documents.
+CHUNK_OVERFETCH = 2
+
+def _nearest_nodes(results: Dict[str, Any], limit: int) -> List[Tuple[int, str]]:
+    """
+    (position in results, node id) of the best-ranked document of each
+    node in a Chroma query result, at most limit of them, best first.
+    """
+    ids = results["ids"][0]
+    metadatas = (results.get("metadatas") or [[]])[0] or [None] * len(ids)
+    seen = set()
+    nearest = []
+    for i, (doc_id, meta) in enumerate(zip(ids, metadatas)):
+        node = (meta or {}).get("node", doc_id)
+        if node not in seen:
+            seen.add(node)
+            nearest.append((i, node))
+            if len(nearest) == limit:
+                break
+    return nearest
+
+def rank_nodes(query: str, target, top_k: int, provider: Optional[EmbeddingProvider] = None,
+               mode: str = "vector", index: Optional[IdentifierIndex] = None) -> List[Tuple[str, float]]:
+    """
+    The top_k node ids for query, best first, each with a score (higher is better).
+
+    vector: nodes of the nearest documents in target to the query embedding, scored 1 / (1 + distance)
+    lexical: BM25 over the identifier index; the embedder is not called
+    hybrid: both rankings fused with reciprocal rank fusion
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+    if mode != "vector" and index is None:
+        raise ValueError(f"Search mode {mode!r} needs an IdentifierIndex")
+    depth = top_k * HYBRID_DEPTH if mode == "hybrid" else top_k
+
+    lexical: List[Tuple[str, float]] = []
+    if mode != "vector":
+        with timer("lexical_query"):
+            lexical = [(str(node), score) for node, score in index.search(query, top_k=depth)]
+        if mode == "lexical":
+            return lexical
+
+    with timer("query_embed"):
+        query_emb = embed_query(query, target, provider)
+    with timer("vector_query"):
+        results = target.query(query_embeddings=[query_emb], n_results=depth * CHUNK_OVERFETCH,
+                               include=["metadatas", "distances"])
+    distances = (results.get("distances") or [[]])[0] or [0.0] * len(results["ids"][0])
+    vector = [(node, 1.0 / (1.0 + distances[i])) for i, node in _nearest_nodes(results, depth)]
+    if mode == "vector":
+        return vector
+    return fuse_rankings([lexical, vector])[:top_k]
+
+def semantic_search(query: str, top_k: int = 5, provider: Optional[EmbeddingProvider] = None,
+                    mode: str = "vector", index: Optional[IdentifierIndex] = None) -> List[Dict[str, Any]]:
+    """
+    Search the collection by embedding the query and asking Chroma for nearest docs.
+
+    mode 'lexical' ranks with index (an IdentifierIndex) instead, without
+    calling the embedder, and 'hybrid' fuses both rankings; see rank_nodes.
+    """
+    collection = get_collection()
+    if mode != "vector":
+        ranked = rank_nodes(query, collection, top_k, provider, mode, index)
+        found = collection.get(ids=[node for node, _ in ranked]) if ranked else {"ids": []}
+        stored = {i: (d, m) for i, d, m in zip(found["ids"], found.get("documents") or [],
+                                               found.get("metadatas") or [])}
+        return [{"id": node, "document": stored.get(node, (None, None))[0],
+                 "metadata": stored.get(node, (None, None))[1], "score": score} for node, score in ranked]
+
+    q_emb = embed_query(query, collection, provider)
+    results = collection.query(query_embeddings=[q_emb], n_results=top_k * CHUNK_OVERFETCH)
+    # Keep the best chunk of each node, reported under the node's id.
+    nearest = _nearest_nodes(results, top_k)
+    for key in ("ids", "documents", "metadatas", "distances"):
+        if results.get(key):
+            results[key] = [[results[key][0][i] for i, _ in nearest]]
+    results["ids"] = [[node for _, node in nearest]]
     matches = []
     docs_list = results.get("documents", [])
     metadatas_list = results.get("metadatas", [])
@@ -95,35 +559,62 @@ def semantic_search(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         })
     return matches
 
-def semantic_graph_search(query, G, collection, depth=2, top_k=3):
+def semantic_graph_search(query, G, collection, depth=2, top_k=3, provider=None, relations=None,
+                          max_per_hop=50, max_nodes=100, adjacency=None, mode="vector", index=None):
     """
     query: user query
     G: NetworkX Java code graph
     collection: ChromaDB or vector store
     depth: how many graph hops to expand
     top_k: top results from semantic search
+    provider: embedding provider for the query (defaults to embedding_provider)
+    relations: edge relations to follow, e.g. ("calls",); all if None
+    max_per_hop: most new nodes taken at each hop
+    max_nodes: most nodes returned in total, seeds included
+    adjacency: graph_builder.build_adjacency(G), to reuse across queries
+    mode: how seeds are found: 'vector', 'lexical' or 'hybrid' (see rank_nodes)
+    index: IdentifierIndex for the lexical modes (defaults to identifier_index.graph_index(G))
+
+    Results are ranked by graph distance from their seed and then by the
+    seed's similarity to the query; each carries 'distance', 'seed' and
+    'score' alongside the document.
     """
-    query_emb = embed_with_gemini(query)
-    results = collection.query(query_embeddings=[query_emb], n_results=top_k)
-    initial_nodes = [r for r in results["ids"][0]]
+    if mode != "vector" and index is None:
+        index = graph_index(G)
+    ranked = rank_nodes(query, collection, top_k, provider, mode, index)
+    return expand_seeds(ranked, G, collection, depth, relations, max_per_hop, max_nodes, adjacency)
 
-    expanded_nodes = set(initial_nodes)
+def expand_seeds(ranked: List[Tuple[str, float]], G: nx.DiGraph, collection, depth: int = 2,
+                 relations=None, max_per_hop: int = 50, max_nodes: int = 100, adjacency=None) -> List[Dict[str, Any]]:
+    """
+    The graph-expansion half of semantic_graph_search: the nodes within depth
+    hops of the ranked (node, score) seeds, with their stored documents,
+    ranked the same way.
+    """
+    initial_nodes = [node for node, _ in ranked]
+    seed_scores = dict(ranked)
+
+    with timer("graph_expand"):
+        if adjacency is None:
+            adjacency = build_adjacency(G)
+        reached = bounded_bfs(adjacency, initial_nodes, depth, relations=relations,
+                              max_per_hop=max_per_hop, max_nodes=max_nodes)
+    # Seeds missing from the graph are still returned, as before.
     for node in initial_nodes:
-        if node in G:
-            for _ in range(depth):
-                neighbors = list(G.successors(node)) + list(G.predecessors(node))
-                expanded_nodes.update(neighbors)
-                for n2 in list(neighbors):
-                    neighbors2 = list(G.successors(n2)) + list(G.predecessors(n2))
-                    expanded_nodes.update(neighbors2)
-
-    expanded_results = collection.get(ids=list(expanded_nodes))
+        reached.setdefault(node, (0, node))
+
+    with timer("vector_get"):
+        expanded_results = collection.get(ids=list(reached))
     docs = expanded_results["documents"]
     metas = expanded_results["metadatas"]
     ids = expanded_results["ids"]
 
-    enriched = [
-        {"id": i, "document": d, "metadata": m}
-        for i, d, m in zip(ids, docs, metas)
-    ]
+    enriched = []
+    for i, d, m in zip(ids, docs, metas):
+        distance, seed = reached[i]
+        enriched.append({
+            "id": i, "document": d, "metadata": m,
+            "distance": distance, "seed": seed, "score": seed_scores.get(seed, 0.0) / (1 + distance)
+        })
+    enriched.sort(key=lambda r: (r["distance"], -seed_scores.get(r["seed"], 0.0)))
     return enriched
@@ -0,0 +1,106 @@
+from typing import Any, Dict, List, Tuple
+
+from element_records import node_code
+from tree_sitter_parser import CLASS_TYPES, get_parser, summarize_class
+
+# Rough bytes per token of source code, for budgeting without a tokenizer.
+BYTES_PER_TOKEN = 4
+# Methods estimated above this many tokens are stored as overlapping chunks.
+METHOD_TOKEN_BUDGET = 512
+# Tokens each chunk repeats from the end of the one before it.
+CHUNK_OVERLAP_TOKENS = 64
+
+# A Chroma record: (id, document, metadata).
+Document = Tuple[str, str, Dict[str, Any]]
+
+def estimate_tokens(text: str) -> int:
+    """Approximate number of embedding-model tokens in text."""
+    return -(-len(text.encode("utf-8")) // BYTES_PER_TOKEN)
+
+def chunk_id(node: Any, index: int) -> str:
+    """Chroma id of a node's index-th chunk; the first chunk keeps the node's own id."""
+    return str(node) if index == 0 else f"{node}#chunk{index}"
+
+def node_documents(node: Any, data: Dict[str, Any], token_budget: int = METHOD_TOKEN_BUDGET,
+                   overlap: int = CHUNK_OVERLAP_TOKENS) -> List[Document]:
+    """
+    The Chroma records for a graph node.
+
+    A class is described by a signature-level summary, as its methods are
+    stored as nodes of their own: the one made during extraction (the
+    node's 'summary'), else class_summary of its code. A method estimated
+    over token_budget tokens is split into chunks overlapping by about
+    overlap tokens (split_code). Every record's metadata names its node, its chunk
+    number and the node's number of chunks, so search hits on any chunk
+    map back to the node.
+
+    No records if the node's code is needed but its file has changed since
+    it was parsed (node_code is None): the file must be parsed again first.
+    """
+    node_type = data.get("type", "unknown")
+    class_name = data.get("class_name", "")
+    summary = data.get("summary") if node_type == "class" else None
+    code = node_code(data) if summary is None else None
+    if summary is None and code is None:
+        return []
+    if node_type == "class":
+        label, chunks = "Summary", [summary if summary is not None else class_summary(code)]
+    elif node_type == "method":
+        label, chunks = "Code", split_code(code, token_budget, overlap)
+    else:
+        label, chunks = "Code", [code]
+
+    documents = []
+    for i, chunk in enumerate(chunks):
+        part = f" (part {i + 1} of {len(chunks)})" if len(chunks) > 1 else ""
+        text = f"Type: {node_type}\nID: {node}\nClass: {class_name}\n{label}{part}:\n{chunk}"
+        metadata = {"node": str(node), "type": node_type, "class": class_name,
+                    "chunk": i, "chunks": len(chunks)}
+        documents.append((chunk_id(node, i), text, metadata))
+    return documents
+
+def split_code(code: str, token_budget: int = METHOD_TOKEN_BUDGET, overlap: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """
+    code as one chunk if it fits token_budget, otherwise as chunks of whole
+    lines of at most token_budget tokens, each starting with the last
+    overlap tokens' worth of lines of the one before. Lines longer than
+    the budget are cut into pieces first.
+    """
+    if estimate_tokens(code) <= token_budget:
+        return [code]
+    piece = max(1, token_budget * BYTES_PER_TOKEN)
+    lines = []
+    for line in code.splitlines(keepends=True):
+        if estimate_tokens(line) > token_budget:
+            lines.extend(line[i:i + piece] for i in range(0, len(line), piece))
+        else:
+            lines.append(line)
+    sizes = [estimate_tokens(line) for line in lines]
+
+    chunks = []
+    start = 0
+    while True:
+        end, size = start, 0
+        while end < len(lines) and (end == start or size + sizes[end] <= token_budget):
+            size += sizes[end]
+            end += 1
+        chunks.append("".join(lines[start:end]))
+        if end == len(lines):
+            return chunks
+        back, kept = end, 0
+        while back > start + 1 and kept + sizes[back - 1] <= overlap:
+            back -= 1
+            kept += sizes[back]
+        start = back
+
+def class_summary(code: str, language: str = "java") -> str:
+    """
+    A signature-level summary of the class declared in code (see
+    tree_sitter_parser.summarize_class), parsing code to find it. Falls
+    back to code if no class declaration is found in it.
+    """
+    data = code.encode("utf-8")
+    root = get_parser(language).parse(data).root_node
+    declaration = next((child for child in root.named_children if child.type in CLASS_TYPES), None)
+    summary = summarize_class(declaration, data) if declaration is not None else None
+    return code if summary is None else summary
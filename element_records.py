@@ -0,0 +1,192 @@
+import sys
+from typing import Any, Dict, Optional
+
+from source_store import source_text
+
+class ElementRecord:
+    """
+    Compact record of one extracted element: its kind, names and byte span.
+
+    Records use __slots__ and never hold tree-sitter nodes or copies of
+    their code. `code` is read on demand from `source` (the encoded text of
+    an in-memory parse, shared by every record of that file) or, for records
+    of project files, from the memory-mapped `file`. `digest` is the hash of
+    the file contents the record was parsed from; once the file differs,
+    `code` is None rather than a slice of the new contents.
+
+    Records also answer the dict-style access of the original element
+    dicts (record["name"], record.get("class"), record["code"]).
+    """
+
+    __slots__ = ("file", "start_byte", "end_byte", "source", "digest")
+    # dict key -> attribute name
+    KEYS: Dict[str, str] = {}
+
+    def __init__(self, file: Optional[str], start_byte: int, end_byte: int, source: Optional[bytes] = None):
+        self.file = file
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+        self.source = source
+        self.digest: Optional[str] = None
+
+    @property
+    def code(self) -> Optional[str]:
+        if self.source is not None:
+            return self.source[self.start_byte:self.end_byte].decode("utf-8", errors="replace")
+        if self.file is None:
+            return ""
+        return source_text(self.file, self.start_byte, self.end_byte, self.digest)
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "code":
+            return self.code
+        try:
+            return getattr(self, self.KEYS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self.KEYS:
+            raise KeyError(key)
+        setattr(self, self.KEYS[key], value)
+
+    def __contains__(self, key: str) -> bool:
+        return key == "code" or key in self.KEYS
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def detach(self, file: str, digest: Optional[str] = None) -> None:
+        """Point the record at file on disk (with contents of digest) and drop the in-memory source."""
+        self.file = file
+        self.source = None
+        self.digest = digest
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain, JSON-serialisable form (without code)."""
+        return {key: getattr(self, attr) for key, attr in self.KEYS.items() if key != "id"}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ElementRecord":
+        record = cls.__new__(cls)
+        record.source = None
+        record.digest = None
+        for key, attr in cls.KEYS.items():
+            if key != "id":
+                setattr(record, attr, data.get(key))
+        if record.file is not None:
+            record.file = sys.intern(record.file)
+        return record
+
+    def __eq__(self, other: Any) -> bool:
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{k}={v!r}" for k, v in self.to_dict().items())
+        return f"{type(self).__name__}({fields})"
+
+class ClassRecord(ElementRecord):
+    """
+    A class, interface or enum declaration. `summary` is its signature-level
+    summary (tree_sitter_parser.summarize_class), made while the tree is at
+    hand so documents need not re-parse the class.
+    """
+
+    __slots__ = ("name", "kind", "summary")
+    KEYS = {"name": "name", "kind": "kind", "file": "file", "start_byte": "start_byte", "end_byte": "end_byte",
+            "summary": "summary"}
+
+    def __init__(self, name: str, kind: str, file: Optional[str], start_byte: int, end_byte: int,
+                 source: Optional[bytes] = None, summary: Optional[str] = None):
+        super().__init__(file, start_byte, end_byte, source)
+        self.name = name
+        self.kind = kind
+        self.summary = summary
+
+class MethodRecord(ElementRecord):
+    """A method or constructor declaration; `id` is '<class>.<name>'."""
+
+    __slots__ = ("class_name", "name", "kind")
+    KEYS = {"class": "class_name", "name": "name", "id": "id", "kind": "kind", "file": "file",
+            "start_byte": "start_byte", "end_byte": "end_byte"}
+
+    def __init__(self, class_name: str, name: str, kind: str, file: Optional[str], start_byte: int,
+                 end_byte: int, source: Optional[bytes] = None):
+        super().__init__(file, start_byte, end_byte, source)
+        self.class_name = class_name
+        self.name = name
+        self.kind = kind
+
+    @property
+    def id(self) -> str:
+        return f"{self.class_name}.{self.name}"
+
+class CallRecord(ElementRecord):
+    """A method invocation made from within `caller`."""
+
+    __slots__ = ("caller", "call", "qualifier")
+    KEYS = {"caller": "caller", "call": "call", "qualifier": "qualifier", "file": "file",
+            "start_byte": "start_byte", "end_byte": "end_byte"}
+
+    def __init__(self, caller: Optional[str], call: str, qualifier: Optional[str], file: Optional[str],
+                 start_byte: int, end_byte: int, source: Optional[bytes] = None):
+        super().__init__(file, start_byte, end_byte, source)
+        self.caller = caller
+        self.call = call
+        self.qualifier = qualifier
+
+RECORD_TYPES = {"classes": ClassRecord, "methods": MethodRecord, "method_calls": CallRecord}
+
+def elements_to_dict(elements: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-serialisable copy of an elements dict."""
+    out = {}
+    for key, items in elements.items():
+        if key in RECORD_TYPES:
+            out[key] = [item.to_dict() for item in items]
+        else:
+            out[key] = items
+    return out
+
+def elements_from_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of elements_to_dict."""
+    out = {}
+    for key, items in data.items():
+        if key in RECORD_TYPES:
+            out[key] = [RECORD_TYPES[key].from_dict(item) for item in items]
+        else:
+            out[key] = items
+    return out
+
+def set_digest(elements: Dict[str, Any], digest: Optional[str]) -> None:
+    """Record digest as the contents every record of a file's elements was parsed from."""
+    for key in RECORD_TYPES:
+        for record in elements.get(key, ()):
+            record.digest = digest
+
+def node_code(data: Dict[str, Any]) -> Optional[str]:
+    """
+    Source code of a graph node, loaded on demand.
+
+    Nodes built from records carry a byte span of their file (or of the
+    shared in-memory source) and the digest of the contents it was taken
+    from; placeholder nodes and graphs built from plain dicts carry their
+    code inline. None if the file changed since the node was parsed, so a
+    stale span is never shown or embedded: the file must be parsed again.
+    """
+    if "code" in data:
+        return data["code"]
+    start, end = data.get("start_byte"), data.get("end_byte")
+    if start is None:
+        return ""
+    source = data.get("source")
+    if source is not None:
+        return source[start:end].decode("utf-8", errors="replace")
+    if data.get("file"):
+        return source_text(data["file"], start, end, data.get("digest"))
+    return ""
+
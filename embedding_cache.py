@@ -0,0 +1,130 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+def document_key(model: str, document_text: str) -> str:
+    """Content address of an embedding: hash of the model name and the exact document text."""
+    return hashlib.sha256(f"{model}\0{document_text}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Local, size-bounded store of embedding vectors keyed by document_key.
+
+    Vectors are kept as float32 blobs in SQLite. Their total size is kept
+    in a cache_meta row, updated in the same transaction as every write,
+    so a put only looks at the vectors it replaces; when the total exceeds
+    max_bytes the least recently used entries are evicted. hits and
+    misses count lookups since the cache was opened (see reset_stats).
+    Pass ":memory:" as path for a throwaway cache. A cache may be shared
+    between threads; its operations are serialized.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # Caches written before the total was kept are summed once.
+        self._conn.execute("INSERT OR IGNORE INTO cache_meta (key, value)"
+                           " SELECT 'size_bytes', COALESCE(SUM(size), 0) FROM embeddings")
+        self._conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Return the cached vectors for whichever of keys are present, counting hits and misses."""
+        keys = list(keys)
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # Stay under SQLite's host-parameter limit.
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, List[float]]]) -> None:
+        """Store vectors, then evict old entries if the cache grew past max_bytes."""
+        now = time.time()
+        rows = {}
+        for key, vector in items:
+            blob = array("f", vector).tobytes()
+            rows[key] = (key, blob, len(blob), now)
+        if not rows:
+            return
+        with self._lock:
+            # Lock the database before reading the sizes being replaced, so the total stays exact
+            # when another process writes the same cache.
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                keys = list(rows)
+                replaced = 0
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    replaced += self._conn.execute(
+                        f"SELECT COALESCE(SUM(size), 0) FROM embeddings WHERE key IN ({placeholders})", chunk
+                    ).fetchone()[0]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)",
+                    rows.values()
+                )
+                self._add_size(sum(row[2] for row in rows.values()) - replaced)
+            if self.size_bytes() > self.max_bytes:
+                self.evict()
+
+    def evict(self) -> int:
+        """Drop least recently used vectors until the total size fits max_bytes; return how many."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            total = self.size_bytes()
+            stale = []
+            freed = 0
+            if total > self.max_bytes:
+                for key, size in self._conn.execute("SELECT key, size FROM embeddings ORDER BY last_used ASC"):
+                    if total - freed <= self.max_bytes:
+                        break
+                    stale.append((key,))
+                    freed += size
+                self._conn.executemany("DELETE FROM embeddings WHERE key = ?", stale)
+                self._add_size(-freed)
+        return len(stale)
+
+    def size_bytes(self) -> int:
+        """Total size of the stored vectors, from the running total."""
+        with self._lock:
+            return self._conn.execute("SELECT value FROM cache_meta WHERE key = 'size_bytes'").fetchone()[0]
+
+    def _add_size(self, delta: int) -> None:
+        self._conn.execute("UPDATE cache_meta SET value = value + ? WHERE key = 'size_bytes'", (delta,))
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,147 @@
+import abc
+import os
+import re
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+class EmbeddingProvider(abc.ABC):
+    """
+    A named embedding model that turns a batch of texts into vectors.
+
+    Providers are callable with a list of texts, so they can be passed
+    wherever chroma_manager expects an embedder. model_name identifies the
+    exact model and settings: vectors are only comparable when it matches.
+    dimension may be None until the first batch has been embedded.
+    Subclasses implement embed.
+    """
+
+    name = "base"
+    model_name = "base"
+    dimension: Optional[int] = None
+
+    @abc.abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """One vector per text, in order."""
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.embed(texts)
+        if vectors and self.dimension is None:
+            self.dimension = len(vectors[0])
+        return vectors
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    """Remote Gemini embeddings. The client is configured on first use, not at import."""
+
+    name = "gemini"
+
+    def __init__(self, model: str = "gemini-embedding-001", api_key: Optional[str] = None):
+        self.model_name = model
+        self.api_key = api_key
+        self._genai = None
+
+    def _client(self):
+        if self._genai is None:
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key or os.environ.get("GEMINI_API_KEY"))
+            self._genai = genai
+        return self._genai
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        resp = self._client().embed_content(model=self.model_name, content=texts)
+        return resp["embedding"]
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_$][A-Za-z0-9_$]*")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+def split_identifier(identifier: str) -> List[str]:
+    """Split a camelCase / snake_case identifier into lower-case words: 'getHTTPResponse' -> get, http, response."""
+    return [part.lower() for part in _CAMEL_RE.findall(identifier)]
+
+@lru_cache(maxsize=1 << 16)
+def identifier_words(identifier: str) -> Tuple[str, ...]:
+    """An identifier lower-cased, followed by the words it is made of if they differ from it."""
+    lowered = identifier.lower()
+    parts = split_identifier(identifier)
+    if len(parts) > 1 or (parts and parts[0] != lowered):
+        return (lowered, *parts)
+    return (lowered,)
+
+def identifier_counts(text: str) -> Counter:
+    """How many times each identifier occurs in text."""
+    return Counter(_IDENTIFIER_RE.findall(text))
+
+def identifier_tokens(text: str) -> List[str]:
+    """Every identifier in text, lower-cased, followed by the words it is made of."""
+    tokens = []
+    for ident in _IDENTIFIER_RE.findall(text):
+        tokens.extend(identifier_words(ident))
+    return tokens
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Local CPU embeddings from hashed identifier tokens and character n-grams.
+
+    Each text is reduced to its identifiers, their camelCase words and the
+    character n-grams of those words, which are hashed (stable across
+    processes) into `dimension` signed buckets. Counts are log-scaled and the
+    rows L2-normalised, so cosine similarity reflects shared vocabulary. No
+    network or model download is involved.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimension: int = 512, ngram: int = 3):
+        self.dimension = dimension
+        self.ngram = ngram
+        self.model_name = f"hashing-d{dimension}-n{ngram}-v1"
+        self._buckets: Dict[str, Tuple[int, float]] = {}
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        bucket = self._buckets.get(feature)
+        if bucket is None:
+            h = zlib.crc32(feature.encode("utf-8"))
+            bucket = (h % self.dimension, 1.0 if (h >> 31) & 1 else -1.0)
+            if len(self._buckets) < 1_000_000:
+                self._buckets[feature] = bucket
+        return bucket
+
+    def features(self, text: str) -> List[str]:
+        feats = identifier_tokens(text)
+        n = self.ngram
+        for word in list(feats):
+            if len(word) > n:
+                padded = f"<{word}>"
+                feats.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return feats
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self.features(text):
+                col, sign = self._bucket(feature)
+                rows.append(row)
+                cols.append(col)
+                signs.append(sign)
+
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)),
+                  np.asarray(signs, dtype=np.float32))
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).tolist()
+
+PROVIDERS = {
+    "gemini": GeminiEmbeddingProvider,
+    "hashing": HashingEmbeddingProvider,
+}
+
+def get_embedding_provider(name: str, **kwargs) -> EmbeddingProvider:
+    """Create the provider registered under name ('gemini' or 'hashing')."""
+    if name not in PROVIDERS:
+        raise ValueError(f"Unsupported embedding provider: {name}")
+    return PROVIDERS[name](**kwargs)
@@ -1,71 +1,596 @@
-
 import networkx as nx
-from typing import Dict, Any
+from bisect import insort
+from typing import Dict, Any, Callable, Iterable, List, Optional, Set, Tuple
+
+from element_records import ElementRecord
+from identifier_index import IdentifierIndex
+from metrics import count, timer
 
-def build_graph_from_elements(elements: Dict[str, Any]) -> nx.DiGraph:
+def build_graph_from_elements(elements: Dict[str, Any], index: Optional[IdentifierIndex] = None) -> nx.DiGraph:
     """
     Build a directed graph where:
       - class nodes connect to their methods with edge 'contains'
       - method -> method edges for invocations with edge 'calls'
       - import edges: file -> import (optional)
-    Node attributes include 'type' and 'code'
+    Node attributes include 'type', 'file' and where the node's code lives
+    (a byte span, read with element_records.node_code)
+
+    With an IdentifierIndex, class and method nodes are indexed in one pass
+    once they are all added, and the index is kept in
+    G.graph['identifier_index'] so update_graph_for_files keeps it current. The FileIndex that
+    update_graph_for_files patches G with is kept in G.graph['file_index'].
     """
     G = nx.DiGraph()
+    if index is not None:
+        G.graph["identifier_index"] = index
+
+    with timer("build_graph"):
+        add_element_nodes(G, elements.get("classes", []), elements.get("methods", []))
+        if index is not None:
+            index.add_many(G.nodes(data=True))
+
+        with timer("resolve_calls"):
+            symbols = SymbolIndex(G, elements.get("file_imports", {}))
+            calls = elements.get("method_calls", [])
+            edges = [resolve_call(G, call, symbols) for call in calls]
+        count("calls_resolved", len(calls))
+        G.graph["file_index"] = FileIndex(elements, symbols, edges)
 
-    for cls in elements.get("classes", []):
-        name = cls["name"]
-        G.add_node(name, type="class", code=cls.get("code", ""))
+    return G
+
+def add_element_nodes(G: nx.DiGraph, classes: Iterable[Dict[str, Any]], methods: Iterable[Dict[str, Any]]) -> None:
+    """Add class and method nodes, plus their 'contains' edges, to G."""
+    for cls in classes:
+        G.add_node(cls["name"], type="class", file=cls.get("file"), **_code_attrs(cls))
 
-    for m in elements.get("methods", []):
+    for m in methods:
         mid = m["id"]
-        G.add_node(mid, type="method", code=m.get("code", ""), class_name=m.get("class"))
+        G.add_node(mid, type="method", class_name=m.get("class"), file=m.get("file"), **_code_attrs(m))
         cls_name = m.get("class")
         if cls_name:
             G.add_edge(cls_name, mid, relation="contains")
 
-    for call in elements.get("method_calls", []):
-        caller = call.get("caller")
-        callee_name = call.get("call")
+def _code_attrs(element: Any) -> Dict[str, Any]:
+    """Node attributes locating an element's code without copying it."""
+    if not isinstance(element, ElementRecord):
+        # Plain element dicts carry their code inline.
+        return {"code": element.get("code", "")}
+    attrs = {"start_byte": element.start_byte, "end_byte": element.end_byte}
+    if element.source is not None:
+        attrs["source"] = element.source
+    if element.digest is not None:
+        attrs["digest"] = element.digest
+    if getattr(element, "summary", None) is not None:
+        attrs["summary"] = element.summary
+    return attrs
+
+class SymbolIndex:
+    """
+    Lookup tables over the class and method nodes of a graph, used to resolve calls
+    without scanning every node.
+
+    methods_by_name: method simple name -> method node ids, in project order
+    methods_by_class: class name -> {method simple name -> method node id}
+    methods_by_file: (file, method simple name) -> method node ids, in project order
+    classes_by_file: file -> class names declared in it
+    file_imports: file -> simple names made visible by its imports
+
+    Ambiguous calls resolve to the first candidate in project order, which
+    is G's node order when G was built in one go. FileIndex keeps that
+    order when it patches the tables with add_method and remove_method.
+    """
+
+    def __init__(self, G: nx.DiGraph, file_imports: Optional[Dict[str, List[str]]] = None):
+        self.methods_by_name: Dict[str, List[str]] = {}
+        self.methods_by_class: Dict[str, Dict[str, str]] = {}
+        self.methods_by_file: Dict[Tuple[Optional[str], str], List[str]] = {}
+        self.classes_by_file: Dict[Optional[str], Set[str]] = {}
+        self.classes: Set[str] = set()
+        self.file_imports: Dict[str, Set[str]] = {}
+
+        for n, data in G.nodes(data=True):
+            node_type = data.get("type")
+            if node_type == "method":
+                name = n.rsplit(".", 1)[-1]
+                self.methods_by_name.setdefault(name, []).append(n)
+                self.methods_by_class.setdefault(data.get("class_name"), {}).setdefault(name, n)
+                self.methods_by_file.setdefault((data.get("file"), name), []).append(n)
+            elif node_type == "class":
+                self.add_class(n, data)
+
+        for path, imports in (file_imports or {}).items():
+            self.set_imports(path, imports)
+
+    def set_imports(self, path: str, imports: Optional[List[str]]) -> None:
+        """Record the imports of path (None drops the file)."""
+        if imports is None:
+            self.file_imports.pop(path, None)
+            return
+        visible = set()
+        for imp in imports:
+            # 'a.b.C' imports C; a static 'a.b.C.m' also makes C visible.
+            parts = imp.split(".")
+            visible.update(parts[-2:])
+        self.file_imports[path] = visible
+
+    def add_class(self, n: str, data: Dict[str, Any]) -> None:
+        self.classes.add(n)
+        self.classes_by_file.setdefault(data.get("file"), set()).add(n)
+
+    def remove_class(self, n: str, data: Dict[str, Any]) -> None:
+        self.classes.discard(n)
+        declared = self.classes_by_file.get(data.get("file"))
+        if declared is not None:
+            declared.discard(n)
+            if not declared:
+                del self.classes_by_file[data.get("file")]
+
+    def add_method(self, n: str, data: Dict[str, Any], key: Callable[[str], Any]) -> None:
+        """Add a method node; key(method id) sorts method ids in project order."""
+        name = n.rsplit(".", 1)[-1]
+        insort(self.methods_by_name.setdefault(name, []), n, key=key)
+        self.methods_by_class.setdefault(data.get("class_name"), {}).setdefault(name, n)
+        insort(self.methods_by_file.setdefault((data.get("file"), name), []), n, key=key)
+
+    def remove_method(self, n: str, data: Dict[str, Any]) -> None:
+        name = n.rsplit(".", 1)[-1]
+        for table, key in ((self.methods_by_name, name), (self.methods_by_file, (data.get("file"), name))):
+            methods = table.get(key)
+            if methods is not None and n in methods:
+                methods.remove(n)
+                if not methods:
+                    del table[key]
+        by_name = self.methods_by_class.get(data.get("class_name"))
+        if by_name is not None and by_name.get(name) == n:
+            del by_name[name]
+            if not by_name:
+                del self.methods_by_class[data.get("class_name")]
+
+    def caller_node(self, caller: str, file: Optional[str]) -> Optional[str]:
+        """Method node for a caller name, preferring a method declared in the caller's file."""
+        local = self.methods_by_file.get((file, caller))
+        if local:
+            return local[0]
+        methods = self.methods_by_name.get(caller)
+        return methods[0] if methods else None
+
+    def resolve(self, callee: str, caller_class: Optional[str], qualifier: Optional[str],
+                file: Optional[str]) -> Optional[str]:
+        """
+        Pick the method node a call most likely targets, or None.
+
+        In order of preference: a static call on a known class
+        ('Customer.find()'), a call on this/super or an unqualified call to a
+        method of the caller's class, a method of a class declared in or
+        imported by the calling file, and finally the first method with the
+        name anywhere.
+        """
+        candidates = self.methods_by_name.get(callee)
+        if not candidates:
+            return None
+
+        if qualifier and qualifier not in ("this", "super"):
+            target_class = qualifier.rsplit(".", 1)[-1]
+            if target_class in self.classes:
+                found = self.methods_by_class.get(target_class, {}).get(callee)
+                if found:
+                    return found
+        elif caller_class:
+            found = self.methods_by_class.get(caller_class, {}).get(callee)
+            if found:
+                return found
+
+        if len(candidates) > 1:
+            visible = self.classes_by_file.get(file, set()) | self.file_imports.get(file, set())
+            for c in candidates:
+                if c.rsplit(".", 1)[0] in visible:
+                    return c
+
+        return candidates[0]
+
+def resolve_call(G: nx.DiGraph, call: Dict[str, Any],
+                 index: Optional[SymbolIndex] = None) -> Optional[Tuple[str, str]]:
+    """Resolve one method call record against the nodes of G, add its 'calls' edge and return it."""
+    if index is None:
+        index = SymbolIndex(G)
+
+    caller = call.get("caller")
+    callee_name = call.get("call")
+    file = call.get("file")
+    
+    if callee_name:
+        caller_node = index.caller_node(caller, file) if caller else None
+        if caller_node is not None:
+            caller_class = G.nodes[caller_node].get("class_name")
+        elif caller in index.classes:
+            caller_class = caller
+        else:
+            caller_class = None
+
+        chosen = index.resolve(callee_name, caller_class, call.get("qualifier"), file)
         
-        if callee_name:
-            candidates = [n for n in G.nodes if G.nodes[n].get("type") == "method" and n.endswith(f".{callee_name}")]
-            chosen = None
-            
-            if caller:
-                caller_nodes = [n for n in G.nodes if n.endswith(f".{caller}") or n == caller]
-                caller_class = None
-                if caller_nodes:
-                    cn = caller_nodes[0]
-                    if G.nodes[cn].get("type") == "method":
-                        caller_class = G.nodes[cn].get("class_name")
-                    elif G.nodes[cn].get("type") == "class":
-                        caller_class = G.nodes[cn].get("name")
-                
-                for c in candidates:
-                    if caller_class and G.nodes[c].get("class_name") == caller_class:
-                        chosen = c
-                        break
-            
-            if not chosen and candidates:
-                chosen = candidates[0]
-            
-            if chosen:
-                caller_node = None
-                possible = [n for n in G.nodes if n.endswith(f".{caller}")] if caller else []
-                if possible:
-                    caller_node = possible[0]
+        if caller_node is None:
+            caller_node = caller or f"caller::{caller}"
+            if caller_node not in G:
+                G.add_node(caller_node, type="unknown", code="")
+
+        if not chosen:
+            chosen = f"unresolved::{callee_name}"
+            if chosen not in G:
+                G.add_node(chosen, type="unresolved", code="")
+        G.add_edge(caller_node, chosen, relation="calls")
+        return caller_node, chosen
+    return None
+
+def update_graph_for_files(G: nx.DiGraph, elements: Dict[str, Any],
+                           old_file_elements: Dict[str, Dict[str, Any]],
+                           new_file_elements: Dict[str, Dict[str, Any]]) -> nx.DiGraph:
+    """
+    Patch G in place after some files changed instead of rebuilding it.
+
+    elements: the merged elements of the whole project after the change
+    old_file_elements: path -> elements previously parsed from changed or deleted files
+    new_file_elements: path -> elements now parsed from changed or added files
+
+    The work is proportional to the change, not to G: see FileIndex.patch.
+    The result has the nodes, attributes and edges of a full build (only
+    the order of G's nodes differs). An identifier index kept in
+    G.graph['identifier_index'] is patched to match.
+
+    A graph without a FileIndex (e.g. one loaded from a snapshot or built
+    by the streaming pipeline) is rebuilt from elements in place instead.
+    """
+    file_index = G.graph.get("file_index")
+    if file_index is None:
+        _rebuild_in_place(G, elements)
+        return G
+    with timer("resolve_calls"):
+        resolved = file_index.patch(G, old_file_elements, new_file_elements, G.graph.get("identifier_index"))
+    count("calls_resolved", resolved)
+    return G
+
+def _rebuild_in_place(G: nx.DiGraph, elements: Dict[str, Any]) -> None:
+    """Replace G's nodes and edges with a full build of elements, keeping its identifier index."""
+    rebuilt = build_graph_from_elements(elements)
+    G.remove_nodes_from(list(G))
+    G.update(rebuilt)
+    G.graph["file_index"] = rebuilt.graph["file_index"]
+    identifiers = G.graph.get("identifier_index")
+    if identifiers is not None:
+        for node in list(identifiers.doc_length):
+            identifiers.remove(node)
+        identifiers.add_many(G.nodes(data=True))
+
+# A declaration: (path, position, record). Positions only need to be ordered within one file.
+Declaration = Tuple[str, int, Any]
+
+class FileIndex:
+    """
+    Per-file bookkeeping that lets update_graph_for_files patch a graph in
+    time proportional to the files that changed.
+
+    classes / methods: node id -> its declarations, in project order (the
+        last one sets the node's attributes, as in a full build)
+    calls: path -> [call record, the (caller, callee) edge it resolved to,
+        whether that callee is the method of the class the call names]
+    calls_by_caller: caller name -> (path, i) of its calls
+    calls_to_method: method id -> (path, i) of the calls naming its class that resolved to it
+    calls_by_callee: callee name -> (path, i) of every other call to it
+    edge_calls: 'calls' edge -> number of calls resolved to it
+    symbols: the SymbolIndex calls are resolved against, patched in place
+
+    Paths are compared as strings, which is the order parse_project_folder
+    merges files in, so sorting declarations by (path, position) gives
+    project order.
+
+    The tables are filled from the elements and edges of the full build on
+    the first patch, so builds that are never patched do not pay for them.
+    """
+
+    def __init__(self, elements: Dict[str, Any], symbols: SymbolIndex, edges: List[Optional[Tuple[str, str]]]):
+        self.symbols = symbols
+        self._build: Optional[Tuple[Dict[str, Any], List[Optional[Tuple[str, str]]]]] = (elements, edges)
+        self.classes: Dict[str, List[Declaration]] = {}
+        self.methods: Dict[str, List[Declaration]] = {}
+        self.calls: Dict[str, List[List[Any]]] = {}
+        self.calls_by_caller: Dict[str, Set[Tuple[str, int]]] = {}
+        self.calls_to_method: Dict[str, Set[Tuple[str, int]]] = {}
+        self.calls_by_callee: Dict[str, Set[Tuple[str, int]]] = {}
+        self.edge_calls: Dict[Tuple[str, str], int] = {}
+
+    def _fill(self, G: nx.DiGraph) -> None:
+        """Index the declarations and resolved calls of the full build G came from."""
+        elements, edges = self._build
+        self._build = None
+        for i, cls in enumerate(elements.get("classes", [])):
+            self.classes.setdefault(cls["name"], []).append((cls.get("file") or "", i, cls))
+        for i, m in enumerate(elements.get("methods", [])):
+            self.methods.setdefault(m["id"], []).append((m.get("file") or "", i, m))
+        for call, edge in zip(elements.get("method_calls", []), edges):
+            calls = self.calls.setdefault(call.get("file") or "", [])
+            calls.append([call, edge, _names_its_class(G, call, edge)])
+            self._index_call(call.get("file") or "", len(calls) - 1)
+
+    def patch(self, G: nx.DiGraph, old_file_elements: Dict[str, Dict[str, Any]],
+              new_file_elements: Dict[str, Dict[str, Any]], identifiers: Any = None) -> int:
+        """
+        Apply changed files to G (and identifiers) and return the number of calls resolved.
+
+        Only the declarations and calls of the changed files are replaced.
+        A call made elsewhere is resolved again only if a symbol it depends
+        on changed: the method it resolved to through the class it names
+        went away; the methods with its callee's name changed, if it did
+        not resolve that way; the method its caller resolves to changed, or
+        whether its caller names a class; or the classes declared in its
+        file changed (a class declared in several files). Every other call
+        resolves exactly as before, so its edge stays.
+        """
+        if self._build is not None:
+            self._fill(G)
+        changed = set(old_file_elements) | set(new_file_elements)
+        touched_classes: Set[str] = set()
+        touched_methods: Set[str] = set()
+        for path in changed:
+            for elems in (old_file_elements.get(path), new_file_elements.get(path)):
+                if elems:
+                    touched_classes.update(c["name"] for c in elems.get("classes", []))
+                    touched_methods.update(m["id"] for m in elems.get("methods", []))
+        names = {m.rsplit(".", 1)[-1] for m in touched_methods}
+        # Files other than the changed ones where a touched method may be (or become) the local caller.
+        local = {(d[2].get("file"), mid.rsplit(".", 1)[-1]) for mid in touched_methods
+                 for d in self.methods.get(mid, ()) if d[0] not in changed}
+        old_files = {n: G.nodes[n].get("file") for n in touched_classes if n in G}
+        before = self._symbols_of(names, local, touched_classes, touched_methods)
+
+        for table, ids in ((self.classes, touched_classes), (self.methods, touched_methods)):
+            for node in ids:
+                kept = [d for d in table.get(node, ()) if d[0] not in changed]
+                if kept:
+                    table[node] = kept
                 else:
-                    caller_node = caller or f"caller::{caller}"
-                    if caller_node not in G:
-                        G.add_node(caller_node, type="unknown", code="")
-                G.add_edge(caller_node, chosen, relation="calls")
+                    table.pop(node, None)
+        for path, elems in new_file_elements.items():
+            if elems:
+                for i, cls in enumerate(elems.get("classes", [])):
+                    insort(self.classes.setdefault(cls["name"], []), (path, i, cls), key=_declaration_key)
+                for i, m in enumerate(elems.get("methods", [])):
+                    insort(self.methods.setdefault(m["id"], []), (path, i, m), key=_declaration_key)
+
+        for path in changed:
+            elems = new_file_elements.get(path)
+            self.symbols.set_imports(path, elems.get("imports", []) if elems else None)
+        dirty: Set[Tuple[str, str]] = set()
+        for name in sorted(touched_classes, key=lambda n: _first_key(self.classes, n)):
+            self._update_node(G, name, "class", self.classes.get(name), identifiers)
+        for mid in sorted(touched_methods, key=lambda n: _first_key(self.methods, n)):
+            decls = self.methods.get(mid)
+            self._update_node(G, mid, "method", decls, identifiers)
+            if decls:
+                dirty.add((decls[-1][2].get("class"), mid))
+
+        files = set()
+        for name in touched_classes:
+            new_file = G.nodes[name].get("file") if name in G else None
+            if new_file != old_files.get(name):
+                files.update((old_files.get(name), new_file))
+        after = self._symbols_of(names, local, touched_classes, touched_methods)
+        revisit = self._affected_calls(before, after, files - changed - {None})
+        revisit = {ref for ref in revisit if ref[0] not in changed}
+
+        for path in changed:
+            for i in range(len(self.calls.get(path, ()))):
+                self._unindex_call(path, i)
+                self._drop_edge(self.calls[path][i][1], dirty)
+            self.calls.pop(path, None)
+        for path, i in revisit:
+            self._unindex_call(path, i)
+            self._drop_edge(self.calls[path][i][1], dirty)
+
+        resolved = 0
+        for path in sorted(new_file_elements):
+            elems = new_file_elements[path]
+            if elems and elems.get("method_calls"):
+                self.calls[path] = [[call, None, False] for call in elems["method_calls"]]
+                revisit.update((path, i) for i in range(len(elems["method_calls"])))
+        for path, i in revisit:
+            entry = self.calls[path][i]
+            entry[1] = edge = resolve_call(G, entry[0], self.symbols)
+            entry[2] = _names_its_class(G, entry[0], edge)
+            self._index_call(path, i)
+            resolved += 1
+
+        self._settle_edges(G, dirty)
+        return resolved
+
+    def _symbols_of(self, names: Set[str], local: Set[Tuple[Optional[str], str]], classes: Set[str],
+                    methods: Set[str]) -> Dict[str, Any]:
+        """What calls involving the touched symbols resolve through, to compare before and after a patch."""
+        symbols = self.symbols
+        return {
+            "by_name": {name: tuple(symbols.methods_by_name.get(name, ())) for name in names},
+            "local": {key: tuple(symbols.methods_by_file.get(key, ())[:1]) for key in local},
+            "classes": {name for name in classes if name in symbols.classes},
+            "methods": {mid for mid in methods if mid in symbols.methods_by_name.get(mid.rsplit(".", 1)[-1], ())},
+        }
+
+    def _affected_calls(self, before: Dict[str, Any], after: Dict[str, Any], files: Set[str]) -> Set[Tuple[str, int]]:
+        """The calls whose resolution may differ between the symbols before and after (see patch)."""
+        refs: Set[Tuple[str, int]] = set()
+        for name, methods in before["by_name"].items():
+            now = after["by_name"][name]
+            if now != methods:
+                refs.update(self.calls_by_callee.get(name, ()))
+            if now[:1] != methods[:1]:
+                refs.update(self.calls_by_caller.get(name, ()))
+        for (path, name), first in before["local"].items():
+            if after["local"][(path, name)] != first:
+                refs.update(ref for ref in self.calls_by_caller.get(name, ()) if ref[0] == path)
+        for mid in before["methods"] - after["methods"]:
+            refs.update(self.calls_to_method.get(mid, ()))
+        for name in before["classes"] ^ after["classes"]:
+            refs.update(self.calls_by_caller.get(name, ()))
+        for path in files:
+            refs.update((path, i) for i in range(len(self.calls.get(path, ()))))
+        return refs
+
+    def _index_call(self, path: str, i: int) -> None:
+        call, edge, names_its_class = self.calls[path][i]
+        if call.get("caller") is not None:
+            self.calls_by_caller.setdefault(call.get("caller"), set()).add((path, i))
+        if names_its_class:
+            self.calls_to_method.setdefault(edge[1], set()).add((path, i))
+        elif call.get("call") is not None:
+            self.calls_by_callee.setdefault(call.get("call"), set()).add((path, i))
+        if edge is not None:
+            self.edge_calls[edge] = self.edge_calls.get(edge, 0) + 1
+
+    def _unindex_call(self, path: str, i: int) -> None:
+        call, edge, names_its_class = self.calls[path][i]
+        for table, key in ((self.calls_by_caller, call.get("caller")),
+                           (self.calls_to_method if names_its_class else self.calls_by_callee,
+                            edge[1] if names_its_class else call.get("call"))):
+            refs = table.get(key)
+            if refs is not None:
+                refs.discard((path, i))
+                if not refs:
+                    del table[key]
+
+    def _drop_edge(self, edge: Optional[Tuple[str, str]], dirty: Set[Tuple[str, str]]) -> None:
+        if edge is not None:
+            self.edge_calls[edge] -= 1
+            dirty.add(edge)
+
+    def _update_node(self, G: nx.DiGraph, node: str, node_type: str, decls: Optional[List[Declaration]],
+                     identifiers: Any) -> None:
+        """Give node the attributes of its last declaration, or remove it if it has none left."""
+        data = G.nodes[node] if node in G else None
+        if data is not None and data.get("type") == node_type:
+            if node_type == "class":
+                self.symbols.remove_class(node, data)
             else:
-                unresolved = f"unresolved::{callee_name}"
-                if unresolved not in G:
-                    G.add_node(unresolved, type="unresolved", code="")
-                caller_node = caller or f"caller::{caller}"
-                if caller_node not in G:
-                    G.add_node(caller_node, type="unknown", code="")
-                G.add_edge(caller_node, unresolved, relation="calls")
+                self.symbols.remove_method(node, data)
+        if identifiers is not None:
+            identifiers.remove(node)
+        if not decls:
+            if data is not None and data.get("type") == node_type:
+                G.remove_node(node)
+            return
 
-    return G
+        record = decls[-1][2]
+        attrs = {"type": node_type}
+        if node_type == "method":
+            attrs["class_name"] = record.get("class")
+        attrs["file"] = record.get("file")
+        attrs.update(_code_attrs(record))
+        if data is None:
+            G.add_node(node, **attrs)
+        else:
+            # Also turns a placeholder for an unknown caller into the declared node.
+            data.clear()
+            data.update(attrs)
+        data = G.nodes[node]
+        if node_type == "class":
+            self.symbols.add_class(node, data)
+        else:
+            self.symbols.add_method(node, data, lambda n: _declaration_key(self.methods[n][0]))
+        if identifiers is not None:
+            identifiers.add(node, data)
+
+    def _settle_edges(self, G: nx.DiGraph, edges: Set[Tuple[str, str]]) -> None:
+        """
+        Bring edges in line with the calls resolved to them: a 'calls' edge
+        while any call resolves to it, else the class's 'contains' edge to
+        its method, else nothing. Placeholder nodes left without edges go.
+        """
+        placeholders = set()
+        for u, v in edges:
+            calls = self.edge_calls.get((u, v), 0)
+            if calls > 0:
+                G.add_edge(u, v, relation="calls")
+                continue
+            self.edge_calls.pop((u, v), None)
+            if u in G and v in G and G.nodes[v].get("type") == "method" and G.nodes[v].get("class_name") == u:
+                G.add_edge(u, v, relation="contains")
+            elif G.has_edge(u, v):
+                G.remove_edge(u, v)
+            placeholders.update((u, v))
+        for node in placeholders:
+            if node in G and G.nodes[node].get("type") in ("unknown", "unresolved") and G.degree(node) == 0:
+                G.remove_node(node)
+
+def _declaration_key(declaration: Declaration) -> Tuple[str, int]:
+    return declaration[0], declaration[1]
+
+def _names_its_class(G: nx.DiGraph, call: Dict[str, Any], edge: Optional[Tuple[str, str]]) -> bool:
+    """
+    Whether call resolved to the method of the class it names: its
+    qualifier's, or its caller's for unqualified and this/super calls.
+    SymbolIndex.resolve picks that method whenever it exists.
+    """
+    if edge is None:
+        return False
+    qualifier = call.get("qualifier")
+    if qualifier and qualifier not in ("this", "super"):
+        owner = qualifier.rsplit(".", 1)[-1]
+    else:
+        caller = G.nodes[edge[0]]
+        owner = {"method": caller.get("class_name"), "class": edge[0]}.get(caller.get("type"))
+    return edge[1] == f"{owner}.{call.get('call')}"
+
+def _first_key(table: Dict[str, List[Declaration]], node: str) -> Tuple[Any, ...]:
+    """Project-order key of node's first declaration; nodes without one sort first."""
+    decls = table.get(node)
+    return _declaration_key(decls[0]) if decls else ()
+
+# Adjacency list: node -> [(neighbour, relation)], edges followed in both directions.
+Adjacency = Dict[Any, List[Tuple[Any, str]]]
+
+def build_adjacency(G: nx.DiGraph) -> Adjacency:
+    """Precompute an undirected adjacency list of G, keeping each edge's relation."""
+    adjacency: Adjacency = {n: [] for n in G.nodes}
+    for u, v, data in G.edges(data=True):
+        relation = data.get("relation", "")
+        adjacency[u].append((v, relation))
+        adjacency[v].append((u, relation))
+    return adjacency
+
+def bounded_bfs(adjacency: Adjacency, seeds: List[Any], depth: int,
+                relations: Optional[Iterable[str]] = None, max_per_hop: Optional[int] = None,
+                max_nodes: Optional[int] = None) -> Dict[Any, Tuple[int, Any]]:
+    """
+    Breadth-first expansion from several seeds at once, up to depth hops.
+
+    Returns node -> (distance, seed) for every node reached, where seed is
+    the first seed (in the given order) to reach it. Only edges whose
+    relation is in relations are followed (all edges if None). At most
+    max_per_hop new nodes are taken per hop and max_nodes in total, so the
+    work done on hub nodes stays bounded.
+    """
+    allowed = set(relations) if relations is not None else None
+    reached: Dict[Any, Tuple[int, Any]] = {}
+    for seed in seeds:
+        if seed in adjacency and seed not in reached:
+            if max_nodes is not None and len(reached) >= max_nodes:
+                break
+            reached[seed] = (0, seed)
+
+    frontier = list(reached)
+    for distance in range(1, depth + 1):
+        next_frontier = []
+        for node in frontier:
+            seed = reached[node][1]
+            for neighbour, relation in adjacency[node]:
+                if neighbour in reached or (allowed is not None and relation not in allowed):
+                    continue
+                reached[neighbour] = (distance, seed)
+                next_frontier.append(neighbour)
+                if ((max_per_hop is not None and len(next_frontier) >= max_per_hop)
+                        or (max_nodes is not None and len(reached) >= max_nodes)):
+                    break
+            else:
+                continue
+            break
+        if not next_frontier or (max_nodes is not None and len(reached) >= max_nodes):
+            break
+        frontier = next_frontier
+    return reached
@@ -0,0 +1,369 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+from element_records import ClassRecord, MethodRecord, CallRecord
+
+# File layout (all integers little-endian):
+#   magic (8 bytes) | format version (u32) | directory length (u32) | directory (JSON)
+#   followed by 8-byte aligned sections, each a flat numpy array listed in the directory.
+# Every string (node ids, files, names, relations, inline code, summaries) is stored once in
+# a string table and referenced by its u32 index; NONE marks a missing value.
+MAGIC = b"JCGSNAP\0"
+SNAPSHOT_VERSION = 4
+NONE = 0xFFFFFFFF
+_HEADER = struct.Struct("<8sII")
+
+class SnapshotError(ValueError):
+    """The file is not a readable snapshot of this format version."""
+
+class StaleSnapshotError(SnapshotError):
+    """The snapshot was built from a different version of the sources."""
+
+def source_fingerprint(paths: Iterable[str]) -> str:
+    """Cheap fingerprint of a set of source files from their paths, mtimes and sizes."""
+    h = hashlib.sha1()
+    for path in sorted(paths):
+        try:
+            st = os.stat(path)
+            h.update(f"{path}\0{st.st_mtime_ns}\0{st.st_size}\n".encode("utf-8"))
+        except OSError:
+            h.update(f"{path}\0missing\n".encode("utf-8"))
+    return h.hexdigest()
+
+class _StringTable:
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.items: List[bytes] = []
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return NONE
+        value = str(value)
+        idx = self.index.get(value)
+        if idx is None:
+            idx = len(self.items)
+            self.index[value] = idx
+            self.items.append(value.encode("utf-8"))
+        return idx
+
+def _span(value: Optional[int]) -> int:
+    return -1 if value is None else value
+
+def save_snapshot(path: str, G: nx.DiGraph, elements: Optional[Dict[str, Any]] = None,
+                  fingerprint: Optional[str] = None) -> None:
+    """
+    Write G (and optionally its elements) to path in the binary snapshot format.
+
+    Node attributes kept: type, class_name, file, start_byte/end_byte, the
+    digest of the file contents they index, inline code and class
+    summaries; edges keep their relation. In-memory 'source' buffers are
+    not stored, so code of such nodes is only available for file-backed
+    nodes after loading.
+    """
+    strings = _StringTable()
+    nodes = list(G.nodes)
+    position = {n: i for i, n in enumerate(nodes)}
+
+    sections: Dict[str, np.ndarray] = {}
+    sections["node_id"] = np.fromiter((strings.add(n) for n in nodes), np.uint32, len(nodes))
+    node_data = [G.nodes[n] for n in nodes]
+    for attr in ("type", "class_name", "file", "digest", "code", "summary"):
+        sections[f"node_{attr}"] = np.fromiter((strings.add(d.get(attr)) for d in node_data), np.uint32, len(nodes))
+    sections["node_start"] = np.fromiter((_span(d.get("start_byte")) for d in node_data), np.int64, len(nodes))
+    sections["node_end"] = np.fromiter((_span(d.get("end_byte")) for d in node_data), np.int64, len(nodes))
+    # Node indices ordered by id bytes, for binary-search lookups without building a dict.
+    sections["node_order"] = np.array(sorted(range(len(nodes)), key=lambda i: strings.items[sections["node_id"][i]]),
+                                      dtype=np.uint32)
+
+    src = np.fromiter((position[u] for u, _ in G.edges), np.uint32, G.number_of_edges())
+    dst = np.fromiter((position[v] for _, v in G.edges), np.uint32, G.number_of_edges())
+    rel = np.fromiter((strings.add(d.get("relation")) for _, _, d in G.edges(data=True)), np.uint32,
+                      G.number_of_edges())
+    for prefix, key, other in (("out", src, dst), ("in", dst, src)):
+        order = np.argsort(key, kind="stable")
+        sections[f"{prefix}_indptr"] = np.concatenate(
+            ([0], np.cumsum(np.bincount(key, minlength=len(nodes))))).astype(np.uint64)
+        sections[f"{prefix}_indices"] = other[order]
+        sections[f"{prefix}_relation"] = rel[order]
+
+    if elements is not None:
+        _add_element_sections(sections, strings, elements)
+
+    offsets = np.zeros(len(strings.items) + 1, dtype=np.uint64)
+    np.cumsum([len(b) for b in strings.items], out=offsets[1:])
+    sections["string_offsets"] = offsets
+    sections["string_data"] = np.frombuffer(b"".join(strings.items), dtype=np.uint8)
+
+    directory = {
+        "created": time.time(),
+        "fingerprint": fingerprint,
+        "nodes": len(nodes),
+        "edges": G.number_of_edges(),
+        "has_elements": elements is not None,
+        "sections": {},
+    }
+    # Section offsets depend on the directory length, so lay them out relative
+    # to the end of the header and pad the directory to a fixed alignment.
+    layout = []
+    pos = 0
+    for name, arr in sections.items():
+        arr = np.ascontiguousarray(arr)
+        layout.append((name, arr, pos))
+        directory["sections"][name] = [pos, arr.dtype.str, int(arr.size)]
+        pos += (arr.nbytes + 7) // 8 * 8
+    dir_bytes = json.dumps(directory).encode("utf-8")
+    dir_bytes += b" " * (-(_HEADER.size + len(dir_bytes)) % 8)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, SNAPSHOT_VERSION, len(dir_bytes)))
+        f.write(dir_bytes)
+        for _, arr, offset in layout:
+            f.write(arr.tobytes())
+            f.write(b"\0" * (-arr.nbytes % 8))
+    os.replace(tmp_path, path)
+
+def _add_element_sections(sections: Dict[str, np.ndarray], strings: _StringTable, elements: Dict[str, Any]) -> None:
+    tables = {
+        "class": (elements.get("classes", []), ("name", "kind", "file", "summary")),
+        "method": (elements.get("methods", []), ("class", "name", "kind", "file")),
+        "call": (elements.get("method_calls", []), ("caller", "call", "qualifier", "file")),
+    }
+    for table, (records, fields) in tables.items():
+        for field in fields:
+            sections[f"{table}_{field}"] = np.fromiter((strings.add(r.get(field)) for r in records), np.uint32,
+                                                       len(records))
+        sections[f"{table}_digest"] = np.fromiter((strings.add(getattr(r, "digest", None)) for r in records),
+                                                  np.uint32, len(records))
+        sections[f"{table}_start"] = np.fromiter((_span(r.get("start_byte")) for r in records), np.int64, len(records))
+        sections[f"{table}_end"] = np.fromiter((_span(r.get("end_byte")) for r in records), np.int64, len(records))
+
+    # Per-file imports as CSR rows, so files without imports are kept too.
+    file_imports = elements.get("file_imports", {})
+    sections["import_file"] = np.array([strings.add(f) for f in file_imports], dtype=np.uint32)
+    sections["import_indptr"] = np.concatenate(
+        ([0], np.cumsum([len(imps) for imps in file_imports.values()]))).astype(np.uint64)
+    sections["import_path"] = np.array([strings.add(imp) for imps in file_imports.values() for imp in imps],
+                                       dtype=np.uint32)
+
+    skipped_files = elements.get("skipped_files", {})
+    sections["skipped_path"] = np.array([strings.add(p) for p in skipped_files], dtype=np.uint32)
+    sections["skipped_reason"] = np.array([strings.add(r) for r in skipped_files.values()], dtype=np.uint32)
+
+def load_snapshot(path: str, fingerprint: Optional[str] = None) -> "GraphSnapshot":
+    """
+    Memory-map a snapshot written by save_snapshot.
+
+    Raises SnapshotError for a foreign file or another format version, and
+    StaleSnapshotError when fingerprint is given and differs from the one
+    the snapshot was saved with.
+    """
+    snapshot = GraphSnapshot(path)
+    if fingerprint is not None and snapshot.fingerprint != fingerprint:
+        snapshot.close()
+        raise StaleSnapshotError(f"Snapshot {path} is stale: sources changed since it was written")
+    return snapshot
+
+class GraphSnapshot:
+    """
+    Read-only, memory-mapped view of a saved graph.
+
+    Opening only parses the header; arrays are views on the mapping and
+    strings are decoded on access. adjacency() can be passed straight to
+    graph_builder.bounded_bfs, and to_networkx()/elements() materialise the
+    full graph and element tables when needed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotError(f"{path} is empty")
+        if len(self._mm) < _HEADER.size:
+            self.close()
+            raise SnapshotError(f"{path} is not a graph snapshot")
+        magic, version, dir_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise SnapshotError(f"{path} is not a graph snapshot")
+        if version != SNAPSHOT_VERSION:
+            self.close()
+            raise SnapshotError(f"{path} has snapshot format {version}, expected {SNAPSHOT_VERSION}")
+        directory = json.loads(self._mm[_HEADER.size:_HEADER.size + dir_len])
+        base = _HEADER.size + dir_len
+
+        self.fingerprint: Optional[str] = directory["fingerprint"]
+        self.created: float = directory["created"]
+        self.num_nodes: int = directory["nodes"]
+        self.num_edges: int = directory["edges"]
+        self.has_elements: bool = directory["has_elements"]
+        self._arrays = {
+            name: np.frombuffer(self._mm, dtype=np.dtype(dtype), count=count, offset=base + offset)
+            for name, (offset, dtype, count) in directory["sections"].items()
+        }
+        self._offsets = self._arrays["string_offsets"]
+        self._data = self._arrays["string_data"]
+
+    def close(self) -> None:
+        self._arrays = {}
+        self._offsets = self._data = None
+        if getattr(self, "_mm", None) is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                # Arrays handed out to callers still reference the mapping; it is
+                # released when they are garbage collected.
+                pass
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self) -> "GraphSnapshot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def string(self, idx: int) -> Optional[str]:
+        if idx == NONE:
+            return None
+        return self._data[self._offsets[idx]:self._offsets[idx + 1]].tobytes().decode("utf-8")
+
+    def node_id(self, i: int) -> str:
+        return self.string(int(self._arrays["node_id"][i]))
+
+    def node_index(self, node_id: str) -> Optional[int]:
+        """Position of node_id, found by binary search over the sorted id order."""
+        target = str(node_id).encode("utf-8")
+        order, ids = self._arrays["node_order"], self._arrays["node_id"]
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            sid = int(ids[order[mid]])
+            if self._data[self._offsets[sid]:self._offsets[sid + 1]].tobytes() < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and self.node_id(int(order[lo])) == str(node_id):
+            return int(order[lo])
+        return None
+
+    def __contains__(self, node_id: str) -> bool:
+        return self.node_index(node_id) is not None
+
+    def node_attrs(self, i: int) -> Dict[str, Any]:
+        """Attributes of node i, in the same shape as the original graph's node data."""
+        a = self._arrays
+        attrs: Dict[str, Any] = {}
+        for attr in ("type", "class_name", "file", "digest", "code", "summary"):
+            idx = int(a[f"node_{attr}"][i])
+            if idx != NONE:
+                attrs[attr] = self.string(idx)
+        if a["node_start"][i] >= 0:
+            attrs["start_byte"] = int(a["node_start"][i])
+            attrs["end_byte"] = int(a["node_end"][i])
+        return attrs
+
+    def out_edges(self, i: int) -> Iterator[Tuple[int, Optional[str]]]:
+        return self._edges("out", i)
+
+    def in_edges(self, i: int) -> Iterator[Tuple[int, Optional[str]]]:
+        return self._edges("in", i)
+
+    def _edges(self, prefix: str, i: int) -> Iterator[Tuple[int, Optional[str]]]:
+        indptr = self._arrays[f"{prefix}_indptr"]
+        start, end = int(indptr[i]), int(indptr[i + 1])
+        indices = self._arrays[f"{prefix}_indices"][start:end]
+        relations = self._arrays[f"{prefix}_relation"][start:end]
+        for j, r in zip(indices.tolist(), relations.tolist()):
+            yield j, self.string(r)
+
+    def adjacency(self) -> "SnapshotAdjacency":
+        return SnapshotAdjacency(self)
+
+    def to_networkx(self) -> nx.DiGraph:
+        """Materialise the snapshot as the nx.DiGraph it was saved from."""
+        G = nx.DiGraph()
+        ids = [self.node_id(i) for i in range(self.num_nodes)]
+        G.add_nodes_from((ids[i], self.node_attrs(i)) for i in range(self.num_nodes))
+        indptr = self._arrays["out_indptr"]
+        src = np.repeat(np.arange(self.num_nodes), np.diff(indptr.astype(np.int64)))
+        relations = {}
+        for u, v, r in zip(src.tolist(), self._arrays["out_indices"].tolist(), self._arrays["out_relation"].tolist()):
+            if r not in relations:
+                relations[r] = self.string(r)
+            G.add_edge(ids[u], ids[v], relation=relations[r])
+        return G
+
+    def elements(self) -> Dict[str, Any]:
+        """Rebuild the elements dict (records without in-memory source) saved with the graph."""
+        if not self.has_elements:
+            raise SnapshotError(f"{self.path} was saved without elements")
+        a = self._arrays
+        s = self._cached_strings()
+
+        def column(name):
+            return [s(i) for i in a[name].tolist()]
+
+        def spans(table):
+            return zip(a[f"{table}_start"].tolist(), a[f"{table}_end"].tolist())
+
+        classes = [ClassRecord(n, k, f, st, en, summary=summary) for n, k, f, (st, en), summary in
+                   zip(column("class_name"), column("class_kind"), column("class_file"), spans("class"),
+                       column("class_summary"))]
+        methods = [MethodRecord(c, n, k, f, st, en) for c, n, k, f, (st, en) in
+                   zip(column("method_class"), column("method_name"), column("method_kind"),
+                       column("method_file"), spans("method"))]
+        calls = [CallRecord(c, n, q, f, st, en) for c, n, q, f, (st, en) in
+                 zip(column("call_caller"), column("call_call"), column("call_qualifier"),
+                     column("call_file"), spans("call"))]
+        for records, table in ((classes, "class"), (methods, "method"), (calls, "call")):
+            for record, digest in zip(records, column(f"{table}_digest")):
+                record.digest = digest
+        imports = column("import_path")
+        indptr = a["import_indptr"].tolist()
+        file_imports = {f: imports[indptr[k]:indptr[k + 1]] for k, f in enumerate(column("import_file"))}
+        return {
+            "classes": classes,
+            "methods": methods,
+            "imports": [imp for imps in file_imports.values() for imp in imps],
+            "method_calls": calls,
+            "file_imports": file_imports,
+            "skipped_files": dict(zip(column("skipped_path"), column("skipped_reason"))),
+        }
+
+    def _cached_strings(self):
+        cache: Dict[int, Optional[str]] = {}
+
+        def lookup(idx: int) -> Optional[str]:
+            if idx not in cache:
+                cache[idx] = self.string(idx)
+            return cache[idx]
+        return lookup
+
+class SnapshotAdjacency:
+    """Read-only adjacency mapping over a snapshot, shaped like graph_builder.build_adjacency()."""
+
+    def __init__(self, snapshot: GraphSnapshot):
+        self.snapshot = snapshot
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self.snapshot
+
+    def __getitem__(self, node_id: str) -> List[Tuple[str, Optional[str]]]:
+        i = self.snapshot.node_index(node_id)
+        if i is None:
+            raise KeyError(node_id)
+        snap = self.snapshot
+        return ([(snap.node_id(j), r) for j, r in snap.out_edges(i)]
+                + [(snap.node_id(j), r) for j, r in snap.in_edges(i)])
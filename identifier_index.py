@@ -0,0 +1,222 @@
+import math
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+from element_records import node_code
+from embedding_providers import identifier_counts, identifier_tokens, identifier_words
+
+# Tokens from a node's id and class count this many times more than tokens from its code.
+NAME_WEIGHT = 3
+# Added to the score of nodes whose id or simple name is exactly the query.
+EXACT_MATCH_BONUS = 1000.0
+MAX_PREFIX_EXPANSIONS = 50
+# Reciprocal rank fusion constant: higher values flatten the influence of top ranks.
+RRF_K = 60
+
+JAVA_KEYWORDS = frozenset("""
+    abstract assert boolean break byte case catch char class const continue default do double
+    else enum extends final finally float for goto if implements import instanceof int interface
+    long native new package private protected public return short static strictfp super switch
+    synchronized this throw throws transient try void volatile while true false null var
+""".split())
+
+class IdentifierIndex:
+    """
+    In-memory inverted index over the identifiers of class and method nodes.
+
+    Each node is indexed under the identifiers in its id and class name
+    (weighted NAME_WEIGHT) and in its code, each also split into its
+    camelCase words. search() ranks nodes with BM25, optionally matching
+    query words as prefixes, and puts exact id or simple-name matches
+    first. Nodes can be added and removed as the graph changes.
+
+    Each term's BM25 weights are computed once into numpy arrays the first
+    time it is queried (and again after the index changes), so a query
+    only sums a few arrays.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, index_code: bool = True):
+        self.k1 = k1
+        self.b = b
+        self.index_code = index_code
+        self.postings: Dict[str, Dict[Any, float]] = {}
+        self.doc_terms: Dict[Any, Dict[str, float]] = {}
+        self.doc_length: Dict[Any, float] = {}
+        self.total_length = 0.0
+        self.names: Dict[str, List[Any]] = {}
+        self._vocabulary: Optional[List[str]] = None
+        # Nodes by integer slot, reused after removal, and each term's (slots, weights).
+        self._slot: Dict[Any, int] = {}
+        self._nodes: List[Any] = []
+        self._free: List[int] = []
+        self._weights: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def from_graph(cls, G: nx.DiGraph, **kwargs) -> "IdentifierIndex":
+        """Index every class and method node of G."""
+        index = cls(**kwargs)
+        index.add_many(G.nodes(data=True))
+        return index
+
+    def __len__(self) -> int:
+        return len(self.doc_length)
+
+    def __contains__(self, node: Any) -> bool:
+        return node in self.doc_length
+
+    def add(self, node: Any, data: Dict[str, Any]) -> None:
+        """Index a graph node (replacing any earlier entry); other node types are ignored."""
+        self.add_many([(node, data)])
+
+    def add_many(self, nodes: Iterable[Tuple[Any, Dict[str, Any]]]) -> None:
+        """
+        Index (node, data) pairs in one pass, e.g. every node of a new graph.
+        Each distinct identifier of a node's code is split into its words
+        once, and cached term weights are dropped once for the batch.
+        """
+        added = False
+        for node, data in nodes:
+            if data.get("type") not in ("class", "method"):
+                continue
+            if node in self.doc_length:
+                self.remove(node)
+            terms = self._terms(node, data)
+            for token, tf in terms.items():
+                postings = self.postings.get(token)
+                if postings is None:
+                    postings = self.postings[token] = {}
+                    self._vocabulary = None
+                postings[node] = tf
+            self.doc_terms[node] = terms
+            self.doc_length[node] = length = sum(terms.values())
+            self.total_length += length
+            for name in _exact_names(node):
+                self.names.setdefault(name, []).append(node)
+            if self._free:
+                self._slot[node] = slot = self._free.pop()
+                self._nodes[slot] = node
+            else:
+                self._slot[node] = len(self._nodes)
+                self._nodes.append(node)
+            added = True
+        if added:
+            self._weights.clear()
+
+    def _terms(self, node: Any, data: Dict[str, Any]) -> Dict[str, float]:
+        """Term frequencies of a node: its id and class words weighted NAME_WEIGHT, then its code's."""
+        terms: Dict[str, float] = {}
+        for token in identifier_tokens(f"{node} {data.get('class_name') or ''}"):
+            terms[token] = terms.get(token, 0.0) + NAME_WEIGHT
+        if self.index_code:
+            for identifier, n in identifier_counts(node_code(data) or "").items():
+                for token in identifier_words(identifier):
+                    if token not in JAVA_KEYWORDS:
+                        terms[token] = terms.get(token, 0.0) + n
+        return terms
+
+    def remove(self, node: Any) -> None:
+        """Drop a node from the index, if present."""
+        terms = self.doc_terms.pop(node, None)
+        if terms is None:
+            return
+        for token in terms:
+            postings = self.postings[token]
+            del postings[node]
+            if not postings:
+                del self.postings[token]
+                self._vocabulary = None
+        self.total_length -= self.doc_length.pop(node)
+        for name in _exact_names(node):
+            nodes = self.names[name]
+            nodes.remove(node)
+            if not nodes:
+                del self.names[name]
+        slot = self._slot.pop(node)
+        self._nodes[slot] = None
+        self._free.append(slot)
+        self._weights.clear()
+
+    def search(self, query: str, top_k: int = 10, prefix: bool = False) -> List[Tuple[Any, float]]:
+        """
+        The top_k nodes for query as (node, score), best first. With prefix,
+        each query word also matches every indexed word it begins
+        (up to MAX_PREFIX_EXPANSIONS of them).
+        """
+        if top_k <= 0:
+            return []
+        scores = np.zeros(len(self._nodes))
+        for node in self.names.get(query.strip().lower(), ()):
+            scores[self._slot[node]] = EXACT_MATCH_BONUS
+        for term in self._query_terms(query, prefix):
+            slots, weights = self._term_weights(term)
+            scores[slots] += weights
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(self._nodes[slot], float(scores[slot])) for slot in hits]
+
+    def _term_weights(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Slots of the nodes containing term and their BM25 scores for it."""
+        cached = self._weights.get(term)
+        if cached is None:
+            postings = self.postings[term]
+            n = len(self.doc_length)
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            slots = np.fromiter((self._slot[node] for node in postings), dtype=np.int64, count=len(postings))
+            tf = np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+            lengths = np.fromiter((self.doc_length[node] for node in postings), dtype=np.float64,
+                                  count=len(postings))
+            norm = self.k1 * (1 - self.b + self.b * lengths / (self.total_length / n))
+            cached = self._weights[term] = (slots, idf * tf * (self.k1 + 1) / (tf + norm))
+        return cached
+
+    def _query_terms(self, query: str, prefix: bool) -> List[str]:
+        terms = []
+        for token in dict.fromkeys(identifier_tokens(query)):
+            if token in self.postings:
+                terms.append(token)
+            if prefix:
+                vocabulary = self._sorted_vocabulary()
+                i = bisect_left(vocabulary, token)
+                expansions = 0
+                while (i < len(vocabulary) and vocabulary[i].startswith(token)
+                       and expansions < MAX_PREFIX_EXPANSIONS):
+                    if vocabulary[i] != token:
+                        terms.append(vocabulary[i])
+                        expansions += 1
+                    i += 1
+        return list(dict.fromkeys(terms))
+
+    def _sorted_vocabulary(self) -> List[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+def _exact_names(node: Any) -> List[str]:
+    """Lower-cased strings a query must equal to be an exact match: the id and its simple name."""
+    full = str(node).lower()
+    simple = full.rsplit(".", 1)[-1]
+    return [full] if simple == full else [full, simple]
+
+def graph_index(G: nx.DiGraph) -> IdentifierIndex:
+    """
+    The identifier index of G: the one given to build_graph_from_elements
+    (kept in G.graph['identifier_index']), else built now and kept there.
+    """
+    index = G.graph.get("identifier_index")
+    if index is None:
+        index = G.graph["identifier_index"] = IdentifierIndex.from_graph(G)
+    return index
+
+def fuse_rankings(rankings: Iterable[List[Tuple[Any, float]]], k: int = RRF_K) -> List[Tuple[Any, float]]:
+    """Reciprocal rank fusion: each item scores sum(1 / (k + rank)) over the rankings it appears in."""
+    fused: Dict[Any, float] = {}
+    for ranking in rankings:
+        for rank, (item, _) in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
@@ -1,88 +1,273 @@
 
 import os
-import glob
+import time
+from concurrent.futures import ProcessPoolExecutor
 # Set gRPC log level to ERROR to avoid noisy startup logs from google-generativeai.
 # This should be done before importing the library.
 os.environ['GRPC_VERBOSITY'] = 'ERROR'
 
 import networkx as nx
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from tree_sitter_parser import parse_source
-from graph_builder import build_graph_from_elements
-from chroma_manager import store_graph_nodes_in_chroma, semantic_search, semantic_graph_search, collection
-from visualizer import visualize_graph_interactive, visualize_graph
+from tree_sitter_parser import parse_file
+from graph_builder import build_graph_from_elements, update_graph_for_files
+from parse_cache import ParseCache
+from source_discovery import find_source_files, report_skipped
+from graph_snapshot import SnapshotError, load_snapshot, save_snapshot, source_fingerprint
+from chroma_manager import store_graph_nodes_in_chroma, semantic_search, semantic_graph_search, get_collection
+from identifier_index import graph_index
+from visualizer import visualize_graph_interactive, visualize_graph, visualize_clustered_graph, collapse_graph
+from metrics import enable_metrics, get_metrics, print_metrics_report, profiled, timer, write_metrics_summary
 
-def parse_project_folder(root_folder: str, language: str) -> Tuple[nx.DiGraph, List[Dict[str, Any]]]:
+PARSE_CACHE_PATH = "parse_cache.json"
+SNAPSHOT_PATH = "code_graph.snap"
+LAYOUT_CACHE_PATH = "graph_layout.json"
+# Graphs with more nodes than this are drawn collapsed into one node per package.
+LOD_NODE_THRESHOLD = 2000
+
+def parse_project_folder(root_folder: str, language: str, workers: int = 1, chunk_size: int = 16,
+                         cache: Optional[ParseCache] = None, graph: Optional[nx.DiGraph] = None,
+                         discovery_options: Optional[Dict[str, Any]] = None,
+                         discovered: Optional[Tuple[List[str], List[Tuple[str, str]]]] = None,
+                         changes: Optional[Tuple[List[str], List[str]]] = None) -> Tuple[nx.DiGraph, Dict[str, Any]]:
     """
     Walks root_folder recursively, parse all source files for the given language, 
     build a combined graph and return it.
+
+    With workers > 1 files are parsed in a process pool (workers <= 0 uses
+    every CPU), handing chunk_size files to a worker at a time. Files are
+    merged in sorted path order, so the result does not depend on the
+    number of workers.
+
+    With a cache only new or changed files are parsed and deleted files are
+    dropped from it. If graph is also given (the graph returned by the
+    previous call with the same cache) it is patched in place for the
+    changed files instead of being rebuilt.
+
+    Files are found by source_discovery.find_source_files, which
+    discovery_options are passed to (excludes, use_gitignore, max_bytes).
+    Files it leaves out and files that fail to parse (e.g. by exceeding
+    tree_sitter_parser.PARSE_TIMEOUT) are reported and recorded, with the
+    reason, in the returned elements under 'skipped_files'; the cache
+    remembers failures so they are not retried until the file changes.
+
+    A caller that has already listed the files can pass them as discovered,
+    the (paths, skipped) of its find_source_files call, and one that has
+    already compared them with the cache can pass changes, the (changed,
+    deleted) that cache.diff(paths) returned, so neither is done twice.
     """
-    all_elements = {"classes": [], "methods": [], "imports": [], "method_calls": []}
-    file_extension = f".{language}"
-    for path in glob.glob(os.path.join(root_folder, "**", f"*{file_extension}"), recursive=True):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                src = f.read()
-            elems = parse_source(src, language)
-            for c in elems.get("classes", []):
-                c["file"] = path
-            for m in elems.get("methods", []):
-                m["file"] = path
-            for mc in elems.get("method_calls", []):
-                mc["file"] = path
-            all_elements["classes"].extend(elems.get("classes", []))
-            all_elements["methods"].extend(elems.get("methods", []))
-            all_elements["imports"].extend(elems.get("imports", []))
-            all_elements["method_calls"].extend(elems.get("method_calls", []))
-        except Exception as e:
-            print(f"Failed to parse {path}: {e}")
-
-    G = build_graph_from_elements(all_elements)
+    all_elements = {"classes": [], "methods": [], "imports": [], "method_calls": [], "file_imports": {},
+                    "skipped_files": {}}
+    if discovered is None:
+        skipped: List[Tuple[str, str]] = []
+        with timer("discover"):
+            paths = find_source_files(root_folder, language, skipped=skipped, **(discovery_options or {}))
+    else:
+        paths, skipped = discovered
+    report_skipped(skipped)
+    all_elements["skipped_files"].update(skipped)
+
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    if cache is None:
+        merge_file_elements(all_elements, parse_files(paths, language, workers, chunk_size))
+        G = build_graph_from_elements(all_elements)
+        return G, all_elements
+
+    changed, deleted = changes if changes is not None else cache.diff(paths)
+    old_file_elements = {p: cache.get(p) for p in changed + deleted if cache.get(p) is not None}
+    new_file_elements = {}
+    for path in deleted:
+        cache.remove(path)
+
+    if cache.keep_trees or workers <= 1:
+        results = (cache.parse(path) for path in changed)
+    else:
+        results = parse_files(changed, language, workers, chunk_size)
+    for path, elems, error in results:
+        if error is not None:
+            print(f"Failed to parse {path}: {error}")
+            cache.put_failed(path, error)
+            elems = cache.get(path)
+        else:
+            cache.put(path, elems)
+        new_file_elements[path] = elems
+    cache.save()
+    current = set(paths)
+    all_elements["skipped_files"].update((p, e) for p, e in cache.errors().items() if p in current)
+
+    merge_file_elements(all_elements, ((p, cache.get(p), None) for p in paths if cache.get(p) is not None))
+
+    if graph is None:
+        G = build_graph_from_elements(all_elements)
+    elif old_file_elements or new_file_elements:
+        with timer("update_graph"):
+            G = update_graph_for_files(graph, all_elements, old_file_elements, new_file_elements)
+    else:
+        G = graph
     return G, all_elements
 
+def load_or_parse_project(root_folder: str, language: str, snapshot_path: str = SNAPSHOT_PATH,
+                          cache: Optional[ParseCache] = None, **parse_kwargs) -> Tuple[nx.DiGraph, Dict[str, Any]]:
+    """
+    Open the graph snapshot if it was written from the sources currently on disk,
+    otherwise parse the project and write a fresh snapshot.
+
+    Files are discovered once, for both. Either way the elements list the
+    skipped files under 'skipped_files': those discovery leaves out now and
+    those the snapshot recorded as failing to parse.
+    """
+    skipped: List[Tuple[str, str]] = []
+    with timer("discover"):
+        paths = find_source_files(root_folder, language, skipped=skipped,
+                                  **(parse_kwargs.get("discovery_options") or {}))
+    fingerprint = source_fingerprint(paths)
+    try:
+        with load_snapshot(snapshot_path, fingerprint=fingerprint) as snapshot:
+            if snapshot.has_elements:
+                elements = snapshot.elements()
+                report_skipped(skipped)
+                # The files found are unchanged, so their recorded parse failures still hold.
+                current = set(paths)
+                failed = elements["skipped_files"]
+                elements["skipped_files"] = dict(skipped)
+                elements["skipped_files"].update((p, e) for p, e in failed.items() if p in current)
+                return snapshot.to_networkx(), elements
+    except FileNotFoundError:
+        pass
+    except SnapshotError as e:
+        print(f"Rebuilding graph snapshot: {e}")
+
+    G, elements = parse_project_folder(root_folder, language, cache=cache, discovered=(paths, skipped),
+                                       **parse_kwargs)
+    save_snapshot(snapshot_path, G, elements, fingerprint=fingerprint)
+    return G, elements
+
+def parse_files(paths: List[str], language: str, workers: int,
+                chunk_size: int) -> Iterable[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]:
+    """Yield parse_file results for paths in order, using a process pool when workers > 1."""
+    if workers > 1 and len(paths) > 1:
+        metrics = get_metrics()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            if not metrics.enabled:
+                yield from pool.map(parse_file, paths, [language] * len(paths), chunksize=max(1, chunk_size))
+                return
+            for result, snapshot in pool.map(parse_file_with_metrics, paths, [language] * len(paths),
+                                             chunksize=max(1, chunk_size)):
+                metrics.merge(snapshot)
+                yield result
+    else:
+        for path in paths:
+            yield parse_file(path, language)
+
+def parse_file_with_metrics(path: str, language: str) -> Tuple[Tuple[str, Optional[Dict[str, Any]], Optional[str]], Dict[str, Any]]:
+    """parse_file in a worker process, returning the metrics it recorded along with its result."""
+    metrics = get_metrics()
+    metrics.reset()
+    metrics.enable()
+    result = parse_file(path, language)
+    return result, metrics.snapshot()
+
+def watch_project_folder(root_folder: str, language: str, cache: ParseCache,
+                         interval: float = 1.0) -> Iterator[Tuple[nx.DiGraph, List[Dict[str, Any]]]]:
+    """
+    Poll root_folder every interval seconds and yield the patched graph after each change.
+
+    The cache should be created with keep_trees=True so edited files are
+    re-parsed incrementally from their previous tree.
+    """
+    G, elements = parse_project_folder(root_folder, language, cache=cache)
+    yield G, elements
+    while True:
+        time.sleep(interval)
+        before = {p: e["hash"] for p, e in cache.entries.items()}
+        G, elements = parse_project_folder(root_folder, language, cache=cache, graph=G)
+        if before != {p: e["hash"] for p, e in cache.entries.items()}:
+            yield G, elements
+
+def merge_file_elements(all_elements: Dict[str, Any], results: Iterable[Tuple[str, Optional[Dict[str, Any]], Optional[str]]]) -> None:
+    """Append per-file parse results to all_elements, reporting failed files."""
+    for path, elems, error in results:
+        if error is not None:
+            print(f"Failed to parse {path}: {error}")
+            all_elements.setdefault("skipped_files", {})[path] = error
+            continue
+        all_elements["classes"].extend(elems.get("classes", []))
+        all_elements["methods"].extend(elems.get("methods", []))
+        all_elements["imports"].extend(elems.get("imports", []))
+        all_elements["method_calls"].extend(elems.get("method_calls", []))
+        all_elements["file_imports"][path] = elems.get("imports", [])
+
 if __name__ == "__main__":
-    # Specify the language to parse
-    language = "java"
-    project_folder = "./ejb/ejb/src/java/com" 
-    G_proj, elems_proj = parse_project_folder(project_folder, language)
-    store_graph_nodes_in_chroma(G_proj)
-    print("Done for project.")
+    # METRICS_SUMMARY_PATH turns on run metrics (written there as JSON), CPROFILE_PATH a cProfile dump.
+    metrics_path = os.environ.get("METRICS_SUMMARY_PATH")
+    enable_metrics(bool(metrics_path))
+    with profiled(os.environ.get("CPROFILE_PATH")):
+        # Specify the language to parse
+        language = "java"
+        project_folder = "./ejb/ejb/src/java/com" 
+        parse_cache = ParseCache(PARSE_CACHE_PATH, language)
+        with timer("load_project"):
+            G_proj, elems_proj = load_or_parse_project(project_folder, language, cache=parse_cache)
+        with timer("store_nodes"):
+            if store_graph_nodes_in_chroma(G_proj)["stale"]:
+                # Sources changed since the graph was loaded: parse them again rather than store stale code.
+                with timer("load_project"):
+                    G_proj, elems_proj = load_or_parse_project(project_folder, language, cache=parse_cache)
+                store_graph_nodes_in_chroma(G_proj)
+        print("Done for project.")
     
-    #print("Graph nodes:", list(G_proj.nodes(data=True)))
-    #print("Graph edges:", list(G_proj.edges(data=True)))
+        #print("Graph nodes:", list(G_proj.nodes(data=True)))
+        #print("Graph edges:", list(G_proj.edges(data=True)))
 
-    print(f"Nodes: {len(G_proj.nodes())}, Edges: {len(G_proj.edges())}")
+        print(f"Nodes: {len(G_proj.nodes())}, Edges: {len(G_proj.edges())}")
     
-    # Generate both interactive HTML and static PNG visualizations
-    visualize_graph_interactive(G_proj, output_html="./project_code_graph.html")
-    visualize_graph(G_proj, output_png="project_code_graph.png")
-
-    print("Storing nodes in ChromaDB (this will call Gemini embedding API)...")
-    store_graph_nodes_in_chroma(G_proj)
-
-    print("Semantic search for 'customer' ...")
-    results = semantic_search("method spcific for customer", top_k=3)
-    for r in results:
-        print(">>> ID:", r["id"])
-        print(r["document"])
-        print("metadata:", r["metadata"])
-        print("---")
-
-    print("Semantic customer...")
-    results = semantic_graph_search(
-        "customer",
-        G=G_proj,
-        collection=collection,
-        depth=3,
-        top_k=2
-    )
-
-    for r in results:
-        print(">>> ID:", r["id"])
-        print(r["document"])
-        print("metadata:", r["metadata"])
-        print("---")
+        # Generate both interactive HTML and static PNG visualizations
+        with timer("visualize"):
+            if G_proj.number_of_nodes() > LOD_NODE_THRESHOLD:
+                visualize_clustered_graph(G_proj, output_html="./project_code_graph.html", layout_cache=LAYOUT_CACHE_PATH)
+                visualize_graph(collapse_graph(G_proj)[0], output_png="project_code_graph.png", layout_cache=LAYOUT_CACHE_PATH)
+            else:
+                visualize_graph_interactive(G_proj, output_html="./project_code_graph.html")
+                visualize_graph(G_proj, output_png="project_code_graph.png")
+
+        print("Storing nodes in ChromaDB (this will call the configured embedding provider)...")
+        with timer("store_nodes"):
+            store_graph_nodes_in_chroma(G_proj)
+
+        print("Semantic search for 'customer' ...")
+        results = semantic_search("method spcific for customer", top_k=3)
+        for r in results:
+            print(">>> ID:", r["id"])
+            print(r["document"])
+            print("metadata:", r["metadata"])
+            print("---")
+
+        print("Symbol lookup for 'CustomerService.createCustomer' (local index, no embedding call) ...")
+        for r in semantic_search("CustomerService.createCustomer", top_k=3, mode="lexical", index=graph_index(G_proj)):
+            print(f">>> ID: {r['id']} (score {r['score']:.2f})")
+
+        print("Semantic customer...")
+        results = semantic_graph_search(
+            "customer",
+            G=G_proj,
+            collection=get_collection(),
+            depth=3,
+            top_k=2,
+            mode="hybrid"
+        )
+
+        for r in results:
+            print(">>> ID:", r["id"])
+            print(r["document"])
+            print("metadata:", r["metadata"])
+            print("---")
+
+    if metrics_path:
+        print_metrics_report()
+        write_metrics_summary(metrics_path)
+        print(f"Run metrics written to {metrics_path}")
@@ -0,0 +1,182 @@
+import cProfile
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional
+
+# Per-file timers combined for the slow-file report.
+FILE_STAGES = ("read", "parse", "extract")
+
+class Metrics:
+    """
+    Timers, counters and histograms for one run, off until enabled.
+
+    Timers record durations in seconds into a histogram of the same name;
+    when given a key (a file path) they also add to that key's total, which
+    feeds the slow-file report. While disabled every call returns at once
+    and records nothing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.perf_counter()
+        self.counters: Dict[str, float] = {}
+        self.samples: Dict[str, List[float]] = {}
+        self.per_key: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled: bool = True) -> None:
+        if enabled and not self.enabled:
+            self.started = time.perf_counter()
+        self.enabled = enabled
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.perf_counter()
+            self.counters.clear()
+            self.samples.clear()
+            self.per_key.clear()
+
+    def count(self, name: str, n: float = 1) -> None:
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name: str, value: float, key: Optional[str] = None) -> None:
+        """Add value to the histogram name (and to key's total under name)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.samples.setdefault(name, []).append(value)
+            if key is not None:
+                totals = self.per_key.setdefault(name, {})
+                totals[key] = totals.get(key, 0.0) + value
+
+    def timer(self, name: str, key: Optional[str] = None):
+        """Context manager timing its block into the histogram name."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, key)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Raw recorded data, picklable, e.g. to send back from a worker process."""
+        with self._lock:
+            return {"counters": dict(self.counters),
+                    "samples": {name: list(values) for name, values in self.samples.items()},
+                    "per_key": {name: dict(totals) for name, totals in self.per_key.items()}}
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        """Add the data of a snapshot (taken in another process) to this run."""
+        if not self.enabled:
+            return
+        with self._lock:
+            for name, n in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            for name, values in snapshot["samples"].items():
+                self.samples.setdefault(name, []).extend(values)
+            for name, totals in snapshot["per_key"].items():
+                merged = self.per_key.setdefault(name, {})
+                for key, value in totals.items():
+                    merged[key] = merged.get(key, 0.0) + value
+
+    def slow_files(self, top_n: int = 10) -> List[Dict[str, Any]]:
+        """The top_n files by parse plus extraction time, with their per-stage times."""
+        with self._lock:
+            files: Dict[str, Dict[str, float]] = {}
+            for stage in FILE_STAGES:
+                for key, seconds in self.per_key.get(stage, {}).items():
+                    files.setdefault(key, {})[f"{stage}_s"] = seconds
+        ranked = sorted(files.items(), key=lambda item: -(item[1].get("parse_s", 0.0) + item[1].get("extract_s", 0.0)))
+        return [{"file": path, **times} for path, times in ranked[:top_n]]
+
+    def summary(self, top_n: int = 10) -> Dict[str, Any]:
+        """Counters, histogram statistics and the slow-file report, ready for JSON."""
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {name: histogram_stats(values) for name, values in sorted(self.samples.items())}
+        return {"wall_s": time.perf_counter() - self.started, "counters": counters,
+                "histograms": histograms, "slow_files": self.slow_files(top_n)}
+
+class _Timer:
+    __slots__ = ("metrics", "name", "key", "start")
+
+    def __init__(self, metrics: Metrics, name: str, key: Optional[str]):
+        self.metrics = metrics
+        self.name = name
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, self.key)
+        return False
+
+_NULL_TIMER = nullcontext()
+
+def histogram_stats(values: List[float]) -> Dict[str, float]:
+    """count, total, mean, max and nearest-rank p50/p90/p95/p99 of values."""
+    ordered = sorted(values)
+    n = len(ordered)
+    stats = {"count": n, "total": sum(ordered), "mean": sum(ordered) / n if n else 0.0,
+             "max": ordered[-1] if n else 0.0}
+    for p in (50, 90, 95, 99):
+        stats[f"p{p}"] = ordered[min(n - 1, max(0, -(-p * n // 100) - 1))] if n else 0.0
+    return stats
+
+_default_metrics = Metrics()
+
+def get_metrics() -> Metrics:
+    """The Metrics instance shared by this process."""
+    return _default_metrics
+
+def enable_metrics(enabled: bool = True) -> None:
+    _default_metrics.enable(enabled)
+
+def timer(name: str, key: Optional[str] = None):
+    """Time a block into the shared metrics, e.g. with timer("parse", path): ..."""
+    return _default_metrics.timer(name, key)
+
+def count(name: str, n: float = 1) -> None:
+    _default_metrics.count(name, n)
+
+def observe(name: str, value: float, key: Optional[str] = None) -> None:
+    _default_metrics.observe(name, value, key)
+
+def write_metrics_summary(path: str, top_n: int = 10) -> Dict[str, Any]:
+    """Write the shared metrics' summary to path as JSON and return it."""
+    summary = _default_metrics.summary(top_n)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+def print_metrics_report(top_n: int = 10) -> None:
+    """Print stage timings, embedding latency percentiles and the slowest files."""
+    summary = _default_metrics.summary(top_n)
+    print(f"Run metrics ({summary['wall_s']:.2f}s):")
+    for name, stats in summary["histograms"].items():
+        print(f"  {name:24s} n={stats['count']:<7d} total={stats['total']:9.3f}  p50={stats['p50']:.4f}  "
+              f"p90={stats['p90']:.4f}  p99={stats['p99']:.4f}  max={stats['max']:.4f}")
+    for name, n in sorted(summary["counters"].items()):
+        print(f"  {name:24s} {n:g}")
+    if summary["slow_files"]:
+        print(f"Slowest {len(summary['slow_files'])} files (parse + extract):")
+        for entry in summary["slow_files"]:
+            print(f"  {entry.get('parse_s', 0.0) + entry.get('extract_s', 0.0):8.4f}s  {entry['file']}")
+
+@contextmanager
+def profiled(path: Optional[str]) -> Iterator[None]:
+    """Run the block under cProfile and dump the stats to path (a no-op when path is None)."""
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"cProfile stats written to {path}")
@@ -0,0 +1,158 @@
+import json
+import os
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from element_records import RECORD_TYPES, elements_from_dict, elements_to_dict, set_digest
+from source_store import invalidate_source, source_digest
+from metrics import count, timer
+from tree_sitter_parser import PARSE_TIMEOUT, parse_source_incremental
+
+CACHE_VERSION = 4
+
+class ParseCache:
+    """
+    On-disk manifest of per-file parse results, keyed by path, mtime and content hash.
+
+    A file whose mtime and size are unchanged is trusted without reading it;
+    otherwise its bytes are hashed and it is only re-parsed when the hash
+    differs. With keep_trees=True the last tree of every file is also kept
+    in memory so that watch sessions re-parse edits incrementally.
+    """
+
+    def __init__(self, path: str, language: str, keep_trees: bool = False):
+        self.path = path
+        self.language = language
+        self.keep_trees = keep_trees
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.trees: Dict[str, Tuple[Any, bytes]] = {}
+        # Hashes diff() computed for changed files, reused when they are put.
+        self._digests: Dict[str, str] = {}
+        self.load()
+
+    def load(self) -> None:
+        """Load the manifest, discarding it if it was written by another version or language."""
+        self.entries = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable parse cache {self.path}: {e}")
+            return
+        if data.get("version") == CACHE_VERSION and data.get("language") == self.language:
+            self.entries = data.get("files", {})
+            for entry in self.entries.values():
+                entry["elements"] = elements_from_dict(entry["elements"])
+                set_digest(entry["elements"], entry["hash"])
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            files = {path: dict(entry, elements=elements_to_dict(entry["elements"]))
+                     for path, entry in self.entries.items()}
+            json.dump({"version": CACHE_VERSION, "language": self.language, "files": files}, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        """Cached elements for path, or None."""
+        entry = self.entries.get(path)
+        return entry["elements"] if entry else None
+
+    def put(self, path: str, elements: Dict[str, Any], digest: Optional[str] = None) -> None:
+        """
+        Store the elements parsed from path with its current stat and hash:
+        digest, else the one its records were parsed from, else the one
+        diff() computed, else hashed now.
+        """
+        st = os.stat(path)
+        diffed = self._digests.pop(path, None)
+        if digest is None:
+            digest = _records_digest(elements) or diffed or _file_digest(path)
+        set_digest(elements, digest)
+        self.entries[path] = {
+            "mtime": st.st_mtime_ns,
+            "size": st.st_size,
+            "hash": digest,
+            "elements": elements,
+        }
+
+    def put_failed(self, path: str, error: str) -> None:
+        """Remember that path could not be parsed, so it is not retried until it changes."""
+        self.put(path, {"classes": [], "methods": [], "imports": [], "method_calls": []})
+        self.entries[path]["error"] = error
+        self.trees.pop(path, None)
+
+    def errors(self) -> Dict[str, str]:
+        """Paths recorded by put_failed, with their errors."""
+        return {path: entry["error"] for path, entry in self.entries.items() if "error" in entry}
+
+    def remove(self, path: str) -> None:
+        self.entries.pop(path, None)
+        self._digests.pop(path, None)
+        self.trees.pop(path, None)
+        invalidate_source(path)
+
+    def diff(self, paths: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """
+        Compare the manifest with the files currently on disk.
+
+        Returns (changed, deleted): paths that are new or whose content hash
+        changed, and cached paths that are no longer present.
+        """
+        current = set()
+        changed = []
+        for path in paths:
+            current.add(path)
+            entry = self.entries.get(path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if entry and entry["mtime"] == st.st_mtime_ns and entry["size"] == st.st_size:
+                continue
+            digest = _file_digest(path)
+            if entry and entry["hash"] == digest:
+                # Touched but not modified: refresh the stat so the next run skips hashing.
+                entry["mtime"] = st.st_mtime_ns
+                entry["size"] = st.st_size
+                continue
+            self._digests[path] = digest
+            changed.append(path)
+        deleted = sorted(p for p in self.entries if p not in current)
+        return changed, deleted
+
+    def parse(self, path: str) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Parse path in this process, reusing its previous tree when keep_trees is set.
+
+        Returns the same (path, elements, error) triple as tree_sitter_parser.parse_file.
+        """
+        try:
+            with timer("read", path):
+                with open(path, "rb") as f:
+                    data = f.read()
+            elems, state = parse_source_incremental(data, self.language, self.trees.get(path), file=path,
+                                                    timeout=PARSE_TIMEOUT)
+        except Exception as e:
+            count("parse_errors")
+            self.trees.pop(path, None)
+            return path, None, str(e)
+
+        if self.keep_trees:
+            self.trees[path] = state
+        invalidate_source(path)
+        return path, elems, None
+
+def _records_digest(elements: Dict[str, Any]) -> Optional[str]:
+    """Digest of the contents elements were parsed from, if they were parsed from a file."""
+    for key in RECORD_TYPES:
+        for record in elements.get(key, ()):
+            if record.digest:
+                return record.digest
+    return None
+
+def _file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return source_digest(f.read())
@@ -0,0 +1,303 @@
+import os
+import pickle
+import queue
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import networkx as nx
+
+from chroma_manager import ChromaNodeWriter, store_graph_nodes_in_chroma
+from graph_builder import SymbolIndex, add_element_nodes, resolve_call
+from main import parse_project_folder
+from metrics import count, get_metrics, timer
+from source_discovery import find_source_files, iter_source_files, report_skipped
+from tree_sitter_parser import parse_file
+
+# Parsed files waiting for the graph builder, and nodes waiting to be embedded.
+# A stage that gets this far ahead blocks until the next one catches up.
+PARSE_QUEUE_SIZE = 64
+NODE_QUEUE_SIZE = 2048
+# Deferred call records kept in memory before they are spilled to a temporary file.
+CALL_SPILL_SIZE = 100_000
+
+ParseResult = Tuple[str, Optional[Dict[str, Any]], Optional[str]]
+
+_DONE = object()
+
+class _Stopped(Exception):
+    """Raised in a stage when another stage has failed and the pipeline is shutting down."""
+
+def index_project(root_folder: str, language: str, workers: int = 1, chunk_size: int = 16,
+                  store: bool = True, prune: bool = True, writer_options: Optional[Dict[str, Any]] = None,
+                  stream: bool = False, parse_queue_size: int = PARSE_QUEUE_SIZE,
+                  node_queue_size: int = NODE_QUEUE_SIZE, call_spill_size: int = CALL_SPILL_SIZE,
+                  discovery_options: Optional[Dict[str, Any]] = None) -> Tuple[nx.DiGraph, Dict[str, Any]]:
+    """
+    Parse a project, build its graph and store its nodes in ChromaDB.
+
+    By default this is done in turn: main.parse_project_folder, then
+    store_graph_nodes_in_chroma with writer_options. With stream it runs
+    as one streaming pipeline, without collecting every file's elements
+    first, so embedding overlaps parsing. Streaming has not been measured
+    to lower peak memory (the graph and its symbols still grow with the
+    project) or run time (see benchmarks/bench_streaming_pipeline.py), so
+    it is opt-in.
+
+    When streaming, files are parsed in a pool of worker processes
+    (workers <= 0 uses every CPU; at least one even when workers is 1 and
+    store is set, as the writer would otherwise compete with parsing for
+    the GIL) while this thread adds each file's classes and methods to the
+    graph as it arrives and hands the new nodes to a writer thread, which
+    embeds and upserts them with a ChromaNodeWriter built from
+    writer_options. Stages are joined by bounded queues, so a slow stage
+    holds back the ones before it instead of letting work pile up in
+    memory.
+
+    Files are discovered by source_discovery.iter_source_files (with
+    discovery_options) as the parse stage consumes them, so parsing starts
+    before the whole tree has been walked.
+
+    Calls are resolved once every file has been seen, when all symbols are
+    known; until then they wait in a CallSpill. The graph is the same as
+    parse_project_folder would build.
+
+    Returns the graph and the run's counts: files, failed, calls, skipped
+    (files left out by discovery, which are also reported), and with store
+    the writer's counts under 'store'.
+    """
+    if not stream:
+        return _index_batch(root_folder, language, workers, chunk_size, store, prune, writer_options,
+                            discovery_options)
+    stop = threading.Event()
+    parsed: "queue.Queue[Any]" = queue.Queue(maxsize=parse_queue_size)
+    nodes: "queue.Queue[Any]" = queue.Queue(maxsize=node_queue_size)
+    store_result: Dict[str, Any] = {}
+    skipped: List[Tuple[str, str]] = []
+    paths = iter_source_files(root_folder, language, skipped=skipped, **(discovery_options or {}))
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    elif workers == 1 and not store:
+        workers = 0
+
+    threads = [threading.Thread(target=_parse_stage, daemon=True,
+                                args=(paths, language, workers, chunk_size, parsed, stop))]
+    if store:
+        threads.append(threading.Thread(target=_store_stage, daemon=True,
+                                        args=(nodes, dict(writer_options or {}), prune, store_result, stop)))
+    for thread in threads:
+        thread.start()
+
+    G = nx.DiGraph()
+    file_imports: Dict[str, List[str]] = {}
+    calls = CallSpill(call_spill_size)
+    stats: Dict[str, Any] = {"files": 0, "failed": 0, "calls": 0}
+    try:
+        while True:
+            item = _get(parsed, stop)
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            path, elems, error = item
+            if error is not None:
+                print(f"Failed to parse {path}: {error}")
+                stats["failed"] += 1
+                continue
+            stats["files"] += 1
+            with timer("build_graph"):
+                add_element_nodes(G, elems.get("classes", []), elems.get("methods", []))
+            file_imports[path] = elems.get("imports", [])
+            calls.extend(elems.get("method_calls", []))
+            if store:
+                for cls in elems.get("classes", []):
+                    _put(nodes, (cls["name"], dict(G.nodes[cls["name"]])), stop)
+                for m in elems.get("methods", []):
+                    _put(nodes, (m["id"], dict(G.nodes[m["id"]])), stop)
+
+        # The parse stage has drained discovery, so its skipped list is complete.
+        report_skipped(skipped)
+        stats["skipped"] = len(skipped)
+
+        # Every symbol is known now, so calls resolve exactly as in a full build.
+        known = G.number_of_nodes()
+        with timer("resolve_calls"):
+            index = SymbolIndex(G, file_imports)
+            for call in calls:
+                resolve_call(G, call, index)
+        stats["calls"] = calls.count
+        count("calls_resolved", calls.count)
+
+        if store:
+            # Placeholders for unknown callers and unresolved callees are stored too.
+            for node in islice(G.nodes, known, None):
+                _put(nodes, (node, dict(G.nodes[node])), stop)
+            _put(nodes, _DONE, stop)
+            threads[1].join()
+            if "error" in store_result:
+                raise store_result["error"]
+            stats["store"] = store_result["stats"]
+    except _Stopped:
+        raise store_result.get("error") or RuntimeError("pipeline stopped")
+    finally:
+        stop.set()
+        calls.close()
+    return G, stats
+
+def _index_batch(root_folder: str, language: str, workers: int, chunk_size: int, store: bool, prune: bool,
+                 writer_options: Optional[Dict[str, Any]],
+                 discovery_options: Optional[Dict[str, Any]]) -> Tuple[nx.DiGraph, Dict[str, Any]]:
+    """index_project without streaming: parse the whole project, then store the finished graph."""
+    skipped: List[Tuple[str, str]] = []
+    with timer("discover"):
+        paths = find_source_files(root_folder, language, skipped=skipped, **(discovery_options or {}))
+    G, elements = parse_project_folder(root_folder, language, workers=workers, chunk_size=chunk_size,
+                                       discovered=(paths, skipped))
+    parsed = len(elements["file_imports"])
+    stats: Dict[str, Any] = {"files": parsed, "failed": len(paths) - parsed,
+                             "calls": len(elements["method_calls"]), "skipped": len(skipped)}
+    if store:
+        stats["store"] = store_graph_nodes_in_chroma(G, prune=prune, **(writer_options or {}))
+    return G, stats
+
+class CallSpill:
+    """
+    Deferred call records in arrival order. Beyond max_in_memory records
+    they are pickled to a temporary file in chunks, so pending calls do not
+    have to stay in memory until resolution.
+    """
+
+    def __init__(self, max_in_memory: int = CALL_SPILL_SIZE):
+        self.max_in_memory = max(1, max_in_memory)
+        self.count = 0
+        self._buffer: List[Any] = []
+        self._file = None
+
+    def extend(self, calls: Iterable[Any]) -> None:
+        before = len(self._buffer)
+        self._buffer.extend(calls)
+        self.count += len(self._buffer) - before
+        if len(self._buffer) >= self.max_in_memory:
+            if self._file is None:
+                self._file = tempfile.TemporaryFile()
+            pickle.dump(self._buffer, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._buffer = []
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._file is not None:
+            self._file.seek(0)
+            while True:
+                try:
+                    chunk = pickle.load(self._file)
+                except EOFError:
+                    break
+                yield from chunk
+        yield from self._buffer
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer = []
+
+def iter_parsed_files(paths: Iterable[str], language: str, workers: int = 1,
+                      chunk_size: int = 16, max_chunks_ahead: Optional[int] = None) -> Iterator[ParseResult]:
+    """
+    Yield parse_file results in path order. Chunks of chunk_size files are
+    parsed in a pool of workers processes, at most max_chunks_ahead
+    (default 2 * workers) ahead of the consumer; with workers = 0 files are
+    parsed in the calling thread.
+    """
+    if workers <= 0:
+        for path in paths:
+            yield parse_file(path, language)
+        return
+
+    metrics = get_metrics()
+    measured = metrics.enabled
+    max_chunks_ahead = max_chunks_ahead or 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        chunks = _chunks(paths, max(1, chunk_size))
+        for chunk in chunks:
+            pending.append(pool.submit(parse_chunk, chunk, language, measured))
+            if len(pending) >= max_chunks_ahead:
+                yield from _chunk_results(pending.popleft(), metrics)
+        while pending:
+            yield from _chunk_results(pending.popleft(), metrics)
+
+def parse_chunk(paths: List[str], language: str,
+                measured: bool = False) -> Tuple[List[ParseResult], Optional[Dict[str, Any]]]:
+    """parse_file over paths in a worker process, plus the worker's metrics when measured."""
+    if not measured:
+        return [parse_file(path, language) for path in paths], None
+    metrics = get_metrics()
+    metrics.reset()
+    metrics.enable()
+    return [parse_file(path, language) for path in paths], metrics.snapshot()
+
+def _chunk_results(future, metrics) -> List[ParseResult]:
+    results, snapshot = future.result()
+    if snapshot is not None:
+        metrics.merge(snapshot)
+    return results
+
+def _chunks(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _parse_stage(paths: Iterable[str], language: str, workers: int, chunk_size: int,
+                 out: "queue.Queue[Any]", stop: threading.Event) -> None:
+    try:
+        for result in iter_parsed_files(paths, language, workers, chunk_size):
+            _put(out, result, stop)
+        _put(out, _DONE, stop)
+    except _Stopped:
+        pass
+    except BaseException as e:
+        try:
+            _put(out, e, stop)
+        except _Stopped:
+            pass
+
+def _store_stage(nodes: "queue.Queue[Any]", writer_options: Dict[str, Any], prune: bool,
+                 result: Dict[str, Any], stop: threading.Event) -> None:
+    try:
+        writer = ChromaNodeWriter(**writer_options)
+        while True:
+            item = _get(nodes, stop)
+            if item is _DONE:
+                break
+            writer.add(*item)
+        result["stats"] = writer.finish(prune=prune)
+    except _Stopped:
+        pass
+    except BaseException as e:
+        result["error"] = e
+        stop.set()
+
+def _put(q: "queue.Queue[Any]", item: Any, stop: threading.Event) -> None:
+    """Put item on a bounded queue, waiting for space unless the pipeline is stopping."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+    raise _Stopped()
+
+def _get(q: "queue.Queue[Any]", stop: threading.Event) -> Any:
+    """Take the next item from a queue unless the pipeline is stopping."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    raise _Stopped()
@@ -0,0 +1,411 @@
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import networkx as nx
+
+from call_reachability import CallReachability
+from chroma_manager import SEARCH_MODES, ChromaNodeWriter, get_collection, rank_nodes
+from graph_builder import build_adjacency, bounded_bfs
+from identifier_index import graph_index
+from main import PARSE_CACHE_PATH, parse_project_folder
+from parse_cache import ParseCache
+from source_discovery import DEFAULT_EXCLUDES, MAX_FILE_BYTES, find_source_files
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Seconds between checks of the source tree for changed files.
+WATCH_INTERVAL = 1.0
+# Threads answering queries; the event loop itself only parses requests.
+QUERY_THREADS = 8
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+class ReadWriteLock:
+    """Any number of readers at a time, or a single writer."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+
+    def acquire_read(self) -> None:
+        with self._cond:
+            while self._writing:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self) -> None:
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self) -> None:
+        with self._cond:
+            while self._writing:
+                self._cond.wait()
+            self._writing = True
+            while self._readers:
+                self._cond.wait()
+
+    def release_write(self) -> None:
+        with self._cond:
+            self._writing = False
+            self._cond.notify_all()
+
+class CodeGraphService:
+    """
+    A project's graph, adjacency list, identifier index and call
+    reachability index kept in memory between queries, and the Chroma
+    collection once a query needs it.
+
+    refresh() applies the files changed on disk since the last call through
+    the parse cache, patching the graph instead of rebuilding it. With
+    store_updates the nodes of changed files are also re-embedded and
+    stored, and nodes that disappeared are deleted from the collection.
+    Queries may run concurrently with each other; refresh() waits for them
+    and holds them off while it patches the graph, but not while it embeds
+    and stores the changed nodes.
+    """
+
+    def __init__(self, root_folder: str, language: str, cache: ParseCache, store_updates: bool = False,
+                 discovery_options: Optional[Dict[str, Any]] = None):
+        self.root_folder = root_folder
+        self.language = language
+        self.cache = cache
+        self.store_updates = store_updates
+        self.discovery_options = dict(discovery_options or {})
+        self.lock = ReadWriteLock()
+        self.G: nx.DiGraph = nx.DiGraph()
+        self.adjacency: Dict[Any, List[Tuple[Any, str]]] = {}
+        self.reachability = CallReachability()
+        self.loaded_at = 0.0
+        self.updates = 0
+
+    def load(self) -> None:
+        """Parse the project (reusing the parse cache) and build the in-memory indexes."""
+        G, _ = parse_project_folder(self.root_folder, self.language, cache=self.cache,
+                                    discovery_options=self.discovery_options)
+        graph_index(G)
+        adjacency = build_adjacency(G)
+        reachability = CallReachability.from_graph(G)
+        self.lock.acquire_write()
+        try:
+            self.G, self.adjacency, self.reachability = G, adjacency, reachability
+            self.loaded_at = time.time()
+        finally:
+            self.lock.release_write()
+
+    def refresh(self) -> bool:
+        """Apply changed, added and deleted source files; return whether there were any."""
+        skipped: List[Tuple[str, str]] = []
+        paths = find_source_files(self.root_folder, self.language, skipped=skipped, **self.discovery_options)
+        changed, deleted = self.cache.diff(paths)
+        if not changed and not deleted:
+            return False
+        affected = set(changed) | set(deleted)
+        self.lock.acquire_write()
+        try:
+            before = set(self.G) if self.store_updates else set()
+            self.G, _ = parse_project_folder(self.root_folder, self.language, cache=self.cache, graph=self.G,
+                                             discovered=(paths, skipped), changes=(changed, deleted))
+            self.adjacency = build_adjacency(self.G)
+            self.reachability.update(self.G)
+            self.updates += 1
+            changes = self._node_changes(before, affected) if self.store_updates else None
+        finally:
+            self.lock.release_write()
+        print(f"Applied changes to {len(affected)} file(s): {self.G.number_of_nodes()} nodes")
+        if changes is not None:
+            # Embedding calls the provider, so it runs with queries already let through.
+            self._store_changes(*changes)
+        return True
+
+    def _node_changes(self, before: Set[Any], files: Set[str]) -> Tuple[List[Tuple[Any, Dict[str, Any]]], List[str]]:
+        """Copies of the nodes to re-embed (those of files, and new ones) and the ids of removed nodes."""
+        nodes = [(node, dict(data)) for node, data in self.G.nodes(data=True)
+                 if data.get("file") in files or node not in before]
+        removed = [str(node) for node in before if node not in self.G]
+        return nodes, removed
+
+    def _store_changes(self, nodes: List[Tuple[Any, Dict[str, Any]]], removed: List[str]) -> None:
+        writer = ChromaNodeWriter()
+        for node, data in nodes:
+            writer.add(node, data)
+        writer.finish(prune=False)
+        if removed:
+            # Every chunk of a removed node names it in its metadata.
+            writer.target.delete(where={"node": {"$in": removed}})
+
+    def read(self, fn: Callable[[], Any]) -> Any:
+        """Run fn while holding off refresh()."""
+        self.lock.acquire_read()
+        try:
+            return fn()
+        finally:
+            self.lock.release_read()
+
+    def search(self, query: str, top_k: int = 10, mode: str = "lexical", prefix: bool = False) -> List[Dict[str, Any]]:
+        """
+        Nodes matching query. 'lexical' (the default) answers from the
+        identifier index alone; 'vector' and 'hybrid' also embed the query
+        and search the Chroma collection, see chroma_manager.rank_nodes.
+        """
+        if mode == "lexical":
+            ranked = graph_index(self.G).search(query, top_k=top_k, prefix=prefix)
+        else:
+            ranked = rank_nodes(query, get_collection(), top_k, mode=mode, index=graph_index(self.G))
+        return [dict(self._node_info(node), score=score) for node, score in ranked]
+
+    def neighborhood(self, node: Any, hops: int = 1, max_nodes: int = 200,
+                     relations: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Nodes within hops of node (edges followed both ways) and the edges between them."""
+        self._require(node)
+        reached = bounded_bfs(self.adjacency, [node], hops, relations=relations, max_nodes=max_nodes)
+        nodes = [dict(self._node_info(n), distance=distance) for n, (distance, _) in reached.items()]
+        edges = [{"from": u, "to": v, "relation": data.get("relation")}
+                 for u in reached for v, data in self.G.succ[u].items()
+                 if v in reached and (relations is None or data.get("relation") in relations)]
+        return {"nodes": nodes, "edges": edges}
+
+    def callers(self, node: Any, depth: int = 1, max_nodes: int = 500) -> List[Dict[str, Any]]:
+        """Methods calling node, directly or through up to depth - 1 intermediate calls."""
+        return self._calls(node, depth, max_nodes, self.G.pred)
+
+    def callees(self, node: Any, depth: int = 1, max_nodes: int = 500) -> List[Dict[str, Any]]:
+        """Methods node calls, directly or through up to depth - 1 intermediate calls."""
+        return self._calls(node, depth, max_nodes, self.G.succ)
+
+    def impact(self, node: Any, max_nodes: int = 500) -> Dict[str, Any]:
+        """Every method calling node, at any depth, from the reachability index."""
+        self._require(node)
+        callers = self.reachability.transitive_callers(node)
+        return {"total": len(callers), "callers": [self._node_info(n) for n in callers[:max_nodes]]}
+
+    def call_path(self, source: Any, target: Any) -> Optional[List[Dict[str, Any]]]:
+        """A shortest chain of calls from source to target, or None."""
+        self._require(source)
+        self._require(target)
+        path = self.reachability.shortest_call_path(source, target)
+        return None if path is None else [self._node_info(n) for n in path]
+
+    def fan(self, node: Any) -> Dict[str, int]:
+        """Direct and transitive fan-in and fan-out of node."""
+        self._require(node)
+        index = self.reachability
+        return {"fan_in": index.fan_in(node), "fan_out": index.fan_out(node),
+                "transitive_fan_in": index.fan_in(node, transitive=True),
+                "transitive_fan_out": index.fan_out(node, transitive=True)}
+
+    def _calls(self, node: Any, depth: int, max_nodes: int, neighbours) -> List[Dict[str, Any]]:
+        """Breadth-first walk over 'calls' edges in one direction (G.succ or G.pred)."""
+        self._require(node)
+        seen = {node}
+        found = []
+        frontier = [node]
+        for distance in range(1, depth + 1):
+            next_frontier = []
+            for current in frontier:
+                for other, data in neighbours[current].items():
+                    if other in seen or data.get("relation") != "calls":
+                        continue
+                    seen.add(other)
+                    found.append(dict(self._node_info(other), distance=distance))
+                    next_frontier.append(other)
+                    if len(found) >= max_nodes:
+                        return found
+            frontier = next_frontier
+        return found
+
+    def status(self) -> Dict[str, Any]:
+        return {"root": self.root_folder, "nodes": self.G.number_of_nodes(), "edges": self.G.number_of_edges(),
+                "files": len(self.cache.entries), "loaded_at": self.loaded_at, "updates": self.updates}
+
+    def _require(self, node: Any) -> None:
+        if node not in self.G:
+            raise KeyError(node)
+
+    def _node_info(self, node: Any) -> Dict[str, Any]:
+        data = self.G.nodes[node] if node in self.G else {}
+        return {"id": node, "type": data.get("type"), "file": data.get("file"), "class": data.get("class_name")}
+
+class QueryServer:
+    """
+    JSON-over-HTTP front end for a CodeGraphService, on a TCP port or a Unix
+    socket. Each request is answered in a thread pool, so slow queries (a
+    vector search waiting on the embedder) do not hold up fast ones.
+
+    GET or POST (JSON body) endpoints, answering {"results": ...}:
+      /search?q=...&k=10&mode=lexical|vector|hybrid&prefix=1
+      /neighborhood?node=...&hops=1&max_nodes=200&relations=calls,contains
+      /callers?node=...&depth=1    /callees?node=...&depth=1
+      /impact?node=...&max_nodes=500    /path?from=...&to=...    /fan?node=...
+      /status
+    """
+
+    def __init__(self, service: CodeGraphService, threads: int = QUERY_THREADS):
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="query")
+        self.routes: Dict[str, Callable[[Dict[str, str]], Any]] = {
+            "/search": self._search,
+            "/neighborhood": self._neighborhood,
+            "/callers": lambda p: self.service.callers(_required(p, "node"), int(p.get("depth", 1))),
+            "/callees": lambda p: self.service.callees(_required(p, "node"), int(p.get("depth", 1))),
+            "/impact": lambda p: self.service.impact(_required(p, "node"), int(p.get("max_nodes", 500))),
+            "/path": lambda p: self.service.call_path(_required(p, "from"), _required(p, "to")),
+            "/fan": lambda p: self.service.fan(_required(p, "node")),
+            "/status": lambda p: self.service.status(),
+        }
+
+    def _search(self, params: Dict[str, str]) -> Any:
+        mode = params.get("mode", "lexical")
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"mode must be one of {SEARCH_MODES}")
+        return self.service.search(_required(params, "q"), int(params.get("k", 10)), mode,
+                                   params.get("prefix", "") not in ("", "0", "false"))
+
+    def _neighborhood(self, params: Dict[str, str]) -> Any:
+        relations = params.get("relations")
+        return self.service.neighborhood(_required(params, "node"), int(params.get("hops", 1)),
+                                         int(params.get("max_nodes", 200)),
+                                         relations.split(",") if relations else None)
+
+    def answer(self, path: str, params: Dict[str, str]) -> Tuple[int, Dict[str, Any]]:
+        """Run one query; returns the HTTP status and the JSON body."""
+        route = self.routes.get(path)
+        if route is None:
+            return 404, {"error": f"unknown endpoint {path}"}
+        try:
+            return 200, {"results": self.service.read(lambda: route(params))}
+        except KeyError as e:
+            return 404, {"error": f"not found: {e.args[0]}"}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            print(f"Query {path} failed: {type(e).__name__}: {e}")
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve the requests of one (keep-alive) connection."""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, version = (lines[0].split(" ") + ["", ""])[:3]
+                headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in lines[1:] if line)}
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "request body too large"}, False)
+                    return
+                body = await reader.readexactly(length) if length else b""
+
+                url = urlsplit(target)
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                if method == "POST" and body:
+                    try:
+                        params.update({k: str(v) for k, v in json.loads(body).items()})
+                    except (ValueError, AttributeError):
+                        await self._respond(writer, 400, {"error": "body must be a JSON object"}, False)
+                        return
+                if method in ("GET", "POST"):
+                    status, payload = await loop.run_in_executor(self.executor, self.answer, url.path, params)
+                else:
+                    status, payload = 405, {"error": f"method {method} not allowed"}
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any],
+                       keep_alive: bool) -> None:
+        body = json.dumps(payload, default=str).encode("utf-8")
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                  413: "Payload Too Large", 500: "Internal Server Error"}.get(status, "")
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                     .encode("latin-1") + body)
+        await writer.drain()
+
+    async def watch(self, interval: float) -> None:
+        """Apply source changes every interval seconds, off the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await loop.run_in_executor(self.executor, self.service.refresh)
+            except Exception as e:
+                print(f"Failed to apply source changes: {e}")
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path: Optional[str] = None,
+                    watch_interval: Optional[float] = WATCH_INTERVAL) -> None:
+        """Listen until cancelled; watch_interval None disables the file watcher."""
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle, path=unix_path, limit=MAX_HEADER_BYTES)
+            print(f"Query server listening on {unix_path}")
+        else:
+            server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES)
+            print(f"Query server listening on http://{host}:{port}")
+        watcher = asyncio.ensure_future(self.watch(watch_interval)) if watch_interval else None
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            self.executor.shutdown(wait=False)
+            if unix_path and os.path.exists(unix_path):
+                os.unlink(unix_path)
+
+def _required(params: Dict[str, str], name: str) -> str:
+    if name not in params:
+        raise ValueError(f"missing parameter {name!r}")
+    return params[name]
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Serve search, neighborhood and caller/callee queries "
+                                             "over a warm code graph.")
+    ap.add_argument("root", help="source folder to index")
+    ap.add_argument("--language", default="java")
+    ap.add_argument("--host", default=DEFAULT_HOST)
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument("--unix", help="listen on this Unix socket instead of a TCP port")
+    ap.add_argument("--cache", default=PARSE_CACHE_PATH, help="parse cache file")
+    ap.add_argument("--interval", type=float, default=WATCH_INTERVAL, help="seconds between source checks")
+    ap.add_argument("--no-watch", action="store_true", help="do not watch the source tree")
+    ap.add_argument("--store-updates", action="store_true",
+                    help="re-embed and store the nodes of changed files in ChromaDB")
+    ap.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                    help=f"also skip paths matching GLOB (always skipped: {', '.join(DEFAULT_EXCLUDES)})")
+    ap.add_argument("--no-gitignore", action="store_true", help="do not honor .gitignore files")
+    ap.add_argument("--max-file-bytes", type=int, default=MAX_FILE_BYTES, help="skip larger source files")
+    args = ap.parse_args()
+
+    discovery_options = {"excludes": DEFAULT_EXCLUDES + tuple(args.exclude),
+                         "use_gitignore": not args.no_gitignore, "max_bytes": args.max_file_bytes}
+    service = CodeGraphService(args.root, args.language, ParseCache(args.cache, args.language, keep_trees=True),
+                               store_updates=args.store_updates, discovery_options=discovery_options)
+    start = time.perf_counter()
+    service.load()
+    print(f"Loaded {service.G.number_of_nodes()} nodes in {time.perf_counter() - start:.2f}s")
+    try:
+        asyncio.run(QueryServer(service).serve(args.host, args.port, args.unix,
+                                               None if args.no_watch else args.interval))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
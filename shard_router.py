@@ -0,0 +1,366 @@
+import argparse
+import fnmatch
+import json
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import networkx as nx
+
+from chroma_manager import (SEARCH_MODES, collection_name_for, embed_query, embedding_provider, expand_seeds,
+                            get_chroma_client, get_embedding_cache, rank_nodes, store_graph_nodes_in_chroma)
+from embedding_cache import EmbeddingCache
+from embedding_providers import EmbeddingProvider
+from graph_builder import build_adjacency
+from identifier_index import graph_index
+from main import PARSE_CACHE_PATH, SNAPSHOT_PATH, load_or_parse_project
+from parse_cache import ParseCache
+from source_discovery import DEFAULT_EXCLUDES
+
+# The shard manifest and every shard's graph snapshot and parse cache live here.
+SHARDS_PATH = "shards"
+SHARD_MANIFEST = "shards.json"
+MANIFEST_VERSION = 1
+# Shards indexed, and searched, at the same time.
+SHARD_CONCURRENCY = 4
+# Shard names end up in Chroma collection names and folder names.
+SHARD_NAME_RE = re.compile(r"[A-Za-z0-9](?:[A-Za-z0-9_-]{0,62}[A-Za-z0-9])?\Z")
+
+# Names or fnmatch globs selecting shards; None selects every shard.
+ShardFilter = Optional[Union[str, Iterable[str]]]
+
+class Shard:
+    """
+    One independently indexed source tree, e.g. a repository or a module.
+
+    A shard has its own Chroma collection and its own graph snapshot and
+    parse cache under <shards folder>/<name>/, so node ids only need to be
+    unique within it. Its graph, adjacency list and identifier index are
+    held in memory once loaded.
+    """
+
+    def __init__(self, name: str, root_folder: str, language: str = "java",
+                 discovery_options: Optional[Dict[str, Any]] = None, folder: str = SHARDS_PATH):
+        if not SHARD_NAME_RE.match(name):
+            raise ValueError(f"Invalid shard name {name!r}: use letters, digits, '_' and '-'")
+        self.name = name
+        self.root_folder = root_folder
+        self.language = language
+        self.discovery_options = discovery_options
+        self.folder = os.path.join(folder, name)
+        self.G: Optional[nx.DiGraph] = None
+        self.adjacency = None
+        self.index = None
+        self.collection = None
+        self.lock = threading.Lock()
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.folder, SNAPSHOT_PATH)
+
+    @property
+    def cache_path(self) -> str:
+        return os.path.join(self.folder, PARSE_CACHE_PATH)
+
+    def collection_name(self, provider: EmbeddingProvider) -> str:
+        return f"{collection_name_for(provider)}__{self.name}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"root": self.root_folder, "language": self.language, "discovery_options": self.discovery_options}
+
+    def load(self, workers: int = 1) -> None:
+        """Open the shard's graph snapshot, re-parsing the sources if they changed since it was written."""
+        os.makedirs(self.folder, exist_ok=True)
+        cache = ParseCache(self.cache_path, self.language)
+        G, _ = load_or_parse_project(self.root_folder, self.language, snapshot_path=self.snapshot_path,
+                                     cache=cache, workers=workers, discovery_options=self.discovery_options)
+        self.G, self.adjacency, self.index = G, build_adjacency(G), graph_index(G)
+
+class ShardRouter:
+    """
+    The shards listed in <folder>/shards.json, indexed in parallel and
+    searched together.
+
+    Adding, rebuilding or dropping a shard only touches that shard's
+    collection and files. Searches go to the shards matching a filter
+    (shard names or fnmatch globs, every shard by default), concurrently,
+    and the per-shard rankings are merged into one top-k. Every result
+    names the shard it came from.
+    """
+
+    def __init__(self, folder: str = SHARDS_PATH, client=None, provider: Optional[EmbeddingProvider] = None,
+                 cache: Optional[EmbeddingCache] = None, concurrency: int = SHARD_CONCURRENCY):
+        self.folder = folder
+        self.client = client
+        self.provider = provider or embedding_provider
+        self.cache = cache
+        self.concurrency = max(1, concurrency)
+        self.shards: Dict[str, Shard] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        self.load_manifest()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.folder, SHARD_MANIFEST)
+
+    def load_manifest(self) -> None:
+        self.shards = {}
+        if not os.path.exists(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable shard manifest {self.manifest_path}: {e}")
+            return
+        if data.get("version") != MANIFEST_VERSION:
+            print(f"Ignoring shard manifest {self.manifest_path} written by another version")
+            return
+        for name, entry in data.get("shards", {}).items():
+            self.shards[name] = Shard(name, entry["root"], entry["language"], entry.get("discovery_options"),
+                                      self.folder)
+
+    def save_manifest(self) -> None:
+        """Write the manifest atomically."""
+        os.makedirs(self.folder, exist_ok=True)
+        with self._lock:
+            shards = {name: shard.to_dict() for name, shard in sorted(self.shards.items())}
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "shards": shards}, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def select(self, filters: ShardFilter = None) -> List[Shard]:
+        """The shards, by name, whose names match any of filters (all shards if None)."""
+        with self._lock:
+            shards = [shard for _, shard in sorted(self.shards.items())]
+        if filters is None:
+            return shards
+        if isinstance(filters, str):
+            filters = [filters]
+        filters = list(filters)
+        return [shard for shard in shards if any(fnmatch.fnmatchcase(shard.name, f) for f in filters)]
+
+    def get(self, name: str) -> Shard:
+        with self._lock:
+            shard = self.shards.get(name)
+        if shard is None:
+            raise ValueError(f"Unknown shard {name!r}")
+        return shard
+
+    def collection(self, shard: Shard):
+        """The shard's Chroma collection, created on first use."""
+        if shard.collection is None:
+            client = self.client if self.client is not None else get_chroma_client()
+            shard.collection = client.get_or_create_collection(shard.collection_name(self.provider))
+        return shard.collection
+
+    def add_shard(self, name: str, root_folder: str, language: str = "java",
+                  discovery_options: Optional[Dict[str, Any]] = None, index: bool = True) -> Shard:
+        """Register a new shard and, with index, index it."""
+        shard = Shard(name, root_folder, language, discovery_options, self.folder)
+        with self._lock:
+            if name in self.shards:
+                raise ValueError(f"Shard {name!r} already exists")
+            self.shards[name] = shard
+        self.save_manifest()
+        if index:
+            self.index([name])
+        return shard
+
+    def rebuild_shard(self, name: str, workers: int = 1) -> Dict[str, Any]:
+        """Throw away a shard's collection, snapshot and parse cache and index it from scratch."""
+        shard = self.get(name)
+        with shard.lock:
+            self._clear(shard)
+        return self.index([name], workers)[name]
+
+    def drop_shard(self, name: str) -> None:
+        """Delete a shard's collection, snapshot and parse cache and remove it from the manifest."""
+        shard = self.get(name)
+        with self._lock:
+            self.shards.pop(name, None)
+        self.save_manifest()
+        with shard.lock:
+            self._clear(shard)
+
+    def _clear(self, shard: Shard) -> None:
+        client = self.client if self.client is not None else get_chroma_client()
+        try:
+            client.delete_collection(shard.collection_name(self.provider))
+        except Exception:
+            pass  # never stored
+        shutil.rmtree(shard.folder, ignore_errors=True)
+        shard.G = shard.adjacency = shard.index = shard.collection = None
+
+    def index(self, shards: ShardFilter = None, workers: int = 1) -> Dict[str, Dict[str, Any]]:
+        """
+        Index the selected shards in parallel, up to concurrency at a time.
+
+        Each shard's graph is loaded (see Shard.load; workers is passed on to
+        parse_project_folder) and its nodes are stored in its own collection,
+        pruning nodes that are gone. Returns each shard's store counts, or
+        {"error": ...} for a shard that failed without stopping the others.
+        """
+        selected = self.select(shards)
+        results: Dict[str, Dict[str, Any]] = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(selected)))) as pool:
+            futures = [(shard, pool.submit(self._index_shard, shard, workers)) for shard in selected]
+            for shard, future in futures:
+                try:
+                    results[shard.name] = future.result()
+                except Exception as e:
+                    print(f"Failed to index shard {shard.name}: {e}")
+                    results[shard.name] = {"error": str(e)}
+        return results
+
+    def _index_shard(self, shard: Shard, workers: int) -> Dict[str, Any]:
+        with shard.lock:
+            shard.load(workers)
+            return store_graph_nodes_in_chroma(shard.G, embedder=self.provider, target_collection=self.collection(shard),
+                                               cache=self.cache if self.cache is not None else get_embedding_cache(),
+                                               model_name=self.provider.model_name)
+
+    def _loaded(self, shard: Shard) -> Shard:
+        if shard.G is None:
+            with shard.lock:
+                if shard.G is None:
+                    shard.load()
+        return shard
+
+    def _rank(self, query: str, shards: List[Shard], top_k: int, mode: str) -> List[Tuple[Shard, str, float]]:
+        """
+        The top_k (shard, node, score) hits for query over shards. Each shard
+        ranks its own top_k concurrently and the rankings are merged by score.
+        Vector scores are comparable across shards; BM25 and fused scores are
+        computed per shard, so in the other modes the merge is approximate.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+        if not shards:
+            return []
+        if mode != "lexical":
+            # Embed the query once; every shard's ranking then finds it in embed_query's cache.
+            embed_query(query, self.collection(shards[0]), self.provider)
+
+        def rank(shard: Shard) -> List[Tuple[Shard, str, float]]:
+            index = self._loaded(shard).index if mode != "vector" else None
+            return [(shard, node, score)
+                    for node, score in rank_nodes(query, self.collection(shard), top_k, self.provider, mode, index)]
+
+        hits = [hit for ranked in self._pool.map(rank, shards) for hit in ranked]
+        hits.sort(key=lambda hit: -hit[2])
+        return hits[:top_k]
+
+    def semantic_search(self, query: str, top_k: int = 5, mode: str = "vector",
+                        shards: ShardFilter = None) -> List[Dict[str, Any]]:
+        """
+        chroma_manager.semantic_search over the selected shards: the top_k
+        nodes, best first, each with its 'shard', 'id', 'document', 'metadata'
+        and 'score'. Documents are only fetched for the merged top_k.
+        """
+        hits = self._rank(query, self.select(shards), top_k, mode)
+        by_shard: Dict[str, Tuple[Shard, List[str]]] = {}
+        for shard, node, _ in hits:
+            by_shard.setdefault(shard.name, (shard, []))[1].append(node)
+
+        def fetch(item: Tuple[Shard, List[str]]) -> Tuple[str, Dict[str, Tuple[Any, Any]]]:
+            shard, nodes = item
+            found = self.collection(shard).get(ids=nodes)
+            return shard.name, {i: (d, m) for i, d, m in zip(found["ids"], found.get("documents") or [],
+                                                              found.get("metadatas") or [])}
+
+        stored = dict(self._pool.map(fetch, by_shard.values()))
+        results = []
+        for shard, node, score in hits:
+            document, metadata = stored[shard.name].get(node, (None, None))
+            results.append({"shard": shard.name, "id": node, "document": document, "metadata": metadata,
+                            "score": score})
+        return results
+
+    def semantic_graph_search(self, query: str, depth: int = 2, top_k: int = 3, relations=None,
+                              max_per_hop: int = 50, max_nodes: int = 100, mode: str = "vector",
+                              shards: ShardFilter = None) -> List[Dict[str, Any]]:
+        """
+        chroma_manager.semantic_graph_search over the selected shards. The
+        top_k seeds are picked across shards as in semantic_search, then
+        expanded concurrently within the graphs of the shards they came
+        from. Results are merged by graph distance and then score, cut to
+        max_nodes, and each names its 'shard'.
+        """
+        hits = self._rank(query, self.select(shards), top_k, mode)
+        seeds: Dict[str, Tuple[Shard, List[Tuple[str, float]]]] = {}
+        for shard, node, score in hits:
+            seeds.setdefault(shard.name, (shard, []))[1].append((node, score))
+
+        def expand(item: Tuple[Shard, List[Tuple[str, float]]]) -> List[Dict[str, Any]]:
+            shard, ranked = item
+            self._loaded(shard)
+            results = expand_seeds(ranked, shard.G, self.collection(shard), depth, relations,
+                                   max_per_hop, max_nodes, shard.adjacency)
+            for result in results:
+                result["shard"] = shard.name
+            return results
+
+        merged = [result for results in self._pool.map(expand, seeds.values()) for result in results]
+        merged.sort(key=lambda r: (r["distance"], -r["score"]))
+        return merged[:max_nodes]
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Index source trees as separate shards and search across them.")
+    ap.add_argument("--folder", default=SHARDS_PATH, help="folder holding the shard manifest and snapshots")
+    commands = ap.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="register and index a shard")
+    add.add_argument("name")
+    add.add_argument("root", help="source folder of the shard")
+    add.add_argument("--language", default="java")
+    add.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                     help=f"also skip paths matching GLOB (always skipped: {', '.join(DEFAULT_EXCLUDES)})")
+    add.add_argument("--no-index", action="store_true", help="only register the shard")
+    index = commands.add_parser("index", help="index shards in parallel (all by default)")
+    index.add_argument("shards", nargs="*", metavar="GLOB")
+    index.add_argument("--workers", type=int, default=1, help="parse processes per shard")
+    rebuild = commands.add_parser("rebuild", help="re-index a shard from scratch")
+    rebuild.add_argument("name")
+    drop = commands.add_parser("drop", help="delete a shard")
+    drop.add_argument("name")
+    commands.add_parser("list", help="list shards")
+    search = commands.add_parser("search", help="search shards")
+    search.add_argument("query")
+    search.add_argument("--shard", action="append", metavar="GLOB", help="only search matching shards")
+    search.add_argument("--mode", choices=SEARCH_MODES, default="vector")
+    search.add_argument("--top-k", type=int, default=5)
+    search.add_argument("--depth", type=int, help="also expand results this many hops through the graph")
+    args = ap.parse_args()
+
+    router = ShardRouter(args.folder)
+    try:
+        if args.command == "add":
+            discovery_options = {"excludes": DEFAULT_EXCLUDES + tuple(args.exclude)} if args.exclude else None
+            router.add_shard(args.name, args.root, args.language, discovery_options, index=not args.no_index)
+        elif args.command == "index":
+            for name, stats in router.index(args.shards or None, args.workers).items():
+                print(f"{name}: {stats}")
+        elif args.command == "rebuild":
+            print(router.rebuild_shard(args.name))
+        elif args.command == "drop":
+            router.drop_shard(args.name)
+        elif args.command == "list":
+            for shard in router.select():
+                print(f"{shard.name}\t{shard.language}\t{shard.root_folder}")
+        elif args.depth is not None:
+            for r in router.semantic_graph_search(args.query, depth=args.depth, top_k=args.top_k, mode=args.mode,
+                                                  shards=args.shard):
+                print(f"{r['shard']}:{r['id']} (distance {r['distance']}, score {r['score']:.3f})")
+        else:
+            for r in router.semantic_search(args.query, top_k=args.top_k, mode=args.mode, shards=args.shard):
+                print(f"{r['shard']}:{r['id']} (score {r['score']:.3f})")
+    except ValueError as e:
+        ap.error(str(e))
+
+if __name__ == "__main__":
+    main()
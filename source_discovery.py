@@ -0,0 +1,198 @@
+import fnmatch
+import os
+import re
+from typing import Iterable, Iterator, List, Optional, Pattern, Sequence, Tuple
+
+from metrics import count
+
+# Directories never worth parsing: VCS metadata, IDE and build output and
+# dependencies. Patterns without a '/' match an entry's name anywhere in the
+# tree; patterns with one match its path relative to the project root.
+DEFAULT_EXCLUDES = (".git", ".svn", ".hg", ".gradle", ".idea", "build", "target", "node_modules")
+# Files larger than this are skipped (generated code, vendored bundles).
+MAX_FILE_BYTES = 2 * 1024 * 1024
+
+class GitIgnore:
+    """
+    The patterns of one .gitignore file, matched against paths relative to
+    the directory holding it. Supports comments, negation ('!'), directory
+    patterns ('dir/'), anchored patterns ('/dir', 'a/b') and the '*', '?',
+    '[...]' and '**' wildcards.
+    """
+
+    def __init__(self, lines: Sequence[str]):
+        self.rules: List[Tuple[Pattern[str], bool, bool]] = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            regex = _translate(line.lstrip("/"))
+            if not anchored:
+                regex = "(?:.*/)?" + regex
+            self.rules.append((re.compile(regex + r"\Z", re.DOTALL), negate, dir_only))
+
+    @classmethod
+    def from_file(cls, path: str) -> "GitIgnore":
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return cls(f.readlines())
+
+    def match(self, relative: str, is_dir: bool) -> Optional[bool]:
+        """True if relative ('/'-separated) is ignored, False if re-included, None if no pattern matches."""
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if (is_dir or not dir_only) and regex.match(relative):
+                result = not negate
+        return result
+
+def _translate(pattern: str) -> str:
+    """Regex for a gitignore glob, where only '**' crosses directory separators."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+            i = end + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+def iter_source_files(root_folder: str, language: str, excludes: Sequence[str] = DEFAULT_EXCLUDES,
+                      use_gitignore: bool = True, max_bytes: Optional[int] = MAX_FILE_BYTES,
+                      skipped: Optional[List[Tuple[str, str]]] = None) -> Iterator[str]:
+    """
+    Yield the source files for language under root_folder as they are found,
+    in sorted path order (the order of sorted(glob(...))).
+
+    Directories matching excludes (see DEFAULT_EXCLUDES) or ignored by a
+    .gitignore are not entered. .gitignore files are read in every directory
+    on the way down and, when root_folder is inside a git work tree, in its
+    parents up to the top of the work tree. Symlinked directories are
+    not followed. Files larger than max_bytes are not yielded but appended
+    to skipped as (path, reason).
+    """
+    suffix = f".{language}"
+    name_globs = [p for p in excludes if "/" not in p]
+    path_globs = [p.strip("/") for p in excludes if "/" in p]
+
+    def walk(folder: str, relative: str, ignores: List[Tuple[str, str, GitIgnore]]) -> Iterator[str]:
+        try:
+            with os.scandir(folder) as it:
+                entries = list(it)
+        except OSError as e:
+            if skipped is not None:
+                skipped.append((folder, f"unreadable: {e}"))
+            return
+        if use_gitignore and any(entry.name == ".gitignore" for entry in entries):
+            try:
+                ignores = ignores + [(relative, "", GitIgnore.from_file(os.path.join(folder, ".gitignore")))]
+            except OSError:
+                pass
+
+        children = []
+        for entry in entries:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if not is_dir and not entry.name.endswith(suffix):
+                continue
+            entry_relative = f"{relative}/{entry.name}" if relative else entry.name
+            if _excluded(entry.name, entry_relative, is_dir, name_globs, path_globs, ignores):
+                count("paths_ignored")
+                continue
+            # Sorting directories as "name/" walks the tree in sorted full-path order.
+            children.append((entry.name + "/" if is_dir else entry.name, is_dir, entry, entry_relative))
+        children.sort(key=lambda child: child[0])
+
+        for _, is_dir, entry, entry_relative in children:
+            if is_dir:
+                yield from walk(entry.path, entry_relative, ignores)
+                continue
+            if max_bytes is not None:
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    continue
+                if size > max_bytes:
+                    count("files_skipped")
+                    if skipped is not None:
+                        skipped.append((entry.path, f"{size} bytes, over the {max_bytes} byte limit"))
+                    continue
+            yield entry.path
+
+    yield from walk(root_folder, "", _parent_ignores(root_folder) if use_gitignore else [])
+
+def find_source_files(root_folder: str, language: str, **options) -> List[str]:
+    """Sorted paths of all source files for language under root_folder; see iter_source_files."""
+    return list(iter_source_files(root_folder, language, **options))
+
+def report_skipped(skipped: Iterable[Tuple[str, str]]) -> None:
+    """Print the files left out of a run and why."""
+    for path, reason in skipped:
+        print(f"Skipped {path}: {reason}")
+
+def _parent_ignores(root_folder: str) -> List[Tuple[str, str, GitIgnore]]:
+    """
+    The .gitignore files above root_folder, outermost first, if it is inside
+    a git work tree. Each comes with the path from its directory down to
+    root_folder, the prefix of root-relative paths it is matched against.
+    """
+    found = []
+    folder = os.path.abspath(root_folder)
+    prefix = ""
+    while not os.path.exists(os.path.join(folder, ".git")):
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return []
+        prefix = f"{os.path.basename(folder)}/{prefix}"
+        folder = parent
+        path = os.path.join(folder, ".gitignore")
+        if os.path.isfile(path):
+            try:
+                found.append(("", prefix, GitIgnore.from_file(path)))
+            except OSError:
+                pass
+    return found[::-1]
+
+def _excluded(name: str, relative: str, is_dir: bool, name_globs: List[str], path_globs: List[str],
+              ignores: List[Tuple[str, str, GitIgnore]]) -> bool:
+    """
+    Whether an entry is excluded by a glob or ignored. ignores holds
+    (base, prefix, rules): rules apply below the root-relative directory
+    base, to paths relative to base with prefix prepended.
+    """
+    if any(fnmatch.fnmatchcase(name, p) for p in name_globs):
+        return True
+    if any(fnmatch.fnmatchcase(relative, p) for p in path_globs):
+        return True
+    ignored = False
+    for base, prefix, rules in ignores:
+        result = rules.match(prefix + (relative[len(base) + 1:] if base else relative), is_dir)
+        if result is not None:
+            ignored = result
+    return ignored
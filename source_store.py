@@ -0,0 +1,102 @@
+import hashlib
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+class SourceStore:
+    """
+    Read-only, memory-mapped access to source files for lazily loading code spans.
+
+    At most max_open files are kept mapped (least recently used are closed).
+    A file whose mtime or size changed since it was mapped is re-mapped, so
+    a rewritten file is never read through a stale or truncated mapping.
+
+    A read given the digest of the contents a span was taken from returns
+    None once the file's contents differ (or it is gone), as the span may
+    no longer point at the same code. Each mapping is hashed once, the
+    first time such a read needs it.
+    """
+
+    def __init__(self, max_open: int = 256):
+        self.max_open = max_open
+        # path -> [(mtime_ns, size), mapping, digest of the mapping or None until needed]
+        self._maps: "OrderedDict[str, List]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read(self, path: str, start: int, end: int, digest: Optional[str] = None) -> Optional[bytes]:
+        """Return bytes [start, end) of path, or None if its contents no longer have digest."""
+        with self._lock:
+            try:
+                entry = self._mapping(path)
+            except FileNotFoundError:
+                if digest is None:
+                    raise
+                return None
+            if digest is not None:
+                if entry[2] is None:
+                    entry[2] = source_digest(entry[1])
+                if entry[2] != digest:
+                    return None
+            return entry[1][start:end]
+
+    def text(self, path: str, start: int, end: int, digest: Optional[str] = None) -> Optional[str]:
+        """Return bytes [start, end) of path decoded as UTF-8, or None as read() does."""
+        data = self.read(path, start, end, digest)
+        return None if data is None else data.decode("utf-8", errors="replace")
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            entry = self._maps.pop(path, None)
+            if entry is not None:
+                _close(entry[1])
+
+    def close(self) -> None:
+        with self._lock:
+            for _, data, _ in self._maps.values():
+                _close(data)
+            self._maps.clear()
+
+    def _mapping(self, path: str):
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        entry = self._maps.get(path)
+        if entry is not None and entry[0] == stamp:
+            self._maps.move_to_end(path)
+            return entry
+        if entry is not None:
+            _close(entry[1])
+
+        if st.st_size == 0:
+            data = b""
+        else:
+            with open(path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        entry = self._maps[path] = [stamp, data, None]
+        self._maps.move_to_end(path)
+        while len(self._maps) > self.max_open:
+            _, (_, old, _) = self._maps.popitem(last=False)
+            _close(old)
+        return entry
+
+def _close(data) -> None:
+    if isinstance(data, mmap.mmap):
+        data.close()
+
+_default_store = SourceStore()
+
+def source_digest(data) -> str:
+    """Content hash of a source file's bytes, as the parse cache and records keep it."""
+    return hashlib.sha1(data).hexdigest()
+
+def source_text(path: str, start: int, end: int, digest: Optional[str] = None) -> Optional[str]:
+    """
+    Decoded text of a byte span of path, through the shared SourceStore;
+    None if path's contents no longer have digest.
+    """
+    return _default_store.text(path, start, end, digest)
+
+def invalidate_source(path: str) -> None:
+    """Forget the shared mapping of path, e.g. after it was re-parsed."""
+    _default_store.invalidate(path)
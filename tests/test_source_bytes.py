@@ -0,0 +1,69 @@
+"""Byte offsets and names of elements extracted from non-ASCII Java sources."""
+import pytest
+
+from parse_cache import ParseCache
+from tree_sitter_parser import parse_file, parse_source
+
+HEADER = "// Überprüfung der Zeichenkodierung: 日本語, Ελληνικά 🚀 { größe(); }\npackage démo;\n\n"
+METHOD = """    /** Berechnet die Größe — 計算 ✓ (nicht aufrufen: faux()) */
+    public int größe(String naïve) {
+        String s = "naïve ✓ 😀 } ( échec(); {";
+        return naïve.length() + zähler(s);
+    }"""
+HELPER = """    private int zähler(String s) {
+        return s.codePointCount(0, s.length());
+    }"""
+SOURCE = HEADER + "public class Çlass {\n" + METHOD + "\n\n" + HELPER + "\n}\n"
+
+def check_elements(elements, text):
+    """Names match the source and every span decodes to exactly its declaration."""
+    assert [c["name"] for c in elements["classes"]] == ["Çlass"]
+    assert elements["classes"][0]["code"] == text[text.index("public class Çlass"):text.rindex("}") + 1]
+
+    methods = {m["name"]: m for m in elements["methods"]}
+    assert set(methods) == {"größe", "zähler"}
+    assert methods["größe"]["id"] == "Çlass.größe"
+    # tree-sitter attaches the Javadoc as a separate comment node, so the span starts at the modifiers.
+    assert methods["größe"]["code"] == METHOD[METHOD.index("public int größe"):]
+    assert methods["zähler"]["code"] == HELPER.strip()
+
+    calls = {(c["caller"], c["call"], c["qualifier"]) for c in elements["method_calls"]}
+    # Nothing is extracted from the comments or the string literal.
+    assert calls == {("größe", "length", "naïve"), ("größe", "zähler", None),
+                     ("zähler", "codePointCount", "s"), ("zähler", "length", "s")}
+    for call in elements["method_calls"]:
+        assert call["code"].startswith(call["qualifier"] or call["call"])
+        assert call["code"] in text
+
+@pytest.fixture
+def java_file(tmp_path):
+    path = tmp_path / "Çlass.java"
+    path.write_text(SOURCE, encoding="utf-8")
+    return str(path)
+
+def test_parse_source_text():
+    check_elements(parse_source(SOURCE, "java"), SOURCE)
+
+def test_parse_source_bytes():
+    check_elements(parse_source(SOURCE.encode("utf-8"), "java"), SOURCE)
+
+def test_parse_file(java_file):
+    path, elements, error = parse_file(java_file, "java")
+    assert error is None
+    check_elements(elements, SOURCE)
+
+def test_parse_cache_incremental(java_file, tmp_path):
+    cache = ParseCache(str(tmp_path / "parse_cache.json"), "java", keep_trees=True)
+    check_elements(cache.parse(java_file)[1], SOURCE)
+
+    # Insert multi-byte text before every declaration so all spans move.
+    edited = SOURCE.replace("package démo;", "package démo; // geändert ✓ ünd nöch mehr")
+    with open(java_file, "w", encoding="utf-8") as f:
+        f.write(edited)
+    check_elements(cache.parse(java_file)[1], edited)
+
+def test_undecodable_bytes_are_replaced():
+    data = SOURCE.encode("utf-8").replace("échec".encode("utf-8"), b"\xff\xfechec")
+    elements = parse_source(data, "java")
+    assert [m["name"] for m in elements["methods"]] == ["größe", "zähler"]
+    assert "\ufffd\ufffdchec();" in elements["methods"][0]["code"]
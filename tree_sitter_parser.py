@@ -1,32 +1,214 @@
 
-from tree_sitter import Language, Parser, Node
-from typing import Dict, Any, Optional
+import importlib
+import os
+import time
+from functools import lru_cache
+from tree_sitter import Language, Parser, Node, Tree
+from typing import Dict, Any, List, Optional, Tuple, Union
 
-# Language-specific imports
-import tree_sitter_java as tsjava
-# import tree_sitter_c_sharp as tscs  # Uncomment when c# is needed
+from element_records import ClassRecord, MethodRecord, CallRecord, RECORD_TYPES
+from metrics import count, timer
+from source_store import source_digest
 
+# Grammar package for each language; a grammar is only imported and built
+# by get_language, the first time its language is parsed.
 LANGUAGES = {
-    "java": Language(tsjava.language()),
-    # "csharp": Language(tscs.language()), # Uncomment when c# is needed
+    "java": "tree_sitter_java",
+    # "csharp": "tree_sitter_c_sharp", # Uncomment when c# is needed
 }
 
-def init_parser(language: str) -> Parser:
-    """Initialize tree-sitter parser for a given language."""
+# Seconds tree-sitter may spend on one project file before it is given up.
+PARSE_TIMEOUT = 10.0
+# Bytes handed to tree-sitter per read when parsing under a timeout.
+READ_CHUNK_BYTES = 64 * 1024
+
+class ParseTimeout(Exception):
+    """Raised when parsing a source takes longer than its timeout."""
+
+@lru_cache(maxsize=None)
+def get_language(language: str) -> Language:
+    """Return the tree-sitter grammar for language, built once per process."""
     if language not in LANGUAGES:
         raise ValueError(f"Unsupported language: {language}")
-    
-    parser = Parser(LANGUAGES[language])
+    return Language(importlib.import_module(LANGUAGES[language]).language())
+
+def init_parser(language: str) -> Parser:
+    """Initialize tree-sitter parser for a given language."""
+    parser = Parser(get_language(language))
     return parser
 
-def parse_source(source: str, language: str) -> Dict[str, Any]:
+@lru_cache(maxsize=None)
+def get_parser(language: str) -> Parser:
+    """Return a parser for language, created once per process and then reused."""
+    return init_parser(language)
+
+# Node types that open a new caller scope for method invocations.
+CLASS_TYPES = ("class_declaration", "interface_declaration", "enum_declaration")
+METHOD_TYPES = ("method_declaration", "constructor_declaration")
+SCOPE_TYPES = CLASS_TYPES + METHOD_TYPES
+# Members listed in a class summary with their whole declaration, and
+# members listed up to the start of their body.
+FIELD_TYPES = ("field_declaration", "constant_declaration")
+SIGNATURE_TYPES = METHOD_TYPES + ("annotation_type_element_declaration", "enum_constant")
+# Fields longer than this (big initializers) are cut short in class summaries.
+MAX_FIELD_CHARS = 200
+
+# Source handed to the parser: text, or its UTF-8 bytes in any buffer
+# tree-sitter reads directly (bytes, memoryview).
+Source = Union[str, bytes, memoryview]
+
+def parse_source(source: Source, language: str, file: Optional[str] = None,
+                 timeout: Optional[float] = None) -> Dict[str, Any]:
     """
     Parse source code with tree-sitter and extract elements based on the language.
+
+    source may be text, which is encoded once, or UTF-8 bytes, which are
+    parsed in place; only the identifiers the records need are decoded.
+    Elements are compact records (see element_records). When file is the
+    path source was read from, records load their code from that file on
+    demand while its contents still match source (see
+    element_records.ElementRecord); otherwise they share one encoded copy
+    of source. With a timeout
+    (seconds), ParseTimeout is raised if tree-sitter takes longer.
     """
-    parser = init_parser(language)
-    tree = parser.parse(bytes(source, "utf8"))
-    root_node = tree.root_node
-    
+    elements, _ = _parse(source, language, None, file, timeout)
+    return elements
+
+def parse_source_incremental(source: Source, language: str, previous: Optional[Tuple[Tree, bytes]] = None,
+                             file: Optional[str] = None,
+                             timeout: Optional[float] = None) -> Tuple[Dict[str, Any], Tuple[Tree, bytes]]:
+    """
+    Like parse_source, but reuses the tree of an earlier version of the same file.
+
+    previous is the (tree, source bytes) pair returned by an earlier call. The
+    changed byte range is applied to the old tree with tree.edit, so
+    tree-sitter only re-parses the edited region. Returns the elements and
+    the new (tree, source bytes) pair to pass in next time.
+    """
+    return _parse(source, language, previous, file, timeout)
+
+def _parse(source: Source, language: str, previous: Optional[Tuple[Tree, bytes]], file: Optional[str],
+           timeout: Optional[float] = None) -> Tuple[Dict[str, Any], Tuple[Tree, bytes]]:
+    data = source.encode("utf-8") if isinstance(source, str) else source
+    parser = get_parser(language)
+    with timer("parse", file):
+        old_tree = None
+        if previous is not None:
+            old_tree, old_data = previous
+            edit_tree(old_tree, old_data, data)
+        if timeout is None:
+            tree = parser.parse(data) if old_tree is None else parser.parse(data, old_tree)
+        else:
+            tree = _parse_with_timeout(parser, data, old_tree, timeout)
+
+    with timer("extract", file):
+        elements = extract_source_elements(tree.root_node, data, language)
+        shared = None if file is not None else data if isinstance(data, bytes) else bytes(data)
+        digest = source_digest(data) if file is not None else None
+        for key in RECORD_TYPES:
+            for record in elements[key]:
+                if file is None:
+                    record.source = shared
+                else:
+                    record.file = file
+                    record.digest = digest
+    count("files_parsed")
+    count("bytes_parsed", len(data))
+    return elements, (tree, data)
+
+def _parse_with_timeout(parser: Parser, data: Source, old_tree: Optional[Tree], timeout: float) -> Tree:
+    """
+    Parse data, feeding tree-sitter READ_CHUNK_BYTES at a time and checking
+    the clock between chunks; past the deadline the input is cut short, the
+    partial tree is discarded and ParseTimeout raised. Chunks are copied
+    rather than memoryview slices, which tree-sitter may hold on to.
+    """
+    deadline = time.perf_counter() + timeout
+    expired = False
+
+    def read(offset: int, _point) -> bytes:
+        nonlocal expired
+        if expired or time.perf_counter() > deadline:
+            expired = True
+            return b""
+        return data[offset:offset + READ_CHUNK_BYTES]
+
+    tree = parser.parse(read) if old_tree is None else parser.parse(read, old_tree)
+    if expired:
+        count("parse_timeouts")
+        raise ParseTimeout(f"parsing took longer than {timeout:g}s")
+    return tree
+
+def edit_tree(tree: Tree, old_data: bytes, new_data: bytes) -> None:
+    """Describe the single changed byte range between old_data and new_data to tree."""
+    start = _common_prefix(old_data, new_data)
+    suffix = _common_suffix(old_data, new_data, min(len(old_data), len(new_data)) - start)
+    old_end = len(old_data) - suffix
+    new_end = len(new_data) - suffix
+    tree.edit(
+        start_byte=start,
+        old_end_byte=old_end,
+        new_end_byte=new_end,
+        start_point=_byte_point(old_data, start),
+        old_end_point=_byte_point(old_data, old_end),
+        new_end_point=_byte_point(new_data, new_end),
+    )
+
+# Bytes compared per slice when looking for the changed range of an edit.
+EDIT_BLOCK_BYTES = 4096
+
+def _common_prefix(a: bytes, b: bytes) -> int:
+    """
+    Length of the common prefix of a and b. Whole blocks are compared as
+    slices (in C), then the first differing block is bisected.
+    """
+    limit = min(len(a), len(b))
+    start = 0
+    while start < limit:
+        end = min(start + EDIT_BLOCK_BYTES, limit)
+        if a[start:end] != b[start:end]:
+            break
+        start = end
+    else:
+        return limit
+    # The prefix ends in [start, end): a[start:lo] matches, a[start:hi] does not.
+    lo, hi = start, end
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[start:mid] == b[start:mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+def _common_suffix(a: bytes, b: bytes, limit: int) -> int:
+    """Length of the common suffix of a and b, at most limit bytes, found like _common_prefix."""
+    a_end, b_end = len(a), len(b)
+    suffix = 0
+    while suffix < limit:
+        size = min(EDIT_BLOCK_BYTES, limit - suffix)
+        if a[a_end - suffix - size:a_end - suffix] != b[b_end - suffix - size:b_end - suffix]:
+            break
+        suffix += size
+    else:
+        return limit
+    # The suffix is between suffix and suffix + size bytes long.
+    lo, hi = suffix, suffix + size
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[a_end - mid:a_end - suffix] == b[b_end - mid:b_end - suffix]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+def _byte_point(data: bytes, offset: int) -> Tuple[int, int]:
+    """(row, column) of a byte offset, as tree-sitter counts them."""
+    row = data.count(b"\n", 0, offset)
+    return row, offset - (data.rfind(b"\n", 0, offset) + 1)
+
+def extract_source_elements(root_node: Node, source: bytes, language: str) -> Dict[str, Any]:
+    """Run the extractor for language over a parsed tree."""
     elements = {
         "classes": [],
         "methods": [],
@@ -36,146 +218,168 @@ def parse_source(source: str, language: str) -> Dict[str, Any]:
     
     # Language-specific extraction logic can be added here
     if language == "java":
-        extract_imports(root_node, source, elements)
-        extract_classes_and_methods(root_node, source, elements)
-        extract_method_calls(root_node, source, elements)
+        extract_elements(root_node, source, elements)
     # Add elif for other languages like csharp
     
     return elements
 
-def extract_imports(node: Node, source: str, elements: Dict[str, Any]) -> None:
-    """Extract import statements from the AST."""
-    for child in node.children:
-        if child.type == "import_declaration":
-            import_text = get_node_text(child, source)
-            import_path = import_text.replace("import", "").replace(";", "").strip()
-            if import_path.startswith("static "):
-                import_path = import_path.replace("static ", "").strip()
-            elements["imports"].append(import_path)
-        
-        extract_imports(child, source, elements)
-
-def extract_classes_and_methods(node: Node, source: str, elements: Dict[str, Any]) -> None:
-    """Extract class and interface declarations along with their methods."""
-    if node.type in ["class_declaration", "interface_declaration", "enum_declaration"]:
-        cls_name = None
-        
-        for child in node.children:
-            if child.type == "identifier":
-                cls_name = get_node_text(child, source)
-                break
-        
-        if cls_name:
-            cls_code = get_node_text(node, source)
-            elements["classes"].append({
-                "name": cls_name,
-                "code": cls_code,
-                "node": node
-            })
-            
-            extract_methods_from_class(node, cls_name, source, elements)
-    
+def parse_file(path: str, language: str,
+               timeout: Optional[float] = PARSE_TIMEOUT) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Read and parse one source file, returning (path, elements, error).
+
+    The elements are compact and picklable: records hold no tree-sitter
+    nodes or source text, only their file and byte span, so the result can
+    be sent back from a worker process. On failure (including a parse
+    taking longer than timeout seconds) elements is None and error holds
+    the message.
+    """
+    try:
+        with timer("read", path):
+            with open(path, "rb") as f:
+                data = f.read()
+        elems = parse_source(data, language, file=path, timeout=timeout)
+    except Exception as e:
+        count("parse_errors")
+        return path, None, str(e)
+    return path, elems, None
+
+def extract_elements(root_node: Node, source: bytes, elements: Dict[str, Any]) -> None:
+    """
+    Extract imports, classes, methods and method calls in a single pre-order walk.
+
+    A TreeCursor visits every node exactly once while a stack of
+    (depth, name) pairs tracks the enclosing class/method, so callers are
+    known without climbing the parent chain for every invocation.
+    """
+    cursor = root_node.walk()
+    scopes: List[Tuple[int, str]] = []
+    depth = 0
+
+    while True:
+        node = cursor.node
+        node_type = node.type
+
+        if node_type == "method_invocation":
+            extract_method_call(node, source, scopes[-1][1] if scopes else None, elements)
+        elif node_type == "import_declaration":
+            elements["imports"].append(parse_import(node, source))
+        elif node_type in SCOPE_TYPES:
+            name = get_declaration_name(node, source)
+            if name:
+                if node_type in CLASS_TYPES:
+                    elements["classes"].append(ClassRecord(
+                        name, node_type.replace("_declaration", ""), None, node.start_byte, node.end_byte,
+                        summary=summarize_class(node, source)
+                    ))
+                    extract_methods_from_class(node, name, source, elements)
+                scopes.append((depth, name))
+
+        if cursor.goto_first_child():
+            depth += 1
+            continue
+
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return
+            depth -= 1
+
+        # Leaving a subtree: drop scopes opened at this depth or below.
+        while scopes and scopes[-1][0] >= depth:
+            scopes.pop()
+
+def summarize_class(node: Node, source: bytes) -> Optional[str]:
+    """
+    The declaration of a class node (annotations, modifiers, extends and
+    implements clauses) followed by its fields and the signatures of its
+    constructors and methods, without their bodies. Nested classes are
+    listed by their declaration only. None if the node has no body.
+    """
+    body = node.child_by_field_name("body")
+    if body is None:
+        return None
+    lines = [_squash(source[node.start_byte:body.start_byte]) + " {"]
+    _summarize_members(body, source, lines)
+    lines.append("}")
+    return "\n".join(lines)
+
+def _summarize_members(body: Node, source: bytes, lines: List[str]) -> None:
+    for member in body.named_children:
+        kind = member.type
+        if kind == "enum_body_declarations":
+            _summarize_members(member, source, lines)
+        elif kind in FIELD_TYPES:
+            text = _squash(source[member.start_byte:member.end_byte])
+            if len(text) > MAX_FIELD_CHARS:
+                text = text[:MAX_FIELD_CHARS] + " ...;"
+            lines.append("    " + text)
+        elif kind in SIGNATURE_TYPES or kind in CLASS_TYPES:
+            inner = member.child_by_field_name("body")
+            if inner is None:
+                lines.append("    " + _squash(source[member.start_byte:member.end_byte]))
+            elif kind in CLASS_TYPES:
+                lines.append("    " + _squash(source[member.start_byte:inner.start_byte]) + " { ... }")
+            else:
+                lines.append("    " + _squash(source[member.start_byte:inner.start_byte]) + ";")
+
+def _squash(text: bytes) -> str:
+    """Decoded text with every run of whitespace collapsed to one space."""
+    return " ".join(str(text, "utf-8", "replace").split())
+
+def parse_import(node: Node, source: bytes) -> str:
+    """Return the imported path of an import_declaration, without 'static'."""
+    import_text = get_node_text(node, source)
+    import_path = import_text.replace("import", "").replace(";", "").strip()
+    if import_path.startswith("static "):
+        import_path = import_path.replace("static ", "").strip()
+    return import_path
+
+def get_declaration_name(node: Node, source: bytes) -> Optional[str]:
+    """Return the text of the first identifier child of a declaration, if any."""
     for child in node.children:
-        extract_classes_and_methods(child, source, elements)
+        if child.type == "identifier":
+            return get_node_text(child, source)
+    return None
 
-def extract_methods_from_class(class_node: Node, cls_name: str, source: str, elements: Dict[str, Any]) -> None:
-    """Extract method declarations from a class or interface."""
+def extract_methods_from_class(class_node: Node, cls_name: str, source: bytes, elements: Dict[str, Any]) -> None:
+    """Extract method and constructor declarations from a class or interface."""
     for child in class_node.children:
         if child.type in ["class_body", "interface_body", "enum_body"]:
             for member in child.children:
-                if member.type == "method_declaration":
-                    method_name = None
-                    
-                    for mchild in member.children:
-                        if mchild.type == "identifier":
-                            method_name = get_node_text(mchild, source)
-                            break
+                if member.type in METHOD_TYPES:
+                    method_name = get_declaration_name(member, source)
                     
                     if method_name:
-                        method_code = get_node_text(member, source)
-                        full_method_id = f"{cls_name}.{method_name}"
-                        elements["methods"].append({
-                            "class": cls_name,
-                            "name": method_name,
-                            "id": full_method_id,
-                            "code": method_code,
-                            "node": member
-                        })
-                elif member.type == "constructor_declaration":
-                    method_name = None
-                    for mchild in member.children:
-                        if mchild.type == "identifier":
-                            method_name = get_node_text(mchild, source)
-                            break
-                    
-                    if method_name:
-                        method_code = get_node_text(member, source)
-                        full_method_id = f"{cls_name}.{method_name}"
-                        elements["methods"].append({
-                            "class": cls_name,
-                            "name": method_name,
-                            "id": full_method_id,
-                            "code": method_code,
-                            "node": member
-                        })
-
-def extract_method_calls(node: Node, source: str, elements: Dict[str, Any]) -> None:
-    """Extract method invocations (method calls) from the AST."""
-    if node.type == "method_invocation":
-        method_name = None
-        qualifier = None
-        
-        for child in node.children:
-            if child.type == "identifier":
-                method_name = get_node_text(child, source)
-            elif child.type == "field_access":
-                qualifier = get_node_text(child, source)
-            elif child.type in ["this", "super"]:
-                qualifier = child.type
-        
-        if not method_name:
-            for child in node.children:
-                if child.type == "identifier":
-                    method_name = get_node_text(child, source)
-                    break
-        
-        if method_name:
-            caller = find_enclosing_method_or_class(node, source)
-            
-            elements["method_calls"].append({
-                "caller": caller,
-                "call": method_name,
-                "qualifier": qualifier,
-                "node": node
-            })
-    
-    for child in node.children:
-        extract_method_calls(child, source, elements)
+                        elements["methods"].append(MethodRecord(
+                            cls_name, method_name, member.type.replace("_declaration", ""),
+                            None, member.start_byte, member.end_byte
+                        ))
 
-def get_node_text(node: Node, source: str) -> str:
-    """Extract the source text for a given node."""
-    return source[node.start_byte:node.end_byte]
-
-def find_enclosing_method_or_class(node: Node, source: str) -> Optional[str]:
+def extract_method_call(node: Node, source: bytes, caller: Optional[str], elements: Dict[str, Any]) -> None:
     """
-    Find the name of the enclosing method or class for a given node.
-    Traverses up the tree to find the nearest method or class declaration.
+    Record a single method_invocation node made from within `caller`.
+
+    The qualifier is the object the method is called on when it is a plain
+    name ('customer', 'CustomerService'), a field access ('this.em') or
+    'this'/'super'; it is None for unqualified or chained calls.
     """
-    current = node.parent
+    name_node = node.child_by_field_name("name")
+    method_name = get_node_text(name_node, source) if name_node is not None else None
+    qualifier = None
     
-    while current is not None:
-        if current.type in ["method_declaration", "constructor_declaration"]:
-            for child in current.children:
-                if child.type == "identifier":
-                    text = child.text
-                    return text.decode("utf8") if isinstance(text, bytes) else text
-        
-        elif current.type in ["class_declaration", "interface_declaration", "enum_declaration"]:
-            for child in current.children:
-                if child.type == "identifier":
-                    text = child.text
-                    return text.decode("utf8") if isinstance(text, bytes) else text
-        
-        current = current.parent
+    object_node = node.child_by_field_name("object")
+    if object_node is not None:
+        object_type = object_node.type
+        if object_type in ["this", "super"]:
+            qualifier = object_type
+        elif object_type in ["identifier", "field_access"]:
+            qualifier = get_node_text(object_node, source)
     
-    return None
+    if method_name:
+        elements["method_calls"].append(CallRecord(
+            caller, method_name, qualifier, None, node.start_byte, node.end_byte
+        ))
+
+def get_node_text(node: Node, source: bytes) -> str:
+    """Decode the source text of a given node; tree-sitter offsets index the encoded bytes."""
+    return str(source[node.start_byte:node.end_byte], "utf-8", "replace")
@@ -1,86 +1,427 @@
 import networkx as nx
-from pyvis.network import Network
 import html
-import matplotlib.pyplot as plt
+import json
+import math
+import os
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 
-def visualize_graph_interactive(G: nx.DiGraph, output_html="./java_code_graph.html"):
+from element_records import node_code
+from graph_builder import Adjacency, build_adjacency, bounded_bfs
+
+# Map node types to colors for better visual distinction
+COLOR_MAP = {
+    "class": "#68a7f7",       # blue
+    "method": "#7ddf7d",      # green
+    "unresolved": "#f27b7b",  # red
+    "unknown": "#cccccc",     # grey
+    "cluster": "#f7c768",     # amber
+}
+
+LOD_LEVELS = ("class", "package")
+EXTERNAL_CLUSTER = "(external)"
+TOOLTIP_SHARD_SIZE = 500
+
+# Loads tooltip and cluster shards written next to the HTML file on demand. Shards are
+# plain scripts (not JSON fetched over XHR) so they also load from file:// URLs.
+LAZY_LOADER_JS = """
+<script type="text/javascript">
+  window.graphShards = {tooltips: {}, clusters: {}};
+  var shardDir = %(shard_dir)s;
+
+  function loadShard(kind, key, done) {
+    if (key in graphShards[kind]) { done(graphShards[kind][key]); return; }
+    var script = document.createElement("script");
+    script.src = shardDir + "/" + kind + "/" + key + ".js";
+    script.onload = function () { done(graphShards[kind][key]); };
+    document.head.appendChild(script);
+  }
+
+  function edgeColor(relation) {
+    return relation === "contains" ? "#0074D9" : relation === "calls" ? "#FF4136" : "#888";
+  }
+
+  function expandCluster(cluster, shard) {
+    var origin = network.getPositions([cluster.id])[cluster.id] || {x: 0, y: 0};
+    var radius = 40 * Math.sqrt(shard.nodes.length);
+    edges.remove(network.getConnectedEdges(cluster.id));
+    nodes.remove(cluster.id);
+    nodes.add(shard.nodes.map(function (n, i) {
+      var angle = 2 * Math.PI * i / shard.nodes.length;
+      n.x = origin.x + radius * Math.cos(angle);
+      n.y = origin.y + radius * Math.sin(angle);
+      return n;
+    }));
+    // [from, to, from cluster, to cluster, relation]: each end attaches to its
+    // member node when that is on screen, otherwise to its (collapsed) cluster.
+    edges.update(shard.edges.map(function (e) {
+      var from = nodes.get(e[0]) ? e[0] : e[2];
+      var to = nodes.get(e[1]) ? e[1] : e[3];
+      return {id: from + "->" + to + ":" + e[4], from: from, to: to, title: e[4],
+              color: edgeColor(e[4]), arrows: "to"};
+    }).filter(function (e) { return nodes.get(e.from) && nodes.get(e.to); }));
+  }
+
+  network.on("hoverNode", function (params) {
+    var node = nodes.get(params.node);
+    if (node.tooltipShard === undefined || node.tooltipLoaded) return;
+    loadShard("tooltips", node.tooltipShard, function (shard) {
+      var title = document.createElement("div");
+      title.innerHTML = shard[node.id];
+      nodes.update({id: node.id, title: title, tooltipLoaded: true});
+    });
+  });
+
+  network.on("doubleClick", function (params) {
+    if (!params.nodes.length) return;
+    var node = nodes.get(params.nodes[0]);
+    if (node.clusterShard === undefined) return;
+    loadShard("clusters", node.clusterShard, function (shard) { expandCluster(node, shard); });
+  });
+</script>
+"""
+
+def visualize_graph_interactive(G: nx.DiGraph, output_html="./java_code_graph.html",
+                                lazy_tooltips: bool = False, layout_cache: Optional[str] = None):
     """
     Create an interactive, draggable HTML graph visualization using PyVis (Vis.js).
+
+    With lazy_tooltips, node code is written to shard files next to the HTML
+    and loaded on hover instead of being inlined. With layout_cache, node
+    positions come from (and are saved to) that JSON file and physics is
+    turned off.
     """
-    # Setting cdn_resources to 'in_line' makes the HTML file self-contained
-    net = Network(height="750px", width="100%", directed=True, notebook=True, cdn_resources='in_line')
-    net.force_atlas_2based()  # A nice layout algorithm
+    shard_dir = _shard_dir(output_html) if lazy_tooltips else None
+    positions = cached_layout(G, layout_cache) if layout_cache else None
+
+    tooltip_shards: Dict[int, Dict[str, str]] = {}
+    net_nodes = []
+    for i, (node, data) in enumerate(G.nodes(data=True)):
+        net_node = _network_node(node, data)
+        if lazy_tooltips:
+            shard = i // TOOLTIP_SHARD_SIZE
+            tooltip_shards.setdefault(shard, {})[str(node)] = net_node["title"]
+            net_node["title"] = _short_title(node, data)
+            net_node["tooltipShard"] = shard
+        net_nodes.append(net_node)
+
+    net_edges = [_network_edge(src, dst, edata.get("relation", ""))
+                 for src, dst, edata in G.edges(data=True)]
+
+    if shard_dir:
+        for shard, tooltips in tooltip_shards.items():
+            _write_shard(shard_dir, "tooltips", shard, tooltips)
+    _write_network(net_nodes, net_edges, output_html, positions, shard_dir)
 
-    # Map node types to colors for better visual distinction
-    color_map = {
-        "class": "#68a7f7",       # blue
-        "method": "#7ddf7d",      # green
-        "unresolved": "#f27b7b",  # red
-        "unknown": "#cccccc"      # grey
-    }
+def visualize_clustered_graph(G: nx.DiGraph, output_html="./java_code_graph.html", level: str = "package",
+                              expand: Iterable[str] = (), layout_cache: Optional[str] = None):
+    """
+    Level-of-detail view of a large graph: nodes are collapsed into one node
+    per package (or class), with edges between them aggregated.
+
+    Double-clicking a cluster in the browser expands it into its members,
+    loaded from shard files next to the HTML; clusters named in expand are
+    rendered expanded from the start. Member tooltips are always loaded
+    lazily, so the HTML itself only grows with the number of clusters.
+    """
+    C, members = collapse_graph(G, level, expand)
+    shard_dir = _shard_dir(output_html)
+    positions = cached_layout(C, layout_cache) if layout_cache else None
+
+    # Tooltip shards cover every member node, whether or not it starts expanded.
+    tooltip_shard: Dict[Any, int] = {}
+    tooltip_shards: Dict[int, Dict[str, str]] = {}
+    for i, (node, data) in enumerate(G.nodes(data=True)):
+        tooltip_shard[node] = i // TOOLTIP_SHARD_SIZE
+        tooltip_shards.setdefault(i // TOOLTIP_SHARD_SIZE, {})[str(node)] = _tooltip(node, data)
+
+    cluster_shard = {cluster: i for i, cluster in enumerate(sorted(members, key=str))}
+    owner = {node: cluster for cluster, nodes in members.items() for node in nodes}
+    cluster_edges: Dict[Any, List[Tuple[str, str, str, str, str]]] = {cluster: [] for cluster in members}
+    for src, dst, edata in G.edges(data=True):
+        record = (str(src), str(dst), str(owner[src]), str(owner[dst]), edata.get("relation", ""))
+        cluster_edges[owner[src]].append(record)
+        if owner[dst] != owner[src]:
+            cluster_edges[owner[dst]].append(record)
+
+    def member_node(node):
+        net_node = _network_node(node, G.nodes[node], title=_short_title(node, G.nodes[node]))
+        net_node["tooltipShard"] = tooltip_shard[node]
+        return net_node
+
+    net_nodes = []
+    for node, data in C.nodes(data=True):
+        if data.get("type") == "cluster":
+            net_node = _network_node(node, data)
+            net_node["value"] = data["size"]
+            net_node["clusterShard"] = cluster_shard[node]
+        else:
+            net_node = member_node(node)
+        net_nodes.append(net_node)
 
-    # Add nodes to the PyVis network
+    net_edges = []
+    for src, dst, edata in C.edges(data=True):
+        for relation, weight in sorted(edata["relations"].items()):
+            edge = _network_edge(src, dst, relation)
+            if weight > 1:
+                edge["title"] = f"{relation} x{weight}"
+                edge["width"] = 1 + math.log2(weight)
+            net_edges.append(edge)
+
+    for cluster, nodes in members.items():
+        if cluster in C:
+            _write_shard(shard_dir, "clusters", cluster_shard[cluster],
+                         {"nodes": [member_node(n) for n in nodes], "edges": cluster_edges[cluster]})
+    for shard, tooltips in tooltip_shards.items():
+        _write_shard(shard_dir, "tooltips", shard, tooltips)
+    _write_network(net_nodes, net_edges, output_html, positions, shard_dir)
+
+def collapse_graph(G: nx.DiGraph, level: str = "package",
+                   expand: Iterable[str] = ()) -> Tuple[nx.DiGraph, Dict[Any, List[Any]]]:
+    """
+    Collapse G into one 'cluster' node per package (directory of the source
+    file) or per class. Clusters named in expand (by id or key) keep their
+    members as individual nodes.
+
+    Returns the collapsed graph and cluster id -> member nodes. Edges of the
+    collapsed graph carry 'relations': relation -> number of original edges,
+    and 'weight': their total.
+    """
+    if level not in LOD_LEVELS:
+        raise ValueError(f"Unknown level of detail {level!r}; expected one of {LOD_LEVELS}")
+    expand = set(expand)
+    root = _common_dir(G) if level == "package" else None
+
+    members: Dict[Any, List[Any]] = {}
     for node, data in G.nodes(data=True):
-        node_type = data.get("type", "unknown")
-        color = color_map.get(node_type, "#ccc")
-        label = str(node)
-        # Create a rich HTML title for hover tooltips
-        code_snippet = html.escape(data.get('code', '')[:300])
-        title = f"<b>{label}</b><br>Type: {node_type}<br><pre>{code_snippet}</pre>"
-        net.add_node(node, label=label, title=title, color=color)
-
-    # Add edges to the PyVis network
+        key = _cluster_key(node, data, level, root)
+        members.setdefault(f"{level}:{key}", []).append(node)
+
+    C = nx.DiGraph()
+    group: Dict[Any, Any] = {}
+    for cluster, nodes in members.items():
+        key = cluster.split(":", 1)[1]
+        if cluster in expand or key in expand:
+            for node in nodes:
+                C.add_node(node, **G.nodes[node])
+                group[node] = node
+            continue
+        counts: Dict[str, int] = {}
+        for node in nodes:
+            node_type = G.nodes[node].get("type", "unknown")
+            counts[node_type] = counts.get(node_type, 0) + 1
+            group[node] = cluster
+        C.add_node(cluster, type="cluster", level=level, key=key, size=len(nodes), counts=counts)
+
     for src, dst, edata in G.edges(data=True):
+        u, v = group[src], group[dst]
+        if u == v and C.nodes[u].get("type") == "cluster":
+            continue
+        if not C.has_edge(u, v):
+            C.add_edge(u, v, relations={}, weight=0)
+        edge = C.edges[u, v]
         relation = edata.get("relation", "")
-        color = "#888"  # Default edge color
-        if relation == "contains":
-            color = "#0074D9"
-        elif relation == "calls":
-            color = "#FF4136"
-        net.add_edge(src, dst, title=relation, color=color, arrows="to")
+        edge["relations"][relation] = edge["relations"].get(relation, 0) + 1
+        edge["weight"] += 1
+    return C, members
+
+def neighborhood_graph(G: nx.DiGraph, centers: List[Any], hops: int = 1, max_nodes: Optional[int] = 500,
+                       relations: Optional[Iterable[str]] = None,
+                       adjacency: Optional[Adjacency] = None) -> nx.DiGraph:
+    """
+    Subgraph of G induced by the nodes within hops edges (either direction)
+    of the given center nodes, capped at max_nodes.
+    """
+    if adjacency is None:
+        adjacency = build_adjacency(G)
+    reached = bounded_bfs(adjacency, centers, hops, relations=relations, max_nodes=max_nodes)
+    return G.subgraph(reached).copy()
+
+def cached_layout(G: nx.DiGraph, cache_path: Optional[str] = None, seed: int = 42,
+                  k: float = 0.6) -> Dict[Any, Tuple[float, float]]:
+    """
+    spring_layout positions for G, reusing the positions saved in cache_path.
+    Only nodes missing from the cache are laid out (around the cached ones,
+    which stay fixed); the cache is updated when anything new was placed.
+    """
+    cached = load_layout(cache_path) if cache_path else {}
+    known = {node: cached[str(node)] for node in G.nodes if str(node) in cached}
+    if len(known) == G.number_of_nodes():
+        return known
+
+    if known:
+        pos = nx.spring_layout(G, pos=known, fixed=list(known), seed=seed, k=k)
+    else:
+        pos = nx.spring_layout(G, seed=seed, k=k)
+    pos = {node: (float(x), float(y)) for node, (x, y) in pos.items()}
+    if cache_path:
+        cached.update({str(node): xy for node, xy in pos.items()})
+        save_layout(cache_path, cached)
+    return pos
+
+def load_layout(path: str) -> Dict[str, Tuple[float, float]]:
+    """Read node positions saved by save_layout, or {} if there are none."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {node: tuple(xy) for node, xy in json.load(f)["positions"].items()}
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring unreadable layout cache {path}: {e}")
+        return {}
+
+def save_layout(path: str, positions: Dict[str, Tuple[float, float]]) -> None:
+    """Save node positions as JSON (written atomically)."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"positions": positions}, f)
+    os.replace(tmp_path, path)
+
+def _cluster_key(node: Any, data: Dict[str, Any], level: str, root: Optional[str]) -> str:
+    """Package or class a node is collapsed into."""
+    node_type = data.get("type")
+    if level == "class":
+        if node_type == "class":
+            return str(node)
+        return data.get("class_name") or EXTERNAL_CLUSTER
+    file = data.get("file")
+    if node_type not in ("class", "method") or not file:
+        return EXTERNAL_CLUSTER
+    package = os.path.relpath(os.path.dirname(file), root) if root else os.path.dirname(file)
+    return package.replace(os.sep, ".")
+
+def _common_dir(G: nx.DiGraph) -> Optional[str]:
+    """Deepest directory containing every source file in G."""
+    dirs = {os.path.dirname(f) for _, f in G.nodes(data="file") if f}
+    try:
+        return os.path.commonpath(dirs) if dirs else None
+    except ValueError:  # mix of absolute and relative paths
+        return None
+
+def _tooltip(node: Any, data: Dict[str, Any]) -> str:
+    """Rich HTML hover tooltip, including the start of the node's code."""
+    node_type = data.get("type", "unknown")
+    if node_type == "cluster":
+        counts = ", ".join(f"{n} {t}" for t, n in sorted(data["counts"].items()))
+        return f"<b>{data['level']} {html.escape(data['key'])}</b><br>{counts}<br>double-click to expand"
+    code = node_code(data)
+    if code is None:
+        return f"<b>{html.escape(str(node))}</b><br>Type: {node_type}<br><i>source changed since it was parsed</i>"
+    code_snippet = html.escape(code[:300])
+    return f"<b>{html.escape(str(node))}</b><br>Type: {node_type}<br><pre>{code_snippet}</pre>"
+
+def _short_title(node: Any, data: Dict[str, Any]) -> str:
+    """Tooltip shown until the full one has been loaded."""
+    return f"{node} ({data.get('type', 'unknown')})"
+
+def _network_node(node: Any, data: Dict[str, Any], title: Optional[str] = None) -> Dict[str, Any]:
+    """Vis.js node options for a graph node."""
+    node_type = data.get("type", "unknown")
+    label = f"{data['key']} ({data['size']})" if node_type == "cluster" else str(node)
+    return {"id": str(node), "label": label, "shape": "dot", "color": COLOR_MAP.get(node_type, "#ccc"),
+            "title": title if title is not None else _tooltip(node, data)}
+
+def _network_edge(src: Any, dst: Any, relation: str) -> Dict[str, Any]:
+    """Vis.js edge options; the id matches the one the lazy loader gives re-attached edges."""
+    color = "#888"  # Default edge color
+    if relation == "contains":
+        color = "#0074D9"
+    elif relation == "calls":
+        color = "#FF4136"
+    return {"id": f"{src}->{dst}:{relation}", "from": str(src), "to": str(dst),
+            "title": relation, "color": color, "arrows": "to"}
+
+def _shard_dir(output_html: str) -> str:
+    """Directory holding the lazily loaded shards of an HTML file."""
+    return os.path.splitext(output_html)[0] + "_files"
+
+def _write_shard(shard_dir: str, kind: str, key: int, payload: Any) -> None:
+    """Write one lazily loaded shard as a script registering its payload."""
+    os.makedirs(os.path.join(shard_dir, kind), exist_ok=True)
+    with open(os.path.join(shard_dir, kind, f"{key}.js"), "w", encoding="utf-8") as f:
+        f.write(f"graphShards.{kind}[{key}] = {json.dumps(payload)};\n")
+
+def _write_network(net_nodes: List[Dict[str, Any]], net_edges: List[Dict[str, Any]], output_html: str,
+                   positions: Optional[Dict[Any, Tuple[float, float]]] = None,
+                   shard_dir: Optional[str] = None) -> None:
+    """Render nodes and edges with the PyVis template and write the HTML file."""
+    from pyvis.network import Network  # imported on first use: it takes about a second
+
+    # Setting cdn_resources to 'in_line' makes the HTML file self-contained
+    net = Network(height="750px", width="100%", directed=True, notebook=True, cdn_resources='in_line')
+    if positions:
+        # Precomputed layout: place nodes directly instead of simulating physics.
+        net.toggle_physics(False)
+        scale = 100 * math.sqrt(len(net_nodes))
+        positions = {str(node): xy for node, xy in positions.items()}
+        for net_node in net_nodes:
+            x, y = positions.get(net_node["id"], (0.0, 0.0))
+            net_node["x"], net_node["y"] = x * scale, y * scale
+    else:
+        net.force_atlas_2based()  # A nice layout algorithm
+
+    # Network.add_node/add_edge check membership against lists, which is quadratic
+    # on large graphs; the node ids are already unique here.
+    net.nodes = net_nodes
+    net.node_ids = [n["id"] for n in net_nodes]
+    net.node_map = {n["id"]: n for n in net_nodes}
+    net.edges = net_edges
 
     # Manually write the HTML to a file with UTF-8 encoding to prevent UnicodeEncodeError on Windows.
-    # The net.html attribute contains the generated HTML content.
-    # net.show(output_html)
     print(f"Saving interactive graph to: {output_html}")
-    # Sample code to write HTML content to a file
-    print("Writing HTML file..." + net.html[:1000] + "..."  )
+    page = net.generate_html(notebook=True)
+    if shard_dir:
+        relative_dir = os.path.relpath(shard_dir, os.path.dirname(os.path.abspath(output_html)))
+        loader = LAZY_LOADER_JS % {"shard_dir": json.dumps(relative_dir.replace(os.sep, "/"))}
+        head, tail = page.rsplit("</body>", 1)
+        page = head + loader + "</body>" + tail
     with open(output_html, "w", encoding="utf-8") as f:
-        f.write(net.html)
-        
-    print(f"✅ Interactive graph saved to: {output_html}")
-
+        f.write(page)
 
+    print(f"✅ Interactive graph saved to: {output_html}")
 
 
-def visualize_graph(G: nx.DiGraph, title: str = "Java Code Graph", output_png: str = None):
+def visualize_graph(G: nx.DiGraph, title: str = "Java Code Graph", output_png: str = None,
+                    layout_cache: Optional[str] = None, max_labels: int = 300, dpi: int = 300):
     """
     Visualize the Java code graph (class-method-call relations)
     using NetworkX and Matplotlib. If output_png is provided, saves the
     visualization to a file instead of displaying it.
+
+    For large graphs, pass the output of collapse_graph or neighborhood_graph;
+    labels are only drawn when there are at most max_labels nodes, and
+    layout_cache reuses positions computed by earlier runs.
     """
+    import matplotlib.pyplot as plt  # imported on first use, like pyvis
+
     plt.figure(figsize=(12, 8))
 
     # layout: spring_layout spreads nodes naturally
-    pos = nx.spring_layout(G, seed=42, k=0.6)
+    pos = cached_layout(G, layout_cache, seed=42, k=0.6)
 
     # separate nodes by type
     class_nodes = [n for n, d in G.nodes(data=True) if d.get("type") == "class"]
     method_nodes = [n for n, d in G.nodes(data=True) if d.get("type") == "method"]
     unresolved_nodes = [n for n, d in G.nodes(data=True) if d.get("type") == "unresolved"]
     unknown_nodes = [n for n, d in G.nodes(data=True) if d.get("type") == "unknown"]
+    cluster_nodes = [n for n, d in G.nodes(data=True) if d.get("type") == "cluster"]
 
     # draw edges first
-    nx.draw_networkx_edges(G, pos, alpha=0.4, arrows=True, edge_color="gray")
+    widths = [1 + math.log2(d.get("weight", 1)) for _, _, d in G.edges(data=True)]
+    nx.draw_networkx_edges(G, pos, alpha=0.4, arrows=True, edge_color="gray", width=widths)
 
     # draw nodes
     nx.draw_networkx_nodes(G, pos, nodelist=class_nodes, node_color="#68a7f7", node_size=1200, label="Class")
     nx.draw_networkx_nodes(G, pos, nodelist=method_nodes, node_color="#7ddf7d", node_size=800, label="Method")
     nx.draw_networkx_nodes(G, pos, nodelist=unresolved_nodes, node_color="#f27b7b", node_size=700, label="Unresolved")
     nx.draw_networkx_nodes(G, pos, nodelist=unknown_nodes, node_color="#cccccc", node_size=700, label="Unknown")
+    if cluster_nodes:
+        sizes = [600 + 200 * math.log2(G.nodes[n]["size"]) for n in cluster_nodes]
+        nx.draw_networkx_nodes(G, pos, nodelist=cluster_nodes, node_color="#f7c768", node_size=sizes, label="Cluster")
 
     # labels
-    nx.draw_networkx_labels(G, pos, font_size=8, font_color="black")
+    if G.number_of_nodes() <= max_labels:
+        labels = {n: d["key"] if d.get("type") == "cluster" else n for n, d in G.nodes(data=True)}
+        nx.draw_networkx_labels(G, pos, labels=labels, font_size=8, font_color="black")
 
     # legend and title
     plt.legend(scatterpoints=1, loc="best")
@@ -88,8 +429,8 @@ def visualize_graph(G: nx.DiGraph, title: str = "Java Code Graph", output_png: s
     plt.axis("off")
 
     if output_png:
-        plt.savefig(output_png, format="PNG", dpi=300, bbox_inches='tight')
+        plt.savefig(output_png, format="PNG", dpi=dpi, bbox_inches='tight')
         print(f"✅ Static graph saved to: {output_png}")
         plt.close()  # Close the plot to free up memory
     else:
-        plt.show()
\ No newline at end of file
+        plt.show()